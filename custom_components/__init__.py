@@ -5,6 +5,7 @@ from homeassistant.core import HomeAssistant
 
 from .const import DOMAIN
 from .coordinator import EVSCICoordinator
+from .services import async_setup_services, async_unload_services
 
 # DODANO: "number" na seznam
 PLATFORMS = ["select", "sensor", "time", "number"]
@@ -16,12 +17,27 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
 
     coordinator = EVSCICoordinator(hass, entry)
-    await coordinator.async_config_entry_first_refresh()
+    coordinator.actuator.async_start(entry)
+    # Shranjeno stanje (način, urnik, priklop, tarifa) velja že pred prvim ciklom
+    await coordinator.async_load_storage()
+    # Lokalni OCPP strežnik (če je nastavljen) - polnilnica se lahko poveže že pred prvim ciklom
+    await coordinator.async_start_ocpp()
+    # Števec P1 (če je nastavljen) - povezava se vzpostavi v ozadju
+    coordinator.async_start_p1()
+    # Ob odstranitvi vnosa takoj zapiše števce energije
+    entry.async_on_unload(coordinator.async_shutdown)
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
+    async_setup_services(hass)
     
+    # Hitra pot: takojšnja reakcija na preobremenitev med cikli
+    entry.async_on_unload(coordinator.async_start_listeners())
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    # Prvi cikel v ozadju - setup ne čaka na senzorje, ki ob zagonu HA še niso na voljo
+    entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN}_first_refresh")
+
     entry.async_on_unload(entry.add_update_listener(update_listener))
 
     return True
@@ -31,8 +47,14 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        async_unload_services(hass)
     return unload_ok
 
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry):
-    """Sprememba nastavitev."""
+    """Sprememba nastavitev - ponovno nalaganje le ob zamenjavi vhodnih senzorjev."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    if coordinator.async_apply_options():
+        # Seja, števci in polnjenje tečejo naprej z novimi nastavitvami
+        await coordinator.async_request_refresh()
+        return
     await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,303 @@
+"""EVSCI Actuator - Neblokirajoče pošiljanje ukazov polnilnici."""
+import asyncio
+import logging
+import time
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import SERVICE_TURN_ON, SERVICE_TURN_OFF, ATTR_ENTITY_ID, STATE_ON, STATE_UNAVAILABLE
+from homeassistant.components.number import SERVICE_SET_VALUE
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .ocpp import OcppError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Časovne omejitve (s)
+CALL_TIMEOUT = 10.0
+SWITCH_ACK_TIMEOUT = 15.0
+# Enak tok ponovno pošljemo šele, če ga polnilnica po tem času še ni prevzela
+RESEND_AFTER = 30.0
+BACKOFF_MIN = 2.0
+BACKOFF_MAX = 120.0
+
+
+class ChargerActuator:
+    """Ločen task za ukaze polnilnici: zadnji ukaz zmaga, ponovljeni ukazi se izpustijo."""
+
+    def __init__(self, hass: HomeAssistant, switch_entity, current_entity, phase_entity=None):
+        self.hass = hass
+        self.switch_entity = switch_entity
+        self.current_entity = current_entity
+        self.phase_entity = phase_entity
+
+        # Čakajoči ukaz (None = brez spremembe)
+        self._pending_amps = None
+        self._pending_switch = None
+        self._pending_phases = None
+        self._pending_event_time = None
+        # Nov ukaz za zmanjšanje ali izklop ne čaka na backoff
+        self._urgent = False
+        self._wakeup = asyncio.Event()
+        # Deli tekočega ukaza, ki jih je polnilnica že prevzela ("switch", "amps", "phases")
+        self._completed = set()
+
+        # Zadnji poslani ukazi
+        self.last_amps = None
+        self.last_amps_time = 0.0
+        self.last_switch = None
+        self.last_switch_time = 0.0
+
+        # Napake / backoff
+        self.failures = 0
+        self.offline_until = 0.0
+
+        # Skupni števci (diagnostika)
+        self.service_calls = 0
+        self.failed_calls = 0
+
+        # callback(amps, sent_time, event_time) po uspešnem number.set_value
+        self.on_amps_sent = None
+
+        # Neposredna pot do polnilnice (OcppCentralSystem); dokler ni povezana, gredo ukazi prek entitet
+        self.backend = None
+
+    @callback
+    def async_start(self, entry: ConfigEntry):
+        """Zažene task aktuatorja (ob odstranitvi vnosa se prekine samodejno)."""
+        entry.async_create_background_task(self.hass, self._async_run(), "evsci_actuator")
+
+    @callback
+    def set_entities(self, switch_entity, current_entity, phase_entity=None):
+        """Nove entitete polnilnice (sprememba opcij) - zadnji poslani ukazi zanje ne veljajo."""
+        self.phase_entity = phase_entity
+        if switch_entity != self.switch_entity:
+            self.switch_entity = switch_entity
+            self.last_switch = None
+        if current_entity != self.current_entity:
+            self.current_entity = current_entity
+            self.last_amps = None
+
+    @property
+    def is_busy(self):
+        """Ali čaka kakšen ukaz na izvedbo."""
+        return (
+            self._pending_amps is not None
+            or self._pending_switch is not None
+            or self._pending_phases is not None
+        )
+
+    @callback
+    def submit(self, amps=None, switch=None, event_time=None, phases=None):
+        """Doda ukaz v vrsto. Novejši ukaz prepiše še ne izvedenega."""
+        if amps is not None and switch is None and self._is_redundant(amps):
+            amps = None
+        if switch is not None and self._is_redundant_switch(switch):
+            switch = None
+
+        if amps is not None:
+            self._pending_amps = amps
+            if event_time is not None and self._pending_event_time is None:
+                self._pending_event_time = event_time
+            if self.last_amps is None or amps < self.last_amps:
+                self._urgent = True
+        if switch is not None:
+            self._pending_switch = switch
+            if switch is False:
+                self._urgent = True
+        if phases is not None:
+            self._pending_phases = phases
+
+        if self.is_busy:
+            self._wakeup.set()
+
+    def _is_redundant(self, amps):
+        """Isti tok je bil pravkar poslan - polnilnica ga še ni prevzela."""
+        return (
+            self._pending_amps is None
+            and amps == self.last_amps
+            and time.time() - self.last_amps_time < RESEND_AFTER
+        )
+
+    def _is_redundant_switch(self, switch):
+        """Vklop/izklop je že v teku ali pravkar poslan."""
+        return (
+            self._pending_switch is None
+            and switch == self.last_switch
+            and time.time() - self.last_switch_time < RESEND_AFTER
+        )
+
+    async def _async_run(self):
+        """Glavna zanka aktuatorja."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._async_backoff()
+
+            self._urgent = False
+            amps = self._pending_amps
+            switch = self._pending_switch
+            event_time = self._pending_event_time
+            phases = self._pending_phases
+            self._pending_amps = None
+            self._pending_switch = None
+            self._pending_event_time = None
+            self._pending_phases = None
+            self._completed.clear()
+
+            try:
+                await self._async_execute(amps, switch, event_time, phases)
+            except (TimeoutError, HomeAssistantError, OcppError) as err:
+                self._register_failure(err)
+                self._requeue(amps, switch, event_time, phases)
+            except Exception as err:
+                # Npr. vol.Invalid iz number.set_value - task mora teči naprej, sicer se izgubijo vsi nadaljnji ukazi
+                _LOGGER.exception("EVSCI: Nepričakovana napaka pri ukazu polnilnici.")
+                self._register_failure(err)
+                self._requeue(amps, switch, event_time, phases)
+            else:
+                self.failures = 0
+                self.offline_until = 0.0
+
+    async def _async_backoff(self):
+        """Po napaki počaka do offline_until; nov nujen ukaz (zmanjšanje, izklop) čakanje prekine."""
+        while not self._urgent:
+            delay = self.offline_until - time.time()
+            if delay <= 0:
+                return
+            try:
+                async with asyncio.timeout(delay):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                return
+            self._wakeup.clear()
+
+    def _requeue(self, amps, switch, event_time, phases):
+        """Neizvedene dele ukaza vrnemo v vrsto, razen če jih je medtem prepisal novejši."""
+        completed = self._completed
+        if "switch" not in completed:
+            self.last_switch_time = 0.0
+            if self._pending_switch is None:
+                self._pending_switch = switch
+        if "amps" not in completed:
+            if self._pending_amps is None:
+                self._pending_amps = amps
+            if self._pending_event_time is None:
+                self._pending_event_time = event_time
+        if "phases" not in completed and self._pending_phases is None:
+            self._pending_phases = phases
+        if self.is_busy:
+            self._wakeup.set()
+
+    async def _async_execute(self, amps, switch, event_time, phases=None):
+        """Izvede en (združen) ukaz. Preklop faz je zadnji - šele ko je polnjenje izklopljeno."""
+        backend = self.backend if self.backend is not None and self.backend.connected else None
+        if backend is not None:
+            await self._async_execute_backend(backend, amps, switch, event_time)
+            amps = switch = None
+
+        if switch is True:
+            self._check_available(self.switch_entity)
+            _LOGGER.debug("EVSCI: Switch ON")
+            self.last_switch = True
+            self.last_switch_time = time.time()
+            await self._async_call("switch", SERVICE_TURN_ON, {ATTR_ENTITY_ID: self.switch_entity})
+            self._completed.add("switch")
+            # Namesto fiksne pavze počakamo, da polnilnica potrdi vklop
+            if not await self._async_wait_for_state(self.switch_entity, STATE_ON, SWITCH_ACK_TIMEOUT):
+                _LOGGER.warning("EVSCI: Polnilnica ni potrdila vklopa v %ss", SWITCH_ACK_TIMEOUT)
+
+        if amps is not None:
+            self._check_available(self.current_entity)
+            await self._async_call("number", SERVICE_SET_VALUE, {ATTR_ENTITY_ID: self.current_entity, "value": amps})
+            self._completed.add("amps")
+            sent_time = time.time()
+            self.last_amps = amps
+            self.last_amps_time = sent_time
+            if self.on_amps_sent is not None:
+                self.on_amps_sent(amps, sent_time, event_time)
+
+        if switch is False:
+            self._check_available(self.switch_entity)
+            _LOGGER.debug("EVSCI: Switch OFF")
+            self.last_switch = False
+            self.last_switch_time = time.time()
+            await self._async_call("switch", SERVICE_TURN_OFF, {ATTR_ENTITY_ID: self.switch_entity})
+            self._completed.add("switch")
+
+        if phases is not None and self.phase_entity:
+            self._check_available(self.phase_entity)
+            _LOGGER.debug("EVSCI: Phases %s", phases)
+            # Stikalo faz: vklopljeno = 3 faze; potrditev preveri regulacija iz stanja entitete
+            service = SERVICE_TURN_ON if phases == 3 else SERVICE_TURN_OFF
+            await self._async_call("switch", service, {ATTR_ENTITY_ID: self.phase_entity})
+            self._completed.add("phases")
+
+    async def _async_execute_backend(self, backend, amps, switch, event_time):
+        """Tok in vklop neposredno prek OCPP. Odgovor polnilnice je potrditev - brez čakanja na entiteto."""
+        if switch is True:
+            _LOGGER.debug("EVSCI: OCPP start")
+            self.last_switch = True
+            self.last_switch_time = time.time()
+            self.service_calls += 1
+            await backend.async_set_charging(True)
+            self._completed.add("switch")
+
+        if amps is not None:
+            self.service_calls += 1
+            await backend.async_set_current(amps)
+            self._completed.add("amps")
+            sent_time = time.time()
+            self.last_amps = amps
+            self.last_amps_time = sent_time
+            if self.on_amps_sent is not None:
+                self.on_amps_sent(amps, sent_time, event_time)
+
+        if switch is False:
+            _LOGGER.debug("EVSCI: OCPP stop")
+            self.last_switch = False
+            self.last_switch_time = time.time()
+            self.service_calls += 1
+            await backend.async_set_charging(False)
+            self._completed.add("switch")
+
+    async def _async_call(self, domain, service, data):
+        self.service_calls += 1
+        async with asyncio.timeout(CALL_TIMEOUT):
+            await self.hass.services.async_call(domain, service, data, blocking=True)
+
+    def _check_available(self, entity_id):
+        state = self.hass.states.get(entity_id)
+        if state is None or state.state == STATE_UNAVAILABLE:
+            raise HomeAssistantError(f"{entity_id} ni na voljo")
+
+    def _register_failure(self, err):
+        self.failures += 1
+        self.failed_calls += 1
+        backoff = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (self.failures - 1))
+        self.offline_until = time.time() + backoff
+        _LOGGER.warning("EVSCI: Ukaz polnilnici ni uspel (%s). Ponovno čez %.0fs.", err or "timeout", backoff)
+
+    async def _async_wait_for_state(self, entity_id, target, timeout):
+        """Počaka, da entiteta preide v želeno stanje."""
+        future = self.hass.loop.create_future()
+
+        @callback
+        def _state_changed(event):
+            new_state = event.data["new_state"]
+            if new_state and new_state.state == target and not future.done():
+                future.set_result(True)
+
+        unsub = async_track_state_change_event(self.hass, [entity_id], _state_changed)
+        try:
+            state = self.hass.states.get(entity_id)
+            if state and state.state == target:
+                return True
+            async with asyncio.timeout(timeout):
+                await future
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            unsub()
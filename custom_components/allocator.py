@@ -0,0 +1,146 @@
+"""EVSCI Allocator - Delitev skupne varovalke med več polnilnic (brez odvisnosti od Home Assistanta)."""
+import math
+
+from .control import MIN_AMPS
+
+# Polnilnica, ki se toliko časa ni oglasila, ne sodeluje več pri delitvi (s) -
+# precej dlje od najdaljšega cikla koordinatorja (60 s v mirovanju)
+DEMAND_TIMEOUT = 180.0
+
+
+class ChargerDemand:
+    """Zadnje znano povpraševanje ene polnilnice."""
+
+    __slots__ = ("priority", "power_per_amp", "charger_power", "request_w", "min_w", "updated")
+
+    def __init__(self):
+        self.priority = 1
+        self.power_per_amp = 0.0
+        self.charger_power = 0.0
+        self.request_w = 0.0
+        self.min_w = 0.0
+        self.updated = 0.0
+
+
+def water_fill(demands, budget_w):
+    """Prioritetno utežena delitev proračuna (water-filling). Vrne {id: W}.
+
+    Vsaka aktivna polnilnica najprej dobi svoj minimum. Če za minimume ni
+    dovolj prostora, se pavzira seja z najnižjo prioriteto. Preostanek se deli
+    sorazmerno s prioriteto, a nikomur več, kot zahteva.
+    """
+    alloc = dict.fromkeys(demands, 0.0)
+
+    # Najvišja prioriteta spredaj; pri enaki prioriteti ima prednost tista, ki že polni
+    active = sorted(
+        (cid for cid, d in demands.items() if d.request_w >= d.min_w > 0),
+        key=lambda cid: (demands[cid].priority, demands[cid].charger_power > 0),
+        reverse=True,
+    )
+
+    min_total = sum(demands[cid].min_w for cid in active)
+    while active and min_total > budget_w:
+        min_total -= demands[active.pop()].min_w
+
+    remaining = budget_w - min_total
+    for cid in active:
+        alloc[cid] = demands[cid].min_w
+
+    hungry = [cid for cid in active if demands[cid].request_w > alloc[cid]]
+    while hungry and remaining > 1e-6:
+        level = remaining / sum(demands[cid].priority for cid in hungry)
+        unsaturated = []
+        for cid in hungry:
+            need = demands[cid].request_w - alloc[cid]
+            if level * demands[cid].priority >= need:
+                alloc[cid] += need
+                remaining -= need
+            else:
+                unsaturated.append(cid)
+
+        if len(unsaturated) == len(hungry):
+            # Nihče ni nasičen - razdelimo ostanek in končamo
+            for cid in unsaturated:
+                alloc[cid] += level * demands[cid].priority
+            break
+        hungry = unsaturated
+
+    return alloc
+
+
+class LoadBalancer:
+    """Deli proračun glavne varovalke / tarifnega bloka med polnilnice v isti skupini.
+
+    Skupino določa senzor omrežja - polnilnice, ki merijo isti števec, si delijo
+    isto varovalko. En primerek živi v hass.data za vse vnose.
+    """
+
+    def __init__(self):
+        self._groups = {}
+
+    def release(self, group, charger_id):
+        """Odstrani polnilnico iz delitve (OFF ali odstranjen vnos)."""
+        demands = self._groups.get(group)
+        if demands is not None:
+            demands.pop(charger_id, None)
+            if not demands:
+                del self._groups[group]
+
+    def group_size(self, group):
+        return len(self._groups.get(group, ()))
+
+    def caps(
+        self,
+        group,
+        charger_id,
+        priority,
+        power_per_amp,
+        charger_power,
+        grid_power,
+        now_time,
+        request_amps,
+        limit_increase_w,
+        limit_maintain_w,
+        charging=True,
+    ):
+        """Posodobi povpraševanje in vrne (increase, maintain) limit toka za to polnilnico.
+
+        Izklopljena polnilnica (charging False) zahteva le minimalni tok za
+        zagon, da ne odvzame deleža tisti, ki polni. Če je polnilnica v skupini
+        sama, vrne (None, None) - omejitev ni potrebna.
+        """
+        if not charging:
+            request_amps = min(request_amps, MIN_AMPS)
+
+        demands = self._groups.setdefault(group, {})
+        demand = demands.get(charger_id)
+        if demand is None:
+            demand = demands[charger_id] = ChargerDemand()
+
+        demand.priority = max(1, priority)
+        demand.power_per_amp = power_per_amp
+        demand.charger_power = max(0.0, charger_power)
+        demand.request_w = max(0, request_amps) * power_per_amp
+        demand.min_w = MIN_AMPS * power_per_amp
+        demand.updated = now_time
+
+        for cid in [cid for cid, d in demands.items() if now_time - d.updated > DEMAND_TIMEOUT]:
+            del demands[cid]
+
+        if len(demands) < 2:
+            return None, None
+
+        # Poraba hiše brez VSEH polnilnic v skupini
+        house_load = grid_power - sum(d.charger_power for d in demands.values())
+
+        share_increase = water_fill(demands, limit_increase_w - house_load)[charger_id]
+        share_maintain = water_fill(demands, limit_maintain_w - house_load)[charger_id]
+        return (
+            self._to_amps(share_increase, power_per_amp),
+            self._to_amps(share_maintain, power_per_amp),
+        )
+
+    @staticmethod
+    def _to_amps(watts, power_per_amp):
+        amps = math.floor(watts / power_per_amp)
+        return amps if amps >= MIN_AMPS else 0
@@ -0,0 +1,192 @@
+"""EVSCI Autotune - Iskanje varnostne rezerve in intervala regulacije s predvajanjem zgodovine (brez odvisnosti od Home Assistanta)."""
+from array import array
+
+from .const import (
+    CONF_GRID_SENSOR,
+    CONF_SOLAR_SENSOR,
+    CONF_CHARGER_SWITCH,
+    CONF_CHARGER_CURRENT,
+    CONF_CHARGER_POWER,
+    CONF_CHARGER_STATUS,
+    CONF_EV_SOC_SENSOR,
+    CONF_TARIFF_SENSOR,
+    CONF_PRICE_SENSOR,
+    CONF_GRID_L1,
+    CONF_GRID_L2,
+    CONF_GRID_L3,
+    CONF_VOLTAGE_L1,
+    CONF_VOLTAGE_L2,
+    CONF_VOLTAGE_L3,
+    CONF_PHASE_SWITCH,
+    CONF_BUFFER,
+    CONF_CONTROL_INTERVAL,
+)
+from .control import is_cable_connected
+from .simulation import Simulator, Trace
+
+# Privzeta mreža kandidatov
+DEFAULT_BUFFERS = (200, 300, 500, 750, 1000)
+DEFAULT_INTERVALS = (10, 15, 20, 30, 45, 60)
+
+# Zgodovina se prevzorči na enakomeren korak (s) - hitra pot v simulaciji teče ob vsakem vzorcu
+SAMPLE_PERIOD = 2.0
+
+# Entitete vnosa - simulacija uporablja svoje
+ENTITY_KEYS = (
+    CONF_GRID_SENSOR,
+    CONF_SOLAR_SENSOR,
+    CONF_CHARGER_SWITCH,
+    CONF_CHARGER_CURRENT,
+    CONF_CHARGER_POWER,
+    CONF_CHARGER_STATUS,
+    CONF_EV_SOC_SENSOR,
+    CONF_TARIFF_SENSOR,
+    CONF_PRICE_SENSOR,
+    CONF_GRID_L1,
+    CONF_GRID_L2,
+    CONF_GRID_L3,
+    CONF_VOLTAGE_L1,
+    CONF_VOLTAGE_L2,
+    CONF_VOLTAGE_L3,
+    CONF_PHASE_SWITCH,
+)
+
+# Posnetek v procesu delavca (initializer) - kandidati si ga delijo
+_TRACE = None
+
+
+def simulation_options(options):
+    """Opcije vnosa brez entitet in ali ima vnos stikalo faz."""
+    return {key: value for key, value in options.items() if key not in ENTITY_KEYS}, bool(options.get(CONF_PHASE_SWITCH))
+
+
+def resample(start, end, grid, charger, tariff=None, status=None, period=SAMPLE_PERIOD):
+    """Trace iz zgodovine stanj - seznamov (timestamp, stanje), urejenih po času.
+
+    Vrednost velja do naslednje spremembe. Neveljavna stanja (unavailable)
+    obdržijo zadnjo veljavno vrednost; brez senzorja stanja je kabel ves čas
+    priklopljen.
+    """
+    trace = Trace()
+    grid_steps = _Steps(grid, _float, 0.0)
+    charger_steps = _Steps(charger, _float, 0.0)
+    tariff_steps = _Steps(tariff or (), _tariff, 1)
+    status_steps = _Steps(status, is_cable_connected, False) if status is not None else None
+    t = start
+    while t < end:
+        connected = status_steps.value_at(t) if status_steps is not None else True
+        trace.append(t, grid_steps.value_at(t) - charger_steps.value_at(t), tariff_steps.value_at(t), connected)
+        t += period
+    return trace
+
+
+class _Steps:
+    """Stopničasta časovna vrsta z zaporednim branjem (čas narašča)."""
+
+    __slots__ = ("_points", "_parse", "_index", "value")
+
+    def __init__(self, points, parse, default):
+        self._points = points
+        self._parse = parse
+        self._index = 0
+        self.value = default
+
+    def value_at(self, t):
+        points = self._points
+        while self._index < len(points) and points[self._index][0] <= t:
+            value = self._parse(points[self._index][1])
+            if value is not None:
+                self.value = value
+            self._index += 1
+        return self.value
+
+
+def _float(state):
+    try:
+        return float(state)
+    except (TypeError, ValueError):
+        return None
+
+
+def _tariff(state):
+    value = _float(state)
+    if value is None or not 1 <= int(value) <= 5:
+        return None
+    return int(value)
+
+
+def pack_trace(trace):
+    """Stolpci posnetka kot bajti - poceni prenos v procese delavcev."""
+    return tuple(getattr(trace, column).tobytes() for column in Trace.__slots__)
+
+
+def init_worker(packed):
+    """Initializer procesa delavca: posnetek se razpakira enkrat za vse kandidate."""
+    global _TRACE
+    trace = Trace()
+    for column, payload in zip(Trace.__slots__, packed):
+        values = array(getattr(trace, column).typecode)
+        values.frombytes(payload)
+        setattr(trace, column, values)
+    _TRACE = trace
+
+
+def evaluate(options, phase_switch, mode, candidates, trace=None):
+    """Predvaja posnetek za vsakega od kandidatov (buffer W, interval s). Vrne seznam rezultatov."""
+    trace = trace if trace is not None else _TRACE
+    results = []
+    for buffer_watts, control_interval in candidates:
+        simulator = Simulator(
+            {**options, CONF_BUFFER: buffer_watts, CONF_CONTROL_INTERVAL: control_interval},
+            trace,
+            mode=mode,
+            phase_switch=phase_switch,
+        )
+        summary = simulator.run().summary()
+        results.append(
+            {
+                "buffer": buffer_watts,
+                "control_interval": control_interval,
+                "solar_kwh": summary["solar_kwh"],
+                "grid_kwh": summary["grid_kwh"],
+                "overload_seconds": round(summary["seconds_over_fuse"] + summary["seconds_over_block"], 1),
+                "switch_cycles": summary["switch_cycles"],
+            }
+        )
+    return results
+
+
+def _dominates(a, b):
+    """a je vsaj tako dober kot b v vseh ciljih in boljši v vsaj enem."""
+    not_worse = (
+        a["solar_kwh"] >= b["solar_kwh"]
+        and a["overload_seconds"] <= b["overload_seconds"]
+        and a["switch_cycles"] <= b["switch_cycles"]
+    )
+    better = (
+        a["solar_kwh"] > b["solar_kwh"]
+        or a["overload_seconds"] < b["overload_seconds"]
+        or a["switch_cycles"] < b["switch_cycles"]
+    )
+    return not_worse and better
+
+
+def pareto_front(results):
+    """Nedominirani kandidati (več sončne energije, manj preobremenitve, manj vklopov), po sončni energiji."""
+    front = [a for a in results if not any(_dominates(b, a) for b in results)]
+    front.sort(key=lambda r: (-r["solar_kwh"], r["overload_seconds"], r["switch_cycles"]))
+    return front
+
+
+def choose(front, max_overload_seconds):
+    """Kandidat z največ sončne energije pri dovoljeni preobremenitvi ali None.
+
+    Pri enakem izidu izbere večjo rezervo in daljši interval (varneje, manj ukazov).
+    """
+    allowed = [r for r in front if r["overload_seconds"] <= max_overload_seconds]
+    if not allowed:
+        return None
+    return min(
+        allowed,
+        key=lambda r: (-r["solar_kwh"], r["switch_cycles"], r["overload_seconds"], -r["buffer"], -r["control_interval"]),
+    )
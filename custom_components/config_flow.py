@@ -14,10 +14,45 @@ from .const import (
     CONF_CHARGER_STATUS,
     CONF_EV_SOC_SENSOR,
     CONF_TARIFF_SENSOR,
+    CONF_GRID_L1,
+    CONF_GRID_L2,
+    CONF_GRID_L3,
+    CONF_VOLTAGE_L1,
+    CONF_VOLTAGE_L2,
+    CONF_VOLTAGE_L3,
     CONF_PHASES,
     CONF_MAX_FUSE,
     CONF_BUFFER,
     CONF_CONTROL_INTERVAL, # NOVO
+    CONF_ADAPTIVE_INTERVAL,
+    CONF_PRIORITY,
+    CONF_BATTERY_CAPACITY,
+    CONF_DEMAND_AVERAGING,
+    CONF_LOAD_FORECAST,
+    CONF_PRICE_SENSOR,
+    CONF_ENERGY_RESOLUTION,
+    CONF_ENERGY_MAX_INTERVAL,
+    CONF_PV_SMOOTHING,
+    CONF_PV_WINDOW,
+    CONF_PV_HYSTERESIS,
+    CONF_PV_MIN_ON,
+    CONF_PV_MIN_OFF,
+    PV_SMOOTHING_EWMA,
+    PV_SMOOTHING_METHODS,
+    CONF_CONTROLLER,
+    CONF_PI_KP,
+    CONF_PI_KI,
+    CONF_PI_MAX_STEP,
+    CONTROLLER_RAMP,
+    CONTROLLERS,
+    CONF_PHASE_SWITCH,
+    CONF_PHASE_SWITCH_DWELL,
+    CONF_OCPP_PORT,
+    CONF_OCPP_CHARGE_POINT,
+    CONF_OCPP_HOST,
+    CONF_P1_SOURCE,
+    CONF_TELEMETRY,
+    CONF_TELEMETRY_MAX_MB,
     CONF_AUTO_MODE,
     CONF_RESET_ON_UNPLUG,
     CONF_LIMIT_BLOCK_1,
@@ -48,11 +83,31 @@ class EVSCIConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             CONF_MAX_FUSE: 25,
             CONF_BUFFER: 500,
             CONF_CONTROL_INTERVAL: 30, # Privzeto 30s
+            CONF_ADAPTIVE_INTERVAL: True,
+            CONF_PRIORITY: 1,
+            CONF_BATTERY_CAPACITY: 50,
+            CONF_ENERGY_RESOLUTION: 0.01,
+            CONF_ENERGY_MAX_INTERVAL: 300,
+            CONF_PV_SMOOTHING: PV_SMOOTHING_EWMA,
+            CONF_PV_WINDOW: 30,
+            CONF_PV_HYSTERESIS: 300,
+            CONF_PV_MIN_ON: 300,
+            CONF_PV_MIN_OFF: 180,
+            CONF_CONTROLLER: CONTROLLER_RAMP,
+            CONF_PI_KP: 0.6,
+            CONF_PI_KI: 0.05,
+            CONF_PI_MAX_STEP: 8,
+            CONF_PHASE_SWITCH_DWELL: 600,
+            CONF_OCPP_PORT: 0,
+            CONF_TELEMETRY: False,
+            CONF_TELEMETRY_MAX_MB: 100,
             CONF_LIMIT_BLOCK_1: 6000,
             CONF_LIMIT_BLOCK_2: 6000,
             CONF_LIMIT_BLOCK_3: 6000,
             CONF_LIMIT_BLOCK_4: 6000,
             CONF_LIMIT_BLOCK_5: 6000,
+            CONF_DEMAND_AVERAGING: True,
+            CONF_LOAD_FORECAST: True,
             CONF_AUTO_MODE: MODE_NO_CHANGE,
             CONF_RESET_ON_UNPLUG: False
         }
@@ -76,6 +131,17 @@ class EVSCIConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             
             vol.Optional(CONF_SOLAR_SENSOR): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class="power")),
             vol.Optional(CONF_EV_SOC_SENSOR): selector.EntitySelector(selector.EntitySelectorConfig()),
+            vol.Optional(CONF_PRICE_SENSOR): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor")),
+            # Stikalo 1/3 faze na polnilnici (vklopljeno = 3 faze)
+            vol.Optional(CONF_PHASE_SWITCH): selector.EntitySelector(selector.EntitySelectorConfig(domain="switch")),
+
+            # --- SENZORJI PO FAZAH (opcijsko) ---
+            vol.Optional(CONF_GRID_L1): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class=["current", "power"])),
+            vol.Optional(CONF_GRID_L2): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class=["current", "power"])),
+            vol.Optional(CONF_GRID_L3): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class=["current", "power"])),
+            vol.Optional(CONF_VOLTAGE_L1): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class="voltage")),
+            vol.Optional(CONF_VOLTAGE_L2): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class="voltage")),
+            vol.Optional(CONF_VOLTAGE_L3): selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor", device_class="voltage")),
             
             # --- PARAMETRI ---
             vol.Required(CONF_PHASES): vol.In([1, 3]),
@@ -84,6 +150,50 @@ class EVSCIConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             
             # NOVO: Interval
             vol.Required(CONF_CONTROL_INTERVAL): vol.All(int, vol.Range(min=5, max=300)),
+            # Interval iz naučenega odziva polnilnice (nastavljen velja, dokler se model ne nauči)
+            vol.Optional(CONF_ADAPTIVE_INTERVAL, default=True): bool,
+
+            # Prioriteta pri več polnilnicah na isti varovalki
+            vol.Optional(CONF_PRIORITY, default=1): vol.All(int, vol.Range(min=1, max=10)),
+
+            # Načrt do odhoda
+            vol.Optional(CONF_BATTERY_CAPACITY, default=50): vol.All(vol.Coerce(float), vol.Range(min=5, max=200)),
+
+            # Redčenje zapisov senzorjev energije
+            vol.Optional(CONF_ENERGY_RESOLUTION, default=0.01): vol.All(vol.Coerce(float), vol.Range(min=0.001, max=1)),
+            vol.Optional(CONF_ENERGY_MAX_INTERVAL, default=300): vol.All(int, vol.Range(min=10, max=3600)),
+
+            # PV: glajenje presežka in histereza
+            vol.Optional(CONF_PV_SMOOTHING, default=PV_SMOOTHING_EWMA): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=PV_SMOOTHING_METHODS, mode=selector.SelectSelectorMode.DROPDOWN)
+            ),
+            vol.Optional(CONF_PV_WINDOW, default=30): vol.All(int, vol.Range(min=0, max=300)),
+            vol.Optional(CONF_PV_HYSTERESIS, default=300): vol.All(int, vol.Range(min=0, max=3000)),
+            vol.Optional(CONF_PV_MIN_ON, default=300): vol.All(int, vol.Range(min=0, max=3600)),
+            vol.Optional(CONF_PV_MIN_OFF, default=180): vol.All(int, vol.Range(min=0, max=3600)),
+
+            # Regulator povečevanja toka: fiksni korak 2 A na interval ali PI
+            vol.Optional(CONF_CONTROLLER, default=CONTROLLER_RAMP): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=CONTROLLERS, mode=selector.SelectSelectorMode.DROPDOWN)
+            ),
+            vol.Optional(CONF_PI_KP, default=0.6): vol.All(vol.Coerce(float), vol.Range(min=0.05, max=1)),
+            vol.Optional(CONF_PI_KI, default=0.05): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Optional(CONF_PI_MAX_STEP, default=8): vol.All(int, vol.Range(min=1, max=26)),
+
+            # Preklop faz: najkrajši čas med preklopi zaradi PV presežka
+            vol.Optional(CONF_PHASE_SWITCH_DWELL, default=600): vol.All(int, vol.Range(min=60, max=3600)),
+
+            # Lokalni OCPP 1.6J strežnik: ukazi in meritve neposredno s polnilnico (0 = izklopljen)
+            vol.Optional(CONF_OCPP_PORT, default=0): vol.All(int, vol.Range(min=0, max=65535)),
+            vol.Optional(CONF_OCPP_CHARGE_POINT): str,
+            vol.Optional(CONF_OCPP_HOST): str,
+
+            # Števec P1 (serijska naprava ali host:port) - omrežje vsako sekundo mimo entitete
+            vol.Optional(CONF_P1_SOURCE): str,
+
+            # Zapis vsakega cikla za analizo (evsci_telemetry/<entry_id>/*.npz)
+            vol.Optional(CONF_TELEMETRY, default=False): bool,
+            vol.Optional(CONF_TELEMETRY_MAX_MB, default=100): vol.All(int, vol.Range(min=1, max=10000)),
             
             vol.Required(CONF_AUTO_MODE): selector.SelectSelector(
                 selector.SelectSelectorConfig(options=AUTO_MODES, mode=selector.SelectSelectorMode.DROPDOWN)
@@ -91,6 +201,9 @@ class EVSCIConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Required(CONF_RESET_ON_UNPLUG): bool,
 
             # --- LIMITI ---
+            # Limit bloka velja za 15-min povprečje (obračun NMPT)
+            vol.Optional(CONF_DEMAND_AVERAGING, default=True): bool,
+            vol.Optional(CONF_LOAD_FORECAST, default=True): bool,
             vol.Required(CONF_LIMIT_BLOCK_1): int,
             vol.Required(CONF_LIMIT_BLOCK_2): int,
             vol.Required(CONF_LIMIT_BLOCK_3): int,
@@ -107,7 +220,11 @@ class EVSCIOptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None):
         if user_input is not None:
-            optional_fields = [CONF_SOLAR_SENSOR, CONF_EV_SOC_SENSOR]
+            optional_fields = [
+                CONF_SOLAR_SENSOR, CONF_EV_SOC_SENSOR, CONF_PRICE_SENSOR, CONF_PHASE_SWITCH, CONF_OCPP_CHARGE_POINT, CONF_OCPP_HOST, CONF_P1_SOURCE,
+                CONF_GRID_L1, CONF_GRID_L2, CONF_GRID_L3,
+                CONF_VOLTAGE_L1, CONF_VOLTAGE_L2, CONF_VOLTAGE_L3,
+            ]
             for key in optional_fields:
                 if key not in user_input or user_input[key] in [None, "", []]:
                     user_input[key] = None
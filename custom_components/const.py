@@ -11,6 +11,15 @@ CONF_CHARGER_POWER = "charger_power"
 CONF_CHARGER_STATUS = "charger_status"
 CONF_EV_SOC_SENSOR = "ev_soc_sensor"
 CONF_TARIFF_SENSOR = "tariff_sensor"
+CONF_PRICE_SENSOR = "price_sensor"  # Opcijska napoved cen (atributi raw_today/raw_tomorrow ali forecast)
+
+# Opcijski senzorji po fazah (tok A ali moč W) in napetosti (V)
+CONF_GRID_L1 = "grid_l1"
+CONF_GRID_L2 = "grid_l2"
+CONF_GRID_L3 = "grid_l3"
+CONF_VOLTAGE_L1 = "voltage_l1"
+CONF_VOLTAGE_L2 = "voltage_l2"
+CONF_VOLTAGE_L3 = "voltage_l3"
 
 # Konfiguracijski ključi - Parametri
 CONF_PHASES = "phases"
@@ -19,6 +28,42 @@ CONF_BUFFER = "buffer"
 CONF_AUTO_MODE = "auto_mode"
 CONF_RESET_ON_UNPLUG = "reset_on_unplug"
 CONF_CONTROL_INTERVAL = "control_interval"  # <--- NOVO
+CONF_ADAPTIVE_INTERVAL = "adaptive_interval"  # Interval iz naučenega odziva polnilnice
+CONF_PRIORITY = "priority"  # Prioriteta pri delitvi varovalke med več polnilnic
+CONF_BATTERY_CAPACITY = "battery_capacity"  # kWh - za načrt polnjenja do odhoda
+CONF_DEMAND_AVERAGING = "demand_averaging"  # Limit bloka velja za 15-min povprečje (NMPT), ne za trenutno moč
+CONF_LOAD_FORECAST = "load_forecast"  # Povečanje toka upošteva naučene konice porabe hiše
+CONF_ENERGY_RESOLUTION = "energy_resolution"  # kWh - najmanjša sprememba za nov zapis senzorja energije
+CONF_ENERGY_MAX_INTERVAL = "energy_max_interval"  # s - najdaljši razmik med zapisi
+
+# PV regulacija: glajenje presežka in histereza vklopa
+CONF_PV_SMOOTHING = "pv_smoothing"
+CONF_PV_WINDOW = "pv_window"  # s
+CONF_PV_HYSTERESIS = "pv_hysteresis"  # W pod minimumom, preden se PV seja ustavi
+CONF_PV_MIN_ON = "pv_min_on"  # s
+CONF_PV_MIN_OFF = "pv_min_off"  # s
+
+# Regulator povečevanja toka: fiksni korak ali PI
+CONF_CONTROLLER = "controller"
+CONF_PI_KP = "pi_kp"
+CONF_PI_KI = "pi_ki"  # 1/s
+CONF_PI_MAX_STEP = "pi_max_step"  # A na cikel
+
+# Preklop 1-fazno / 3-fazno (stikalo polnilnice: vklopljeno = 3 faze)
+CONF_PHASE_SWITCH = "phase_switch"
+CONF_PHASE_SWITCH_DWELL = "phase_switch_dwell"  # s - najkrajši čas med preklopi zaradi presežka
+
+# Lokalni centralni sistem OCPP 1.6J (0 = izklopljen)
+CONF_OCPP_PORT = "ocpp_port"
+CONF_OCPP_CHARGE_POINT = "ocpp_charge_point"  # id polnilnice (obvezen ob vklopljenem strežniku)
+CONF_OCPP_HOST = "ocpp_host"  # naslov, na katerem strežnik posluša (obvezen, npr. IP v LAN)
+
+# Števec DSMR P1 neposredno: /dev/ttyUSB0 ali host:port (prazno = entiteta omrežja)
+CONF_P1_SOURCE = "p1_source"
+
+# Zapis vsakega cikla v stolpčne datoteke (opt-in) in največja velikost na disku (MB)
+CONF_TELEMETRY = "telemetry"
+CONF_TELEMETRY_MAX_MB = "telemetry_max_mb"
 
 # Limiti za bloke (W)
 CONF_LIMIT_BLOCK_1 = "limit_block_1"
@@ -27,6 +72,20 @@ CONF_LIMIT_BLOCK_3 = "limit_block_3"
 CONF_LIMIT_BLOCK_4 = "limit_block_4"
 CONF_LIMIT_BLOCK_5 = "limit_block_5"
 
+# Glajenje PV presežka
+PV_SMOOTHING_NONE = "none"
+PV_SMOOTHING_EWMA = "ewma"
+PV_SMOOTHING_MEDIAN = "median"
+PV_SMOOTHING_METHODS = [PV_SMOOTHING_NONE, PV_SMOOTHING_EWMA, PV_SMOOTHING_MEDIAN]
+
+# Regulator povečevanja toka
+CONTROLLER_RAMP = "ramp"
+CONTROLLER_PI = "pi"
+CONTROLLERS = [CONTROLLER_RAMP, CONTROLLER_PI]
+
+# hass.data ključ za skupni delilnik varovalke (vsi vnosi)
+DATA_BALANCER = f"{DOMAIN}_balancer"
+
 # Načini delovanja
 MODE_OFF = "OFF"
 MODE_PV_ONLY = "PV Only"
@@ -34,7 +93,8 @@ MODE_MIN_PV = "Min + PV"
 MODE_DYNAMIC = "Dynamic"
 MODE_MAX_POWER = "Max Power"
 MODE_SCHEDULE = "Schedule"
+MODE_DEPARTURE = "Departure"
 MODE_NO_CHANGE = "Don't Change"
 
-MODES = [MODE_OFF, MODE_PV_ONLY, MODE_MIN_PV, MODE_DYNAMIC, MODE_MAX_POWER, MODE_SCHEDULE]
+MODES = [MODE_OFF, MODE_PV_ONLY, MODE_MIN_PV, MODE_DYNAMIC, MODE_MAX_POWER, MODE_SCHEDULE, MODE_DEPARTURE]
 AUTO_MODES = [MODE_NO_CHANGE] + MODES
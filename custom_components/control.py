@@ -0,0 +1,813 @@
+"""EVSCI Control - Regulacijski zakon (brez odvisnosti od Home Assistanta)."""
+import logging
+import math
+
+from .const import (
+    MODES,
+    MODE_OFF,
+    MODE_PV_ONLY,
+    MODE_MIN_PV,
+    MODE_DYNAMIC,
+    MODE_MAX_POWER,
+    MODE_SCHEDULE,
+    MODE_DEPARTURE,
+    MODE_NO_CHANGE,
+    CONF_GRID_SENSOR,
+    CONF_SOLAR_SENSOR,
+    CONF_TARIFF_SENSOR,
+    CONF_PRICE_SENSOR,
+    CONF_CHARGER_SWITCH,
+    CONF_CHARGER_CURRENT,
+    CONF_CHARGER_POWER,
+    CONF_CHARGER_STATUS,
+    CONF_EV_SOC_SENSOR,
+    CONF_PHASES,
+    CONF_MAX_FUSE,
+    CONF_BUFFER,
+    CONF_CONTROL_INTERVAL,
+    CONF_ADAPTIVE_INTERVAL,
+    CONF_PRIORITY,
+    CONF_BATTERY_CAPACITY,
+    CONF_DEMAND_AVERAGING,
+    CONF_LOAD_FORECAST,
+    CONF_ENERGY_RESOLUTION,
+    CONF_ENERGY_MAX_INTERVAL,
+    CONF_PV_SMOOTHING,
+    CONF_PV_WINDOW,
+    CONF_PV_HYSTERESIS,
+    CONF_PV_MIN_ON,
+    CONF_PV_MIN_OFF,
+    PV_SMOOTHING_EWMA,
+    CONF_CONTROLLER,
+    CONF_PI_KP,
+    CONF_PI_KI,
+    CONF_PI_MAX_STEP,
+    CONTROLLER_RAMP,
+    CONTROLLER_PI,
+    CONF_PHASE_SWITCH,
+    CONF_PHASE_SWITCH_DWELL,
+    CONF_OCPP_PORT,
+    CONF_OCPP_CHARGE_POINT,
+    CONF_OCPP_HOST,
+    CONF_P1_SOURCE,
+    CONF_TELEMETRY,
+    CONF_TELEMETRY_MAX_MB,
+    CONF_AUTO_MODE,
+    CONF_RESET_ON_UNPLUG,
+    CONF_LIMIT_BLOCK_1,
+    CONF_LIMIT_BLOCK_2,
+    CONF_LIMIT_BLOCK_3,
+    CONF_LIMIT_BLOCK_4,
+    CONF_LIMIT_BLOCK_5,
+    CONF_GRID_L1,
+    CONF_GRID_L2,
+    CONF_GRID_L3,
+    CONF_VOLTAGE_L1,
+    CONF_VOLTAGE_L2,
+    CONF_VOLTAGE_L3,
+)
+from .demand import DemandIntegrator
+from .meter import MeterWatch
+from .phases import PhaseSwitchController
+from .pi import PICurrentController
+from .response import ChargerResponseModel
+from .pv import PVSurplusController
+
+_LOGGER = logging.getLogger(__name__)
+
+VOLTAGE = 230
+MIN_AMPS = 6
+MAX_AMPS = 32
+
+# VARNOSTNE KONSTANTE
+STALE_DATA_THRESHOLD = 60.0
+RAMP_UP_STEP = 2.0
+
+# Pred prehodom v blok z nižjim limitom znižamo tok interval + toliko sekund prej
+PRE_RAMP_MARGIN = 30.0
+
+TARIFF_BLOCKS = (1, 2, 3, 4, 5)
+
+# Načini, ki upoštevajo limit tarifnega bloka (ostali le glavno varovalko)
+BLOCK_LIMITED_MODES = (MODE_DYNAMIC, MODE_SCHEDULE, MODE_DEPARTURE)
+
+# Veja odločitve v koraku regulacije (diagnostika)
+BRANCH_OFF = "off"
+BRANCH_STALE = "stale"
+BRANCH_EMERGENCY = "emergency"
+BRANCH_DECREASE = "decrease"
+BRANCH_STARTUP = "startup"
+BRANCH_RAMP_UP = "ramp_up"
+BRANCH_HOLD = "hold"
+BRANCH_PHASE_SWITCH = "phase_switch"
+
+# Kaj omejuje tok pod želenega (diagnostika)
+LIMIT_FUSE = "fuse"
+LIMIT_BLOCK = "block"
+LIMIT_SHARE = "share"
+LIMIT_FORECAST = "forecast"
+
+# Stanja statusa polnilnice, ki pomenijo, da kabel ni priklopljen
+IDLE_STATUSES = frozenset(
+    ["0", "State A - Idle", "unavailable", "unknown", "False", "No cable plugged", "Available", "Unavailable"]
+)
+
+
+def is_cable_connected(status):
+    """Iz stanja statusa polnilnice ugotovi, ali je kabel priklopljen."""
+    return status not in IDLE_STATUSES
+
+
+def is_idle(mode, is_charging, cable_connected):
+    """Ni kaj regulirati: kabel odklopljen ali način OFF z izklopljeno polnilnico.
+
+    cable_connected je None, če stanje priklopa ni znano.
+    """
+    return cable_connected is False or (mode == MODE_OFF and not is_charging)
+
+
+def is_schedule_active(start, end, now):
+    """Ali je čas now (datetime.time) znotraj okna start-end (lahko čez polnoč)."""
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+def split_ev_power(charger_real_power, grid_power):
+    """Razdeli moč polnjenja na (omrežje, sonce) v W."""
+    if charger_real_power <= 0:
+        return 0.0, 0.0
+    ev_grid_power_usage = min(charger_real_power, grid_power) if grid_power > 0 else 0.0
+    ev_solar_power_usage = max(0.0, charger_real_power - ev_grid_power_usage)
+    return ev_grid_power_usage, ev_solar_power_usage
+
+
+def plan_commands(target_amps, should_be_active, current_hw_amps, is_charging, cable_connected):
+    """Iz odločitve izpelje ukaze polnilnici: (tok ali None, stikalo True/False/None)."""
+    amps = None
+    switch = None
+
+    if target_amps != current_hw_amps:
+        # Brez kabla 0 A ne pošiljamo - polnilnica ne polni, ukaz bi se le ponavljal
+        if should_be_active or (is_charging and (cable_connected or target_amps > 0)):
+            amps = target_amps
+
+    if should_be_active and not is_charging:
+        if target_amps > 0: # Start Threshold
+            # Aktuator po potrjenem vklopu nastavi tok
+            switch = True
+            amps = target_amps
+
+    elif not should_be_active and is_charging:
+        # Z odklopljenim kablom stikala ne izklapljamo
+        if cable_connected:
+            switch = False
+
+    return amps, switch
+
+
+class ControlConfig:
+    """Nespremenljiv posnetek nastavitev vnosa, zgrajen enkrat ob spremembi opcij."""
+
+    __slots__ = (
+        "grid_entity",
+        "solar_entity",
+        "tariff_entity",
+        "charger_switch_entity",
+        "charger_current_entity",
+        "charger_power_entity",
+        "charger_status_entity",
+        "ev_soc_entity",
+        "price_entity",
+        "phases",
+        "used_phases",
+        "phase_entities",
+        "voltage_entities",
+        "max_fuse_amps",
+        "buffer_watts",
+        "control_interval",
+        "adaptive_interval",
+        "priority",
+        "battery_capacity",
+        "demand_averaging",
+        "load_forecast",
+        "energy_resolution",
+        "energy_max_interval",
+        "pv_smoothing",
+        "pv_window",
+        "pv_hysteresis",
+        "pv_min_on",
+        "pv_min_off",
+        "controller",
+        "pi_kp",
+        "pi_ki",
+        "pi_max_step",
+        "phase_switch_entity",
+        "phase_switch_dwell",
+        "ocpp_port",
+        "ocpp_charge_point",
+        "ocpp_host",
+        "p1_source",
+        "telemetry",
+        "telemetry_max_mb",
+        "auto_mode_on_plugin",
+        "reset_on_unplug",
+        "power_per_amp",
+        "block_limits",
+        "fuse_limit_w",
+        "limits",
+    )
+
+    def __init__(self, options, data):
+        def get(key, default=None):
+            return options.get(key, data.get(key, default))
+
+        values = {
+            "grid_entity": get(CONF_GRID_SENSOR),
+            "solar_entity": get(CONF_SOLAR_SENSOR),
+            "tariff_entity": get(CONF_TARIFF_SENSOR),
+            "charger_switch_entity": get(CONF_CHARGER_SWITCH),
+            "charger_current_entity": get(CONF_CHARGER_CURRENT),
+            "charger_power_entity": get(CONF_CHARGER_POWER),
+            "charger_status_entity": get(CONF_CHARGER_STATUS),
+            "ev_soc_entity": get(CONF_EV_SOC_SENSOR),
+            "price_entity": get(CONF_PRICE_SENSOR),
+            "phases": get(CONF_PHASES, 3),
+            "max_fuse_amps": get(CONF_MAX_FUSE, 25),
+            "buffer_watts": get(CONF_BUFFER, 500),
+            "control_interval": get(CONF_CONTROL_INTERVAL, 30),
+            "adaptive_interval": get(CONF_ADAPTIVE_INTERVAL, True),
+            "priority": get(CONF_PRIORITY, 1),
+            "battery_capacity": get(CONF_BATTERY_CAPACITY, 50),
+            "demand_averaging": get(CONF_DEMAND_AVERAGING, True),
+            "load_forecast": get(CONF_LOAD_FORECAST, True),
+            "energy_resolution": get(CONF_ENERGY_RESOLUTION, 0.01),
+            "energy_max_interval": get(CONF_ENERGY_MAX_INTERVAL, 300),
+            "pv_smoothing": get(CONF_PV_SMOOTHING, PV_SMOOTHING_EWMA),
+            "pv_window": get(CONF_PV_WINDOW, 30),
+            "pv_hysteresis": get(CONF_PV_HYSTERESIS, 300),
+            "pv_min_on": get(CONF_PV_MIN_ON, 300),
+            "pv_min_off": get(CONF_PV_MIN_OFF, 180),
+            "controller": get(CONF_CONTROLLER, CONTROLLER_RAMP),
+            "pi_kp": get(CONF_PI_KP, 0.6),
+            "pi_ki": get(CONF_PI_KI, 0.05),
+            "pi_max_step": get(CONF_PI_MAX_STEP, 8),
+            "phase_switch_entity": get(CONF_PHASE_SWITCH),
+            "phase_switch_dwell": get(CONF_PHASE_SWITCH_DWELL, 600),
+            "ocpp_port": get(CONF_OCPP_PORT, 0),
+            "ocpp_charge_point": get(CONF_OCPP_CHARGE_POINT),
+            "ocpp_host": get(CONF_OCPP_HOST),
+            "p1_source": get(CONF_P1_SOURCE),
+            "telemetry": get(CONF_TELEMETRY, False),
+            "telemetry_max_mb": get(CONF_TELEMETRY_MAX_MB, 100),
+            "auto_mode_on_plugin": get(CONF_AUTO_MODE, MODE_NO_CHANGE),
+            "reset_on_unplug": get(CONF_RESET_ON_UNPLUG, False),
+        }
+        values["power_per_amp"] = VOLTAGE * values["phases"]
+
+        # Enofazna polnilnica je na L1, trifazna na vseh treh
+        values["used_phases"] = (0,) if values["phases"] == 1 else (0, 1, 2)
+        values["phase_entities"] = self._phase_tuple(
+            values["used_phases"], (get(CONF_GRID_L1), get(CONF_GRID_L2), get(CONF_GRID_L3))
+        )
+        values["voltage_entities"] = self._phase_tuple(
+            values["used_phases"], (get(CONF_VOLTAGE_L1), get(CONF_VOLTAGE_L2), get(CONF_VOLTAGE_L3))
+        )
+        values["block_limits"] = {
+            1: get(CONF_LIMIT_BLOCK_1, 6000),
+            2: get(CONF_LIMIT_BLOCK_2, 6000),
+            3: get(CONF_LIMIT_BLOCK_3, 6000),
+            4: get(CONF_LIMIT_BLOCK_4, 6000),
+            5: get(CONF_LIMIT_BLOCK_5, 6000),
+        }
+        values["fuse_limit_w"] = values["max_fuse_amps"] * values["power_per_amp"]
+        values["limits"] = self._build_limits(values)
+
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ControlConfig je nespremenljiv")
+
+    @property
+    def phase_switching(self):
+        """Preklop faz je mogoč le na trifaznem priključku z nastavljenim stikalom faz."""
+        return bool(self.phase_switch_entity) and self.phases == 3
+
+    @property
+    def input_entities(self):
+        """Vhodni senzorji - njihova sprememba zahteva ponovno nalaganje (poslušalci, entitete)."""
+        return (
+            self.grid_entity,
+            self.solar_entity,
+            self.tariff_entity,
+            self.charger_power_entity,
+            self.charger_status_entity,
+            self.ev_soc_entity,
+            self.price_entity,
+            self.phase_entities,
+            self.voltage_entities,
+            self.ocpp_port,
+            self.ocpp_charge_point,
+            self.ocpp_host,
+            self.p1_source,
+        )
+
+    @classmethod
+    def from_entry(cls, entry):
+        """Zgradi posnetek iz config entryja (opcije imajo prednost pred data)."""
+        return cls(entry.options, entry.data)
+
+    @staticmethod
+    def _phase_tuple(used_phases, entities):
+        """Vrne entitete po fazah ali None, če katera od uporabljenih faz ni nastavljena."""
+        if all(entities[p] for p in used_phases):
+            return entities
+        return None
+
+    @staticmethod
+    def _build_limits(values):
+        """Tabela (način, blok) -> (increase, maintain, emergency) v W."""
+        buffer_watts = values["buffer_watts"]
+        limits = {}
+        for mode in MODES:
+            for tariff in TARIFF_BLOCKS:
+                if mode in BLOCK_LIMITED_MODES:
+                    limit_base = values["block_limits"][tariff]
+                else:
+                    limit_base = values["fuse_limit_w"]
+
+                # Max Power ignorira limit bloka, zato zanj ni meje za nujni izklop
+                if mode == MODE_MAX_POWER:
+                    limit_emergency = math.inf
+                else:
+                    limit_emergency = limit_base + buffer_watts
+
+                limits[(mode, tariff)] = (limit_base - buffer_watts, limit_base, limit_emergency)
+        return limits
+
+
+class Decision:
+    """Rezultat enega koraka regulacije."""
+
+    __slots__ = (
+        "target_amps",
+        "switch_on",
+        "amps_limit_maintain",
+        "is_emergency",
+        "amps_limit_increase",
+        "branch",
+        "limited_by",
+        "phases",
+    )
+
+    def __init__(
+        self,
+        target_amps,
+        switch_on,
+        amps_limit_maintain,
+        is_emergency=False,
+        amps_limit_increase=0,
+        branch=BRANCH_HOLD,
+        limited_by=None,
+        phases=None,
+    ):
+        self.target_amps = target_amps
+        self.switch_on = switch_on
+        self.amps_limit_maintain = amps_limit_maintain
+        self.is_emergency = is_emergency
+        # Diagnostika: limit povečanja, veja odločitve, omejitev (LIMIT_* ali None)
+        self.amps_limit_increase = amps_limit_increase
+        self.branch = branch
+        self.limited_by = limited_by
+        # Ukaz stikalu faz (1 ali 3) ali None
+        self.phases = phases
+
+
+class ControlLaw:
+    """Iz meritev izračuna ciljni tok in stanje stikala."""
+
+    def __init__(self, cfg: ControlConfig):
+        self.cfg = cfg
+        # Rate Limiting
+        self.last_amp_change_time = 0.0
+
+        # Moč na amper - z merjeno napetostjo in številom faz polnjenja se spreminja
+        self.power_per_amp = cfg.power_per_amp
+        self.limits = cfg.limits
+        self._voltages = None
+
+        # Število faz polnjenja in zaporedje preklopa
+        self.phase_switch = PhaseSwitchController(cfg.phases, cfg.pv_hysteresis, cfg.phase_switch_dwell)
+
+        # Zglajen PV presežek s histerezo
+        self.pv = PVSurplusController(cfg.pv_smoothing, cfg.pv_window, cfg.pv_hysteresis, cfg.pv_min_on, cfg.pv_min_off)
+
+        # PI regulator povečevanja toka (le pri controller == pi)
+        self.pi = PICurrentController(cfg.pi_kp, cfg.pi_ki, cfg.pi_max_step)
+
+        # 15-min povprečje moči omrežja (obračun limita bloka)
+        self.demand = DemandIntegrator()
+
+        # Naučen odziv polnilnice in števca na ukaz toka
+        self.response = ChargerResponseModel()
+
+        # Ritem osveževanja števca omrežja - zaznava zamrznjenega senzorja
+        self.meter = MeterWatch()
+        self._last_mode = None
+
+    def reconfigure(self, cfg: ControlConfig):
+        """Nove nastavitve med delovanjem.
+
+        Čas zadnje spremembe toka, tekoči 15-min interval, stanje PV seje,
+        število faz in naučen odziv polnilnice ostanejo; moč na amper se
+        preračuna iz zadnjih napetosti.
+        """
+        self.cfg = cfg
+        if not cfg.phase_switching and self.phase_switch.phases != cfg.phases:
+            self.phase_switch = PhaseSwitchController(cfg.phases, cfg.pv_hysteresis, cfg.phase_switch_dwell)
+        self.phase_switch.configure(cfg.pv_hysteresis, cfg.phase_switch_dwell)
+        self.power_per_amp = cfg.power_per_amp
+        self.limits = cfg.limits
+        self._update_power_per_amp()
+        self.pv.configure(cfg.pv_smoothing, cfg.pv_window, cfg.pv_hysteresis, cfg.pv_min_on, cfg.pv_min_off)
+        self.pi.configure(cfg.pi_kp, cfg.pi_ki, cfg.pi_max_step)
+
+    @property
+    def phases(self):
+        """Število faz, na katerih polni polnilnica."""
+        return self.phase_switch.phases
+
+    @property
+    def used_phases(self):
+        """Faze polnilnice - enofazno polni na L1."""
+        return (0,) if self.phase_switch.phases == 1 else (0, 1, 2)
+
+    @property
+    def control_interval(self):
+        """Razmik med koraki toka (s): iz naučenega odziva polnilnice ali nastavljen."""
+        if self.cfg.adaptive_interval:
+            return self.response.control_interval(self.cfg.control_interval)
+        return self.cfg.control_interval
+
+    def set_voltages(self, voltages):
+        """Posodobi moč na amper iz izmerjenih napetosti uporabljenih faz (None = nazivna)."""
+        self._voltages = voltages
+        self._update_power_per_amp()
+
+    def confirm_phases(self, now_time, phases):
+        """Število faz, ki ga javlja stikalo faz polnilnice (None = neznano)."""
+        if self.cfg.phase_switching and self.phase_switch.confirm(now_time, phases):
+            _LOGGER.info("EVSCI: Polnjenje na %s fazah.", phases)
+            self._update_power_per_amp()
+
+    def _update_power_per_amp(self):
+        """Moč na amper za faze polnilnice; limiti varovalke (W) jim sledijo.
+
+        Pri enofaznem polnjenju na trifaznem priključku tako poraba hiše šteje
+        v celoti na fazo polnilnice - varna ocena brez senzorjev po fazah.
+        """
+        cfg = self.cfg
+        voltages = self._voltages
+        if voltages is None:
+            power_per_amp = VOLTAGE * self.phases
+        else:
+            power_per_amp = sum(voltages[p] for p in self.used_phases)
+
+        # Tabelo limitov varovalke preračunamo le ob opazni spremembi
+        if abs(power_per_amp - self.power_per_amp) < 1.0:
+            return
+        self.power_per_amp = power_per_amp
+
+        if power_per_amp == cfg.power_per_amp:
+            self.limits = cfg.limits
+            return
+
+        fuse_limit_w = cfg.max_fuse_amps * power_per_amp
+        limits = dict(cfg.limits)
+        for (mode, tariff), (_, _, limit_emergency) in cfg.limits.items():
+            if mode not in BLOCK_LIMITED_MODES:
+                if limit_emergency != math.inf:
+                    limit_emergency = fuse_limit_w + cfg.buffer_watts
+                limits[(mode, tariff)] = (fuse_limit_w - cfg.buffer_watts, fuse_limit_w, limit_emergency)
+        self.limits = limits
+
+    def phase_limit_amps(self, phase_currents, charger_real_power):
+        """Največji tok polnilnice, ki ga še dopušča najbolj obremenjena uporabljena faza."""
+        cfg = self.cfg
+        charger_phase_amps = charger_real_power / self.power_per_amp
+        return min(
+            cfg.max_fuse_amps - (phase_currents[p] - charger_phase_amps) for p in self.used_phases
+        )
+
+    def block_caps(self, mode, house_load):
+        """Največji tok po tarifnih blokih pri dani porabi hiše (za načrt polnjenja)."""
+        cfg = self.cfg
+        max_amps = min(MAX_AMPS, cfg.max_fuse_amps)
+        caps = {}
+        for tariff in TARIFF_BLOCKS:
+            amps = min(max_amps, math.floor((self.limits[(mode, tariff)][0] - max(0.0, house_load)) / self.power_per_amp))
+            caps[tariff] = amps if amps >= MIN_AMPS else 0
+        return caps
+
+    def uses_demand(self, mode):
+        return self.cfg.demand_averaging and mode in BLOCK_LIMITED_MODES
+
+    def demand_limits(self, now_time, mode, tariff, next_tariff=None):
+        """Limita bloka (increase, maintain) glede na proračun 15-min intervala (W).
+
+        Zmanjšanje odloča proračun preostanka intervala - kratek sunek porabe
+        hiše ne zniža toka, dokler povprečje ostane pod limitom. Neporabljen
+        proračun dovoli povečanje do samega limita bloka (rezerva ostane v
+        povprečju), ne čez - sicer bi tok ob vsakem novem intervalu padel. Tik
+        pred koncem intervala velja trenutni limit naslednjega intervala
+        (prehod v blok z nižjim limitom).
+        """
+        cfg = self.cfg
+        demand = self.demand
+        limit_increase, limit_maintain, _ = self.limits[(mode, tariff)]
+        fuse_limit_w = cfg.max_fuse_amps * self.power_per_amp
+
+        allowed_increase = demand.allowed_power(now_time, limit_increase)
+        limit_increase = min(allowed_increase, limit_maintain, fuse_limit_w - cfg.buffer_watts)
+        limit_maintain = min(demand.allowed_power(now_time, limit_maintain), fuse_limit_w)
+
+        # Ob koncu intervala se proračun obnovi na trenutni limit (naslednjega) bloka
+        if demand.remaining(now_time) <= self.control_interval + PRE_RAMP_MARGIN:
+            next_increase, next_maintain, _ = self.limits[(mode, next_tariff or tariff)]
+            limit_increase = min(limit_increase, next_increase)
+            limit_maintain = min(limit_maintain, next_maintain)
+        return limit_increase, limit_maintain
+
+    def is_emergency(self, mode, tariff, grid_power, charger_real_power, current_hw_amps, phase_currents=None, now_time=None):
+        """Preveri, ali je varovalka ali limit bloka že prekoračen.
+
+        Z now_time in povprečenjem se limit bloka preverja na 15-min povprečju,
+        poraba hiše pa upošteva moč polnilnice, ki jo števec po ukazu že vidi.
+        """
+        cfg = self.cfg
+        if now_time is not None:
+            charger_real_power = self.response.metered_charger_power(now_time, charger_real_power)
+
+        if phase_currents is not None:
+            # Po fazah: prekoračena je katera koli faza, na kateri je polnilnica
+            if max(phase_currents[p] for p in self.used_phases) > cfg.max_fuse_amps:
+                return True
+        else:
+            house_load = grid_power - charger_real_power
+            current_total_amps = current_hw_amps + (house_load / self.power_per_amp)
+            if current_total_amps > cfg.max_fuse_amps:
+                return True
+
+        limit_emergency = self.limits[(mode, tariff)][2]
+        if now_time is not None and self.uses_demand(mode):
+            limit_emergency = self.demand.allowed_power(now_time, limit_emergency)
+        if grid_power > limit_emergency:
+            return True
+        return False
+
+    def step(
+        self,
+        now_time,
+        mode,
+        tariff,
+        grid_power,
+        charger_real_power,
+        current_hw_amps,
+        is_charging,
+        data_is_stale,
+        current_soc,
+        target_soc,
+        schedule_active,
+        share=None,
+        phase_currents=None,
+        planned_amps=0,
+        next_tariff=None,
+        forecast_load=None,
+        meter_age=0.0,
+    ) -> Decision:
+        """En korak regulacije. current_soc je None, če SoC ni znan.
+
+        share(target_mode_amps, limit_increase_w, limit_maintain_w) vrne delež
+        toka (increase, maintain), kadar si varovalko deli več polnilnic.
+        phase_currents so tokovi omrežja po fazah (A) ali None.
+        planned_amps je tok iz načrta za trenutno režo (način Departure).
+        next_tariff je blok naslednjega 15-min intervala (ali None, če ni znan).
+        forecast_load je napovedana konica porabe hiše v bližnji prihodnosti (W ali None).
+        meter_age je starost meritve omrežja (s).
+        """
+        cfg = self.cfg
+        power_per_amp = self.power_per_amp
+        control_interval = self.control_interval
+
+        self.demand.update(now_time, grid_power)
+
+        # Tik po ukazu števec in senzor polnilnice zaostajata različno - model
+        # napove moč polnilnice, ki jo števec že vidi
+        self.response.observe(now_time, charger_real_power, grid_power)
+        metered_charger_power = self.response.metered_charger_power(now_time, charger_real_power)
+
+        if mode != self._last_mode:
+            # Nov način: zgodovina presežka in stanje histereze začneta znova
+            self._last_mode = mode
+            self.pv.reset(is_charging and current_hw_amps >= MIN_AMPS)
+
+        # --- OPTIMIZACIJA: SHORT CIRCUIT ZA MODE OFF ---
+        if mode == MODE_OFF:
+            return Decision(0, False, 0, branch=BRANCH_OFF)
+
+        # --- 4. PREVERJANJE LIMITOV (SoC & Stale Data) ---
+        should_stop_session = False
+
+        if current_soc is not None and target_soc < 100:
+            if current_soc >= target_soc:
+                should_stop_session = True
+                if is_charging:
+                    _LOGGER.debug(f"EVSCI: Cilj dosežen ({current_soc}%).")
+
+        # --- 5. DOLOČANJE LIMITOV MOČI ---
+        house_load = grid_power - metered_charger_power
+        if self.uses_demand(mode):
+            limit_increase, limit_maintain = self.demand_limits(now_time, mode, tariff, next_tariff)
+        else:
+            limit_increase, limit_maintain, _ = self.limits[(mode, tariff)]
+
+        # --- 6. IZRAČUN CILJNEGA TOKA ---
+        target_mode_amps = 0
+        should_session_be_active = False
+
+        if should_stop_session: # SoC Limit
+            target_mode_amps = 0
+            should_session_be_active = False
+        else:
+            should_session_be_active = True
+
+            if mode in (MODE_MAX_POWER, MODE_DYNAMIC):
+                target_mode_amps = MAX_AMPS
+
+            elif mode == MODE_SCHEDULE:
+                target_mode_amps = MAX_AMPS if schedule_active else 0
+
+            elif mode == MODE_DEPARTURE:
+                target_mode_amps = planned_amps
+
+            elif mode in (MODE_PV_ONLY, MODE_MIN_PV):
+                excess_w = self.pv.update(now_time, metered_charger_power - grid_power)
+                pv_power_per_amp = power_per_amp
+                pv_start_power_per_amp = None
+                if cfg.phase_switching:
+                    # Pod minimalnim tokom na treh fazah polnimo enofazno
+                    phase_power_per_amp = power_per_amp / self.phases
+                    if not data_is_stale:
+                        phases = self.phase_switch.surplus_phases(now_time, excess_w, 3 * MIN_AMPS * phase_power_per_amp)
+                        self.phase_switch.request(now_time, phases)
+                    # Tok za število faz, na katerega polnjenje preklaplja; PV seja teče,
+                    # dokler zadošča presežek za eno fazo
+                    pv_power_per_amp = phase_power_per_amp * self.phase_switch.target
+                    pv_start_power_per_amp = phase_power_per_amp
+                if mode == MODE_PV_ONLY:
+                    target_mode_amps = self.pv.pv_only_amps(
+                        now_time, excess_w, pv_power_per_amp, MIN_AMPS, pv_start_power_per_amp
+                    )
+                else:
+                    target_mode_amps = max(MIN_AMPS, math.floor(excess_w / pv_power_per_amp))
+
+            if cfg.phase_switching and mode not in (MODE_PV_ONLY, MODE_MIN_PV) and not data_is_stale:
+                # Ostali načini polnijo s polno močjo
+                self.phase_switch.request(now_time, 3)
+
+        # --- 7. FINALIZACIJA ---
+        adjusted_amps = current_hw_amps
+        is_emergency = False
+        branch = BRANCH_HOLD
+        pi_active = False
+
+        if phase_currents is not None:
+            # Varovalka po fazah: odloča najbolj obremenjena faza polnilnice
+            phase_limit = self.phase_limit_amps(phase_currents, metered_charger_power)
+            buffer_amps = cfg.buffer_watts / power_per_amp
+            amps_limit_maintain = min(math.floor(phase_limit), cfg.max_fuse_amps)
+            amps_limit_increase = min(math.floor(phase_limit - buffer_amps), cfg.max_fuse_amps)
+            fuse_amps = amps_limit_maintain
+
+            # Limit bloka (W) velja še naprej za celotno moč
+            if mode in BLOCK_LIMITED_MODES:
+                amps_limit_maintain = min(amps_limit_maintain, math.floor((limit_maintain - house_load) / power_per_amp))
+                amps_limit_increase = min(amps_limit_increase, math.floor((limit_increase - house_load) / power_per_amp))
+        else:
+            amps_limit_maintain = min(math.floor((limit_maintain - house_load) / power_per_amp), cfg.max_fuse_amps)
+            amps_limit_increase = min(math.floor((limit_increase - house_load) / power_per_amp), cfg.max_fuse_amps)
+            fuse_amps = min(math.floor(cfg.max_fuse_amps - house_load / power_per_amp), cfg.max_fuse_amps)
+
+        # Omejitev za diagnostiko: limit bloka, če je strožji od varovalke
+        limited_by = None
+        if target_mode_amps > amps_limit_maintain:
+            limited_by = LIMIT_BLOCK if mode in BLOCK_LIMITED_MODES and amps_limit_maintain < fuse_amps else LIMIT_FUSE
+
+        # Delitev z ostalimi polnilnicami na isti varovalki
+        if share is not None:
+            share_increase, share_maintain = share(target_mode_amps, limit_increase, limit_maintain)
+            if share_maintain is not None:
+                if target_mode_amps > share_maintain and share_maintain < amps_limit_maintain:
+                    limited_by = LIMIT_SHARE
+                amps_limit_maintain = min(amps_limit_maintain, share_maintain)
+                amps_limit_increase = min(amps_limit_increase, share_increase)
+
+        # Kandidat
+        # Števec omrežja molči (zamrznjen senzor): toka ne povečujemo, po safe_age pa
+        # polnjenje takoj ustavimo - sunek porabe hiše med molkom ostane neviden
+        meter_unsafe = data_is_stale or meter_age > self.meter.safe_age
+        if meter_unsafe:
+            candidate_amps = 0
+        else:
+            candidate_amps = min(target_mode_amps, amps_limit_maintain)
+            if meter_age > self.meter.hold_age:
+                candidate_amps = min(candidate_amps, current_hw_amps)
+
+        # A. ZMANJŠEVANJE?
+        if candidate_amps < current_hw_amps:
+            is_emergency = self.is_emergency(mode, tariff, grid_power, charger_real_power, current_hw_amps, phase_currents, now_time)
+
+            if is_emergency:
+                 branch = BRANCH_EMERGENCY
+                 _LOGGER.info("EVSCI: Kritična preobremenitev! Znižujem takoj.")
+                 if current_hw_amps > MIN_AMPS:
+                     adjusted_amps = MIN_AMPS
+                 else:
+                     adjusted_amps = 0
+            else:
+                time_since_change = now_time - self.last_amp_change_time
+                if meter_unsafe:
+                    # Brez svežih meritev ne čakamo na interval regulacije
+                    adjusted_amps = candidate_amps
+                    branch = BRANCH_STALE
+                elif time_since_change >= control_interval:
+                    adjusted_amps = candidate_amps
+                    branch = BRANCH_DECREASE
+                else:
+                    adjusted_amps = current_hw_amps
+
+        # B. POVEČEVANJE?
+        elif candidate_amps > current_hw_amps:
+            safe_target_up = min(target_mode_amps, amps_limit_increase)
+
+            if cfg.load_forecast and forecast_load is not None and forecast_load > house_load:
+                # Pred ponavljajočo se konico porabe hiše toka ne povečujemo (zagon na minimumu ostane)
+                forecast_amps = max(current_hw_amps, MIN_AMPS, math.floor((limit_increase - forecast_load) / power_per_amp))
+                if forecast_amps < safe_target_up:
+                    safe_target_up = forecast_amps
+                    limited_by = LIMIT_FORECAST
+
+            if safe_target_up > current_hw_amps:
+                time_since_change = now_time - self.last_amp_change_time
+                is_startup = (current_hw_amps < MIN_AMPS and safe_target_up >= MIN_AMPS)
+
+                if is_startup:
+                    adjusted_amps = MIN_AMPS
+                    branch = BRANCH_STARTUP
+                elif cfg.controller == CONTROLLER_PI:
+                    # Proti razpoložljivemu toku takoj, ko se odziv prejšnjega ukaza ustali
+                    pi_active = True
+                    if time_since_change >= self.response.settle_wait():
+                        adjusted_amps = self.pi.step(now_time, safe_target_up, current_hw_amps)
+                        if adjusted_amps > current_hw_amps:
+                            branch = BRANCH_RAMP_UP
+                elif time_since_change >= max(control_interval, self.response.settle_wait()):
+                    # Povečamo šele, ko števec vidi odziv prejšnjega ukaza (tudi zagona)
+                    adjusted_amps = min(safe_target_up, current_hw_amps + RAMP_UP_STEP)
+                    branch = BRANCH_RAMP_UP
+
+        # Preklop faz: polnjenje stoji, dokler se zaporedje ne konča
+        phase_command = None
+        if cfg.phase_switching:
+            phase_command = self.phase_switch.update(now_time, is_charging, charger_real_power)
+            if self.phase_switch.busy:
+                adjusted_amps = 0
+                should_session_be_active = False
+                pi_active = False
+                branch = BRANCH_PHASE_SWITCH
+
+        # Integral velja le za neprekinjeno povečevanje
+        if not pi_active:
+            self.pi.reset()
+
+        # C. Minimum
+        if adjusted_amps < MIN_AMPS:
+            adjusted_amps = 0
+
+        # --- 8. ODLOČANJE O STANJU STIKALA ---
+        if is_charging:
+            switch_on = should_session_be_active
+        else:
+            switch_on = should_session_be_active and adjusted_amps >= MIN_AMPS
+
+        return Decision(
+            adjusted_amps,
+            switch_on,
+            amps_limit_maintain,
+            is_emergency,
+            amps_limit_increase,
+            branch,
+            limited_by,
+            phase_command,
+        )
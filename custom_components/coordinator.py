@@ -1,56 +1,68 @@
 """EVSCI Coordinator - Logika upravljanja."""
 import logging
-import math
 import datetime
 import time
-import asyncio
+from bisect import bisect_right
+from functools import partial
 from datetime import timedelta
 from homeassistant.util import dt as dt_util
 
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
-from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.storage import Store
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import STATE_ON, STATE_OFF, STATE_UNAVAILABLE, STATE_UNKNOWN
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import SERVICE_TURN_ON, SERVICE_TURN_OFF, ATTR_ENTITY_ID
-from homeassistant.components.number import SERVICE_SET_VALUE
 
 from .const import (
     DOMAIN, 
+    DATA_BALANCER,
     MODE_OFF,
-    MODE_PV_ONLY,
-    MODE_MIN_PV,
-    MODE_DYNAMIC,
-    MODE_MAX_POWER,
-    MODE_SCHEDULE,
     MODE_NO_CHANGE,
-    CONF_GRID_SENSOR,
-    CONF_SOLAR_SENSOR,
-    CONF_TARIFF_SENSOR,
-    CONF_CHARGER_SWITCH,
-    CONF_CHARGER_CURRENT,
-    CONF_CHARGER_POWER,
-    CONF_CHARGER_STATUS,
-    CONF_EV_SOC_SENSOR,
-    CONF_PHASES,
-    CONF_MAX_FUSE,
-    CONF_BUFFER,
-    CONF_CONTROL_INTERVAL,
-    CONF_AUTO_MODE,
-    CONF_RESET_ON_UNPLUG,
-    CONF_LIMIT_BLOCK_1,
-    CONF_LIMIT_BLOCK_2,
-    CONF_LIMIT_BLOCK_3,
-    CONF_LIMIT_BLOCK_4,
-    CONF_LIMIT_BLOCK_5,
+    MODE_DEPARTURE,
+    MODES,
+)
+from .actuator import ChargerActuator
+from .allocator import LoadBalancer
+from .demand import INTERVAL_SECONDS
+from .energy import EnergyAccumulator
+from .forecast import HouseLoadProfile
+from .metrics import ControlMetrics
+from .ocpp import OcppCentralSystem
+from .p1 import P1Reader
+from .planner import DeparturePlanner, tariff_block_at
+from .sessions import SessionHistory, SessionTracker, append_history, read_history
+from .telemetry import TelemetryRecorder, write_chunk
+from .control import (
+    ControlConfig,
+    ControlLaw,
+    MIN_AMPS,
+    STALE_DATA_THRESHOLD,
+    is_cable_connected,
+    is_idle,
+    is_schedule_active,
+    plan_commands,
+    split_ev_power,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
-VOLTAGE = 230
-MIN_AMPS = 6
+# Cikel regulacije; v mirovanju (kabel odklopljen ali OFF) le redko osveževanje
+UPDATE_INTERVAL = timedelta(seconds=5)
+IDLE_UPDATE_INTERVAL = timedelta(seconds=60)
+
+# Hitra pot: razmik med dvema zaporednima preverjanjema preobremenitve (s)
+FAST_PATH_COOLDOWN = 0.3
+
+# Trajno shranjevanje števcev energije
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 300  # s - zapis na disk največ enkrat na 5 minut
+STATE_SAVE_DELAY = 10  # s - sprememba načina/urnika se zapiše kmalu
+PROFILE_SAVE_DELAY = 1800  # s - naučen profil porabe hiše
 
-# VARNOSTNE KONSTANTE
-STALE_DATA_THRESHOLD = 60.0  
-RAMP_UP_STEP = 2.0           
+# Napoved porabe hiše: konica v naslednjih toliko sekundah omeji povečanje toka
+FORECAST_HORIZON = 900
 
 class EVSCICoordinator(DataUpdateCoordinator):
     """Glavni razred za upravljanje EV polnjenja."""
@@ -60,7 +72,7 @@ class EVSCICoordinator(DataUpdateCoordinator):
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=5),
+            update_interval=UPDATE_INTERVAL,
         )
         self.entry = entry
         self.selected_mode = MODE_OFF
@@ -71,315 +83,743 @@ class EVSCICoordinator(DataUpdateCoordinator):
         
         self.schedule_start = datetime.time(22, 0)
         self.schedule_end = datetime.time(6, 0)
+
+        # Način Departure: čas odhoda in načrt polnjenja
+        self.departure_time = datetime.time(7, 0)
+        self.planner = DeparturePlanner()
         
         self._last_charger_status_val = None 
         self._cable_connected = False
         
         # Energija
         self._last_update_time = time.time()
-        self.energy_inc_solar = 0.0
-        self.energy_inc_grid = 0.0
-        self.reset_session_flag = False
-        
-        # Rate Limiting
-        self._last_amp_change_time = 0.0
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+        self._store_loaded = False
+        self._save_due = None
+
+        # Regulacija se začne šele, ko imajo vhodne entitete veljavna stanja
+        self._inputs_ready = False
         
         # Spomin za tarifo
         self._last_valid_tariff = 1
         
+        # Diagnostika regulacijske zanke
+        self.metrics = ControlMetrics()
+
+        # Naučen profil porabe hiše (konice po dnevu v tednu in času dneva)
+        self.load_profile = HouseLoadProfile()
+
+        # Zgodovina sej: seja v teku (v Store) in zaključene seje (lastna datoteka, le dodajanje)
+        self.session = SessionTracker()
+        self.history = SessionHistory()
+        self._history_path = hass.config.path(".storage", f"{DOMAIN}.{entry.entry_id}.sessions")
+
+        # Zapis vsakega cikla v stolpčne datoteke (opt-in, vklopi se v _load_config/async_apply_options)
+        self.telemetry = None
+        self._telemetry_dir = hass.config.path(f"{DOMAIN}_telemetry", entry.entry_id)
+
+        # Hitra pot (zaščita varovalke med cikli)
+        self._overload_event_time = None
+        self.reaction_latency = None  # s: sprememba stanja -> number.set_value
+        self.reaction_source = None
+        self._emergency_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=FAST_PATH_COOLDOWN,
+            immediate=True,
+            function=self._async_emergency_check,
+        )
+        
         self._load_config()
+        if self.cfg.telemetry:
+            self.telemetry = TelemetryRecorder()
+        self.energy = EnergyAccumulator(self.cfg.energy_resolution, self.cfg.energy_max_interval)
+
+        # Aktuator: ukazi polnilnici tečejo v ločenem tasku
+        self.actuator = ChargerActuator(
+            hass, self.cfg.charger_switch_entity, self.cfg.charger_current_entity, self.cfg.phase_switch_entity
+        )
+        self.actuator.on_amps_sent = self._handle_amps_sent
+        self._pending_reaction_source = None
+
+        # Lokalni centralni sistem OCPP: ukazi in meritve mimo entitet polnilnice
+        self.ocpp = None
+        if self.cfg.ocpp_port:
+            try:
+                self.ocpp = OcppCentralSystem(self.cfg.ocpp_port, self.cfg.ocpp_charge_point, self.cfg.ocpp_host)
+            except ValueError as err:
+                _LOGGER.error("EVSCI: %s - ukazi gredo prek entitet.", err)
+            else:
+                self.ocpp.on_update = self._handle_ocpp_update
+                self.actuator.backend = self.ocpp
+
+        # Števec P1 neposredno (telegram vsako sekundo) - entiteta omrežja ostane rezerva
+        self.p1 = None
+        if self.cfg.p1_source:
+            try:
+                self.p1 = P1Reader(self.cfg.p1_source)
+            except ValueError as err:
+                _LOGGER.error("EVSCI: %s - omrežje se bere iz entitete.", err)
+            else:
+                self.p1.on_telegram = self._handle_p1_telegram
+
+        # Skupni delilnik varovalke (vsi vnosi na istem števcu)
+        self.balancer = hass.data.setdefault(DATA_BALANCER, LoadBalancer())
 
     def _load_config(self):
-        o = self.entry.options
-        d = self.entry.data
-        
-        self.grid_entity = o.get(CONF_GRID_SENSOR, d.get(CONF_GRID_SENSOR))
-        self.solar_entity = o.get(CONF_SOLAR_SENSOR, d.get(CONF_SOLAR_SENSOR))
-        self.tariff_entity = o.get(CONF_TARIFF_SENSOR, d.get(CONF_TARIFF_SENSOR))
-        self.charger_switch_entity = o.get(CONF_CHARGER_SWITCH, d.get(CONF_CHARGER_SWITCH))
-        self.charger_current_entity = o.get(CONF_CHARGER_CURRENT, d.get(CONF_CHARGER_CURRENT))
-        self.charger_power_entity = o.get(CONF_CHARGER_POWER, d.get(CONF_CHARGER_POWER))
-        self.charger_status_entity = o.get(CONF_CHARGER_STATUS, d.get(CONF_CHARGER_STATUS))
-        self.ev_soc_entity = o.get(CONF_EV_SOC_SENSOR, d.get(CONF_EV_SOC_SENSOR))
-        
-        self.phases = o.get(CONF_PHASES, d.get(CONF_PHASES, 3))
-        self.max_fuse_amps = o.get(CONF_MAX_FUSE, d.get(CONF_MAX_FUSE, 25))
-        self.buffer_watts = o.get(CONF_BUFFER, d.get(CONF_BUFFER, 500))
-        self.control_interval = o.get(CONF_CONTROL_INTERVAL, d.get(CONF_CONTROL_INTERVAL, 30))
-        
-        self.auto_mode_on_plugin = o.get(CONF_AUTO_MODE, d.get(CONF_AUTO_MODE, MODE_NO_CHANGE))
-        self.reset_on_unplug = o.get(CONF_RESET_ON_UNPLUG, d.get(CONF_RESET_ON_UNPLUG, False))
-        
-        self.power_per_amp = VOLTAGE * self.phases 
-
-        self.block_limits = {
-            1: o.get(CONF_LIMIT_BLOCK_1, d.get(CONF_LIMIT_BLOCK_1, 6000)),
-            2: o.get(CONF_LIMIT_BLOCK_2, d.get(CONF_LIMIT_BLOCK_2, 6000)),
-            3: o.get(CONF_LIMIT_BLOCK_3, d.get(CONF_LIMIT_BLOCK_3, 6000)),
-            4: o.get(CONF_LIMIT_BLOCK_4, d.get(CONF_LIMIT_BLOCK_4, 6000)),
-            5: o.get(CONF_LIMIT_BLOCK_5, d.get(CONF_LIMIT_BLOCK_5, 6000)),
+        """Zgradi posnetek nastavitev - kliče se le ob spremembi opcij, ne vsak cikel."""
+        self.cfg = ControlConfig.from_entry(self.entry)
+        self.law = ControlLaw(self.cfg)
+
+    @callback
+    def async_apply_options(self):
+        """Uveljavi spremenjene opcije brez ponovnega nalaganja vnosa.
+
+        Vrne False, če so se spremenili vhodni senzorji - takrat je potreben reload.
+        """
+        cfg = ControlConfig.from_entry(self.entry)
+        if cfg.input_entities != self.cfg.input_entities:
+            return False
+
+        self.cfg = cfg
+        self.law.reconfigure(cfg)
+        self.energy.configure(cfg.energy_resolution, cfg.energy_max_interval)
+        self.actuator.set_entities(cfg.charger_switch_entity, cfg.charger_current_entity, cfg.phase_switch_entity)
+        if cfg.telemetry and self.telemetry is None:
+            self.telemetry = TelemetryRecorder()
+        elif not cfg.telemetry and self.telemetry is not None:
+            # Izklop - zapisani cikli ostanejo na disku, nepoln kos se zapiše
+            chunk = self.telemetry.take()
+            if chunk is not None:
+                self.hass.async_create_task(self._async_write_telemetry(self.telemetry, chunk))
+            self.telemetry = None
+        # Limiti blokov ali kapaciteta baterije spremenijo načrt do odhoda
+        self.planner.invalidate()
+        _LOGGER.info("EVSCI: Nove nastavitve uveljavljene brez ponovnega nalaganja.")
+        return True
+
+    async def async_load_storage(self):
+        """Naloži shranjene števce energije in stanje krmilnika (pred prvim ciklom)."""
+        stored = await self._store.async_load()
+        if stored:
+            self.energy.restore(stored.get("energy", {}), time.time())
+            self._restore_state(stored.get("controller", {}))
+            if "load_profile" in stored and not self.load_profile.restore(stored["load_profile"]):
+                _LOGGER.warning("EVSCI: Shranjen profil porabe hiše ni veljaven - učenje začne znova.")
+            self.session.restore(stored.get("session", {}))
+            self._store_loaded = True
+        try:
+            self.history = await self.hass.async_add_executor_job(read_history, self._history_path)
+        except (OSError, ValueError) as err:
+            _LOGGER.error("EVSCI: Zgodovine sej ni mogoče prebrati (%s).", err)
+
+    async def async_start_ocpp(self):
+        """Zažene OCPP strežnik. Če vrata niso prosta, ukazi ostanejo na entitetah."""
+        if self.ocpp is None:
+            return
+        try:
+            await self.ocpp.async_start()
+        except OSError as err:
+            _LOGGER.error("EVSCI: OCPP strežnika ni mogoče zagnati na vratih %s (%s) - ukazi gredo prek entitet.", self.cfg.ocpp_port, err)
+            self.actuator.backend = None
+            self.ocpp = None
+            return
+        self.entry.async_on_unload(self.ocpp.async_stop)
+
+    @callback
+    def async_start_p1(self):
+        """Zažene branje števca P1 (ponovne povezave tečejo v ozadju)."""
+        if self.p1 is None:
+            return
+        self.p1.async_start(
+            lambda coro: self.entry.async_create_background_task(self.hass, coro, "evsci_p1")
+        )
+        self.entry.async_on_unload(self.p1.async_stop)
+
+    def _restore_state(self, data):
+        """Način, urnik, cilj in zadnje znano stanje priklopa/tarife iz prejšnjega zagona."""
+        if data.get("mode") in MODES:
+            self.selected_mode = data["mode"]
+        for attr in ("schedule_start", "schedule_end", "departure_time"):
+            try:
+                setattr(self, attr, datetime.time.fromisoformat(data[attr]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        if isinstance(data.get("user_target_soc"), int):
+            self.user_target_soc = data["user_target_soc"]
+        if data.get("tariff") in (1, 2, 3, 4, 5):
+            self._last_valid_tariff = data["tariff"]
+        self._cable_connected = bool(data.get("cable_connected", False))
+
+    @property
+    def needs_energy_migration(self):
+        """Ni shranjenih števcev - skupno energijo prevzamemo iz zadnjega stanja senzorjev."""
+        return not self._store_loaded
+
+    def seed_lifetime_energy(self, key, kwh):
+        self.energy.seed_lifetime(key, kwh, time.time())
+        self._schedule_save()
+
+    def _data_to_store(self):
+        self._save_due = None
+        return {
+            "energy": self.energy.as_dict(),
+            "controller": {
+                "mode": self.selected_mode,
+                "schedule_start": self.schedule_start.isoformat(),
+                "schedule_end": self.schedule_end.isoformat(),
+                "departure_time": self.departure_time.isoformat(),
+                "user_target_soc": self.user_target_soc,
+                "tariff": self._last_valid_tariff,
+                "cable_connected": self._cable_connected,
+            },
+            "load_profile": self.load_profile.as_dict(),
+            "session": self.session.as_dict(),
+        }
+
+    @callback
+    def _schedule_save(self, delay=STORAGE_SAVE_DELAY):
+        """Odložen zapis. Ponovni klic roka ne prestavi (async_delay_save bi ga), lahko ga le skrajša."""
+        due = time.time() + delay
+        if self._save_due is not None and self._save_due <= due:
+            return
+        self._save_due = due
+        self._store.async_delay_save(self._data_to_store, delay)
+
+    @callback
+    def save_state(self):
+        """Uporabnik je spremenil način, urnik ali cilj - stanje preživi ponovni zagon."""
+        self._schedule_save(STATE_SAVE_DELAY)
+
+    def diagnostic_state(self):
+        """Notranje stanje koordinatorja za prenos diagnostike."""
+        return {
+            "mode": self.selected_mode,
+            "cable_connected": self._cable_connected,
+            "last_valid_tariff": self._last_valid_tariff,
+            "inputs_ready": self._inputs_ready,
+            "idle": self.update_interval == IDLE_UPDATE_INTERVAL,
+            "calculated_amps": self.calculated_amp,
+            "power_per_amp": self.law.power_per_amp,
+            "phase_switch": self.law.phase_switch.as_dict(),
+            "control_interval": self.law.control_interval,
+            "charger_response": self.law.response.as_dict(),
+            "meter": self.law.meter.as_dict(),
+            "ocpp": self.ocpp.charge_point.as_dict() if self.ocpp and self.ocpp.charge_point else None,
+            "p1": self.p1.as_dict() if self.p1 else None,
+            "load_profile_learned_slots": self.load_profile.learned_slots,
+            "session": self.session.as_dict(),
+            "history_sessions": len(self.history),
+            "telemetry": {**self.telemetry.as_dict(), "directory": self._telemetry_dir} if self.telemetry else None,
+            "reaction_latency": self.reaction_latency,
+            "reaction_source": self.reaction_source,
+            "data": self.data,
         }
 
+    def _inputs_valid(self):
+        """Vhodne entitete, od katerih je odvisna regulacija, imajo veljavno stanje."""
+        cfg = self.cfg
+        entities = (
+            cfg.grid_entity,
+            cfg.charger_power_entity,
+            cfg.charger_current_entity,
+            cfg.charger_switch_entity,
+            cfg.charger_status_entity,
+        )
+        now_time = time.time()
+        if self.ocpp and self.ocpp.fresh_charge_point(now_time):
+            # Polnilnico beremo prek OCPP - njene entitete niso potrebne
+            entities = (cfg.grid_entity,)
+        if self.p1 and self.p1.fresh_reading(now_time) is not None:
+            # Omrežje beremo s števca P1
+            entities = tuple(e for e in entities if e != cfg.grid_entity)
+        for entity_id in entities:
+            if not entity_id:
+                continue
+            state = self.hass.states.get(entity_id)
+            if state is None or state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+                return False
+        return True
+
+    async def async_shutdown(self):
+        """Ob odstranitvi vnosa števce takoj zapiše na disk."""
+        await super().async_shutdown()
+        await self._store.async_save(self._data_to_store())
+        if self.telemetry is not None:
+            chunk = self.telemetry.take()
+            if chunk is not None:
+                await self._async_write_telemetry(self.telemetry, chunk)
+
+    @callback
+    def async_start_listeners(self):
+        """Naroči se na spremembe vhodnih entitet (hitra pot). Vrne funkcijo za odjavo."""
+        cfg = self.cfg
+        entities = [
+            e for e in (cfg.grid_entity, cfg.charger_power_entity, cfg.charger_status_entity) if e
+        ]
+        if cfg.phase_entities:
+            entities.extend(e for e in cfg.phase_entities if e)
+        unsub_state = async_track_state_change_event(self.hass, entities, self._handle_input_change)
+
+        @callback
+        def _unsub():
+            unsub_state()
+            self._emergency_debouncer.async_shutdown()
+            self.balancer.release(cfg.grid_entity, self.entry.entry_id)
+
+        return _unsub
+
+    @callback
+    def _handle_input_change(self, event):
+        """Sprememba vhodne entitete - preobremenitev obdelamo takoj, ne šele v naslednjem ciklu."""
+        if not self._inputs_ready:
+            # Pred prvim veljavnim ciklom (zagon HA) ne ukrepamo
+            return
+
+        response = self.law.response
+        if response.observing:
+            # Odziv na ukaz merimo ob vsaki spremembi, ne le ob ciklu
+            response.observe(
+                event.time_fired_timestamp,
+                self._get_float_state(self.cfg.charger_power_entity),
+                self._read_grid(event.time_fired_timestamp)[0],
+            )
+
+        entity_id = event.data["entity_id"]
+        if entity_id == self.cfg.grid_entity and not (self.p1 and self.p1.fresh(event.time_fired_timestamp)):
+            # Ritem števca omrežja (s P1 ga določajo telegrami)
+            self.law.meter.update(event.time_fired_timestamp)
+
+        if entity_id == self.cfg.charger_status_entity:
+            # Priklop/odklop obdela redni cikel, a brez čakanja na interval
+            self.hass.async_create_task(self.async_request_refresh())
+            return
+
+        self._check_overload(event.time_fired_timestamp)
+
+    @callback
+    def _handle_ocpp_update(self, status_changed):
+        """Meritev ali sprememba stanja polnilnice prek OCPP - enako kot sprememba vhodne entitete."""
+        if not self._inputs_ready:
+            return
+
+        charge_point = self.ocpp.charge_point
+        response = self.law.response
+        if response.observing and charge_point is not None and charge_point.power is not None:
+            response.observe(time.time(), charge_point.power, self._read_grid(time.time())[0])
+
+        if status_changed:
+            self.hass.async_create_task(self.async_request_refresh())
+            return
+
+        self._check_overload(time.time())
+
+    @callback
+    def _handle_p1_telegram(self):
+        """Nov telegram števca P1 - enako kot sprememba entitete omrežja, a vsako sekundo."""
+        if not self._inputs_ready:
+            return
+
+        event_time = self.p1.telegram_time
+        self.law.meter.update(event_time)
+        response = self.law.response
+        if response.observing:
+            charger_power, _, _, _ = self._read_charger(event_time)
+            response.observe(event_time, charger_power, self.p1.reading["power"])
+
+        self._check_overload(event_time)
+
+    @callback
+    def _check_overload(self, event_time):
+        """Hitra pot: ob preobremenitvi sproži takojšen izračun (z debouncerjem)."""
+        if self.selected_mode == MODE_OFF or not self.is_charging:
+            return
+
+        grid_power, charger_real_power, current_hw_amps, phase_currents = self._read_fast_inputs()
+        if grid_power is None:
+            return
+
+        if self.law.is_emergency(self.selected_mode, self._last_valid_tariff, grid_power, charger_real_power, current_hw_amps, phase_currents, event_time):
+            if self._overload_event_time is None:
+                self._overload_event_time = event_time
+            self._emergency_debouncer.async_schedule_call()
+
+    def _read_fast_inputs(self):
+        """Prebere samo vhode, potrebne za preverjanje preobremenitve."""
+        now_time = time.time()
+        grid_power, _ = self._read_grid(now_time)
+        if grid_power is None:
+            return None, 0.0, 0.0, None
+
+        charger_real_power, current_hw_amps, _, _ = self._read_charger(now_time)
+        return grid_power, charger_real_power, current_hw_amps, self._read_phase_currents()
+
+    def _read_grid(self, now_time):
+        """Moč omrežja (W) in čas meritve.
+
+        S števca P1, če ima svež telegram, sicer iz entitete; (None, None), če ni veljavne.
+        """
+        meter = self.p1.fresh_reading(now_time) if self.p1 else None
+        if meter is not None:
+            return meter["power"], self.p1.telegram_time
+
+        grid_state = self.hass.states.get(self.cfg.grid_entity)
+        try:
+            return float(grid_state.state), grid_state.last_updated.timestamp()
+        except (AttributeError, TypeError, ValueError):
+            return None, None
+
+    def _meter_phase_values(self, key):
+        """Vrednosti po fazah s svežega telegrama P1 ali None, če katera od uporabljenih faz manjka."""
+        meter = self.p1.fresh_reading(time.time()) if self.p1 else None
+        values = meter.get(key) if meter is not None else None
+        if values is None or any(values[p] is None for p in self.cfg.used_phases):
+            return None
+        return [values[p] or 0.0 for p in range(3)]
+
+    def _read_charger(self, now_time):
+        """Moč (W), tok (A), vklop in status polnilnice.
+
+        Iz OCPP, če je polnilnica povezana in ima svežo meritev, sicer iz entitet.
+        """
+        charge_point = self.ocpp.fresh_charge_point(now_time) if self.ocpp else None
+        if charge_point is not None:
+            amps = charge_point.amps
+            return charge_point.power or 0.0, amps if amps is not None else 6.0, charge_point.charging, charge_point.status
+
+        cfg = self.cfg
+        charger_real_power = self._get_float_state(cfg.charger_power_entity)
+        charger_current_state = self.hass.states.get(cfg.charger_current_entity)
+        current_hw_amps = float(charger_current_state.state) if charger_current_state and charger_current_state.state.replace('.','').isdigit() else 6.0
+        switch_state = self.hass.states.get(cfg.charger_switch_entity)
+        is_charging = (switch_state.state == "on") if switch_state else False
+        status_state = self.hass.states.get(cfg.charger_status_entity) if cfg.charger_status_entity else None
+        return charger_real_power, current_hw_amps, is_charging, status_state.state if status_state else None
+
+    def _read_phase_values(self, entities):
+        """Prebere vrednosti po fazah; None, če katera od uporabljenih faz ni veljavna."""
+        values = [0.0, 0.0, 0.0]
+        for p in self.cfg.used_phases:
+            state = self.hass.states.get(entities[p])
+            try:
+                values[p] = float(state.state)
+            except (AttributeError, TypeError, ValueError):
+                return None
+        return values
+
+    def _read_phase_currents(self):
+        """Tokovi omrežja po fazah (A). Senzorje moči (W) pretvori z napetostjo faze."""
+        cfg = self.cfg
+        currents = self._meter_phase_values("currents")
+        if currents is not None:
+            return currents
+        if not cfg.phase_entities:
+            return None
+
+        currents = self._read_phase_values(cfg.phase_entities)
+        if currents is None:
+            # Manjkajoča faza - varno nazaj na skupni model
+            return None
+
+        voltage = self.law.power_per_amp / len(self.law.used_phases)
+        for p in cfg.used_phases:
+            state = self.hass.states.get(cfg.phase_entities[p])
+            unit = state.attributes.get("unit_of_measurement")
+            if unit == "W":
+                currents[p] /= voltage
+            elif unit == "kW":
+                currents[p] = currents[p] * 1000 / voltage
+        return currents
+
+    def _update_voltages(self):
+        """Moč na amper iz izmerjenih napetosti (ali nazivnih 230 V)."""
+        cfg = self.cfg
+        voltages = self._meter_phase_values("voltages")
+        if voltages is None and cfg.voltage_entities:
+            voltages = self._read_phase_values(cfg.voltage_entities)
+        if cfg.voltage_entities or self.p1:
+            # Nesmiselne vrednosti (npr. 0 V ob izpadu senzorja) ignoriramo
+            if voltages is not None and any(not 180 <= voltages[p] <= 270 for p in cfg.used_phases):
+                voltages = None
+            self.law.set_voltages(voltages)
+
+    def _read_active_phases(self):
+        """Število faz iz stikala faz polnilnice (vklopljeno = 3) ali None."""
+        if not self.cfg.phase_switching:
+            return None
+        state = self.hass.states.get(self.cfg.phase_switch_entity)
+        if state is None:
+            return None
+        if state.state == STATE_ON:
+            return 3
+        if state.state == STATE_OFF:
+            return 1
+        return None
+
+    async def _async_emergency_check(self):
+        """Takojšnje znižanje toka ob preobremenitvi (debounced, izven rednega cikla)."""
+        event_time = self._overload_event_time
+        self._overload_event_time = None
+
+        if self.selected_mode == MODE_OFF or not self.is_charging:
+            return
+
+        grid_power, charger_real_power, current_hw_amps, phase_currents = self._read_fast_inputs()
+        if grid_power is None:
+            return
+        if not self.law.is_emergency(self.selected_mode, self._last_valid_tariff, grid_power, charger_real_power, current_hw_amps, phase_currents, time.time()):
+            return
+
+        adjusted_amps = MIN_AMPS if current_hw_amps > MIN_AMPS else 0
+        if adjusted_amps == current_hw_amps:
+            return
+
+        _LOGGER.info("EVSCI: Kritična preobremenitev (hitra pot)! Znižujem takoj.")
+        self.metrics.record_emergency(fast_path=True)
+        self._submit_current(adjusted_amps, event_time, "fast_path")
+        self.calculated_amp = adjusted_amps
+
+        if self.data is not None:
+            self.async_set_updated_data({
+                **self.data,
+                "target_current": adjusted_amps,
+                "reaction_latency": self.reaction_latency,
+            })
+
+    def _submit_current(self, target_amps, event_time=None, source=None, switch=None):
+        """Preda nov tok aktuatorju (brez čakanja na polnilnico)."""
+        if event_time is not None:
+            self._pending_reaction_source = source
+        self.law.last_amp_change_time = time.time()
+        self.actuator.submit(target_amps, switch, event_time)
+
+    @callback
+    def _handle_amps_sent(self, amps, sent_time, event_time):
+        """Aktuator je poslal number.set_value - zabeleži čas spremembe in reakcijski čas."""
+        self.law.last_amp_change_time = sent_time
+        self.law.response.command(sent_time, amps, self.law.power_per_amp, MIN_AMPS)
+        if event_time is not None:
+            self.reaction_latency = max(0.0, sent_time - event_time)
+            self.reaction_source = self._pending_reaction_source
+
     def _is_schedule_active(self):
-        now = dt_util.now().time()
-        start = self.schedule_start
-        end = self.schedule_end
-        if start <= end:
-            return start <= now < end
-        else:
-            return now >= start or now < end
+        return is_schedule_active(self.schedule_start, self.schedule_end, dt_util.now().time())
 
     async def _async_update_data(self):
         """Glavna logika."""
-        self._load_config()
+        cfg = self.cfg
+        tick_start = time.perf_counter()
         
         now_time = time.time()
         time_diff = now_time - self._last_update_time
         self._last_update_time = now_time
-        self.reset_session_flag = False
+
+        # --- 0. ZAGON: brez ukazov polnilnici, dokler vhodi niso veljavni ---
+        if not self._inputs_ready:
+            if not self._inputs_valid():
+                _LOGGER.debug("EVSCI: Vhodne entitete še niso na voljo - čakam z regulacijo.")
+                return {
+                    **(self.data or {}),
+                    "mode": self.selected_mode,
+                    "tariff": self._last_valid_tariff,
+                    "data_is_stale": True,
+                }
+            self._inputs_ready = True
+            _LOGGER.info("EVSCI: Vhodne entitete so veljavne - začenjam regulacijo.")
 
         # --- 1. BRANJE SENZORJEV & VARNOST ---
-        grid_state = self.hass.states.get(self.grid_entity)
-        grid_power = 0.0
+        grid_power, grid_time = self._read_grid(now_time)
         data_is_stale = False
 
-        if grid_state:
-            try:
-                grid_power = float(grid_state.state)
-                time_diff_sensor = dt_util.now() - grid_state.last_updated
-                if time_diff_sensor.total_seconds() > STALE_DATA_THRESHOLD:
-                    data_is_stale = True
-                    if self.selected_mode != MODE_OFF:
-                        _LOGGER.warning(f"EVSCI: Podatki omrežja stari {time_diff_sensor.total_seconds():.0f}s! Pavza.")
-            except:
-                data_is_stale = True
-        else:
+        if grid_power is None:
+            grid_power = 0.0
+            data_is_stale = True
+        elif now_time - grid_time > STALE_DATA_THRESHOLD:
             data_is_stale = True
+            if self.selected_mode != MODE_OFF:
+                _LOGGER.warning(f"EVSCI: Podatki omrežja stari {now_time - grid_time:.0f}s! Pavza.")
 
-        solar_power = self._get_float_state(self.solar_entity)
+        solar_power = self._get_float_state(cfg.solar_entity)
         
         # --- BRANJE TARIFE (POPRAVLJENO) ---
         # -1 pomeni, da je branje neuspešno
-        raw_tariff = self._get_int_state(self.tariff_entity, -1)
+        raw_tariff = self._get_int_state(cfg.tariff_entity, -1)
         
         if 1 <= raw_tariff <= 5:
             # Če je tarifa validna, jo shrani in uporabi
+            if raw_tariff != self._last_valid_tariff:
+                self._schedule_save(STATE_SAVE_DELAY)
             self._last_valid_tariff = raw_tariff
             tariff = raw_tariff
         else:
             # Če je napaka ali unavailable, uporabi zadnjo znano
             tariff = self._last_valid_tariff
         
-        charger_real_power = self._get_float_state(self.charger_power_entity)
-        
-        charger_current_state = self.hass.states.get(self.charger_current_entity)
-        current_hw_amps = float(charger_current_state.state) if charger_current_state and charger_current_state.state.replace('.','').isdigit() else 6.0
-        
-        switch_state = self.hass.states.get(self.charger_switch_entity)
-        self.is_charging = (switch_state.state == "on") if switch_state else False
+        charger_real_power, current_hw_amps, self.is_charging, charger_status = self._read_charger(now_time)
 
-        current_soc = 0
-        soc_is_valid = False
-        if self.ev_soc_entity:
-            soc_state = self.hass.states.get(self.ev_soc_entity)
+        current_soc = None
+        if cfg.ev_soc_entity:
+            soc_state = self.hass.states.get(cfg.ev_soc_entity)
             if soc_state and soc_state.state.isdigit():
                 current_soc = int(soc_state.state)
-                soc_is_valid = True
+
+        self._update_voltages()
+        self.law.confirm_phases(now_time, self._read_active_phases())
+        phase_currents = self._read_phase_currents()
 
         # --- 2. ENERGIJA ---
-        ev_grid_power_usage = 0.0
-        ev_solar_power_usage = 0.0
-        if charger_real_power > 0:
-            if grid_power > 0:
-                ev_grid_power_usage = min(charger_real_power, grid_power)
-            else:
-                ev_grid_power_usage = 0.0
-            ev_solar_power_usage = charger_real_power - ev_grid_power_usage
-            if ev_solar_power_usage < 0: ev_solar_power_usage = 0
+        ev_grid_power_usage, ev_solar_power_usage = split_ev_power(charger_real_power, grid_power)
 
         safe_time_diff = min(time_diff, 60.0) 
-        self.energy_inc_grid = (ev_grid_power_usage * safe_time_diff) / 3600000.0
-        self.energy_inc_solar = (ev_solar_power_usage * safe_time_diff) / 3600000.0
+        self.energy.add(ev_grid_power_usage, ev_solar_power_usage, safe_time_diff)
+        if self._cable_connected:
+            self.session.add(
+                tariff,
+                charger_real_power,
+                ev_grid_power_usage,
+                safe_time_diff,
+                self._current_price(),
+                current_hw_amps,
+                current_soc,
+            )
+        force_publish = False
 
         # --- 3. LOGIKA PRIKLOPA ---
-        if self.charger_status_entity:
-            status_state = self.hass.states.get(self.charger_status_entity)
-            if status_state:
-                current_status_val = status_state.state
-                is_idle = current_status_val in ["0", "State A - Idle", "unavailable", "unknown", "False", "No cable plugged"]
-                is_connected_now = not is_idle
-
-                if is_connected_now and not self._cable_connected:
-                    _LOGGER.info(f"EVSCI: Priklop kabla! Resetiram sejo.")
-                    self.reset_session_flag = True
-                    if self.auto_mode_on_plugin != MODE_NO_CHANGE:
-                        self.selected_mode = self.auto_mode_on_plugin
-                        self.async_set_updated_data(self.data)
-
-                elif not is_connected_now and self._cable_connected:
-                    _LOGGER.info("EVSCI: Odklop kabla!")
-                    if self.reset_on_unplug:
-                        self.selected_mode = MODE_OFF
-                        self.async_set_updated_data(self.data)
-                
-                self._cable_connected = is_connected_now
-                self._last_charger_status_val = current_status_val
-
-        # --- OPTIMIZACIJA: SHORT CIRCUIT ZA MODE OFF ---
-        if self.selected_mode == MODE_OFF:
-            self.calculated_amp = 0
-            # Pošljemo ukaz za izklop (tok 0, stikalo OFF)
-            await self._apply_changes(0, False, current_hw_amps)
+        if charger_status is not None:
+            current_status_val = charger_status
+            is_connected_now = is_cable_connected(current_status_val)
+
+            if is_connected_now and not self._cable_connected:
+                _LOGGER.info(f"EVSCI: Priklop kabla! Resetiram sejo.")
+                self.energy.reset_session()
+                self.session.begin(now_time)
+                self.planner.invalidate()
+                force_publish = True
+                if cfg.auto_mode_on_plugin != MODE_NO_CHANGE:
+                    self.selected_mode = cfg.auto_mode_on_plugin
+                    self.async_set_updated_data(self.data)
+
+            elif not is_connected_now and self._cable_connected:
+                _LOGGER.info("EVSCI: Odklop kabla!")
+                self.planner.invalidate()
+                self._finish_session(now_time)
+                if cfg.reset_on_unplug:
+                    self.selected_mode = MODE_OFF
+                    self.async_set_updated_data(self.data)
             
-            # Vrni podatke
-            return {
-                "grid_power": grid_power,
-                "charger_power": charger_real_power,
-                "tariff": tariff,
-                "mode": self.selected_mode,
-                "target_current": 0,
-                "is_charging": self.is_charging,
-                "safety_amps_limit": 0,
-                "data_is_stale": data_is_stale,
-                "current_soc": current_soc if soc_is_valid else None,
-                "energy_inc_grid": self.energy_inc_grid,
-                "energy_inc_solar": self.energy_inc_solar,
-                "reset_session": self.reset_session_flag
-            }
-
-        # --- 4. PREVERJANJE LIMITOV (SoC & Stale Data) ---
-        force_pause = False
-        should_stop_session = False
-
-        if data_is_stale:
-            force_pause = True
-        
-        if soc_is_valid and self.user_target_soc < 100:
-            if current_soc >= self.user_target_soc:
-                force_pause = True
-                should_stop_session = True
-                if self.is_charging and self.selected_mode != MODE_OFF:
-                    _LOGGER.debug(f"EVSCI: Cilj dosežen ({current_soc}%).")
-
-        # --- 5. DOLOČANJE LIMITOV MOČI ---
-        house_load = grid_power - charger_real_power
-        fuse_limit_w = self.max_fuse_amps * self.power_per_amp
-        block_limit_w = self.block_limits.get(tariff, 6000)
-        
-        if self.selected_mode in [MODE_DYNAMIC, MODE_SCHEDULE]:
-            limit_base = block_limit_w
-        else:
-            limit_base = fuse_limit_w
-
-        limit_increase = limit_base - self.buffer_watts
-        limit_maintain = limit_base
-        limit_emergency = limit_base + self.buffer_watts
-
-        # --- 6. IZRAČUN CILJNEGA TOKA ---
-        target_mode_amps = 0
-        should_session_be_active = False
-
-        if should_stop_session: # SoC Limit
-            target_mode_amps = 0
-            should_session_be_active = False
+            elif is_connected_now and not self.session.active:
+                # Kabel je bil priklopljen že pred nadgradnjo - seja teče od zdaj
+                self.session.begin(now_time)
+
+            if is_connected_now != self._cable_connected:
+                self._schedule_save(STATE_SAVE_DELAY)
+            self._cable_connected = is_connected_now
+            self._last_charger_status_val = current_status_val
+
+        # Senzorji energije dobijo novo vrednost le ob dovolj veliki spremembi
+        if self.energy.maybe_publish(now_time, force_publish):
+            self._schedule_save()
+
+        planned_amps = 0
+        if self.selected_mode == MODE_DEPARTURE and self._cable_connected:
+            planned_amps = self._update_plan(now_time, grid_power - charger_real_power, current_soc)
+
+        # Profil porabe hiše: učenje vsak cikel, napoved konice za povečanje toka
+        local_time = now_time + dt_util.now().utcoffset().total_seconds()
+        forecast_load = None
+        if not data_is_stale:
+            self.load_profile.update(local_time, grid_power - charger_real_power, safe_time_diff)
+            self._schedule_save(PROFILE_SAVE_DELAY)
+        if cfg.load_forecast:
+            forecast_load = self.load_profile.peak(local_time, FORECAST_HORIZON)
+
+        # --- 4.-8. REGULACIJA (control.py) ---
+        if self.selected_mode == MODE_OFF or (charger_status is not None and not self._cable_connected):
+            # Brez kabla polnilnica ne sodeluje pri delitvi varovalke
+            self.balancer.release(cfg.grid_entity, self.entry.entry_id)
+            share = None
         else:
-            should_session_be_active = True
-            
-            if self.selected_mode in [MODE_MAX_POWER, MODE_DYNAMIC]:
-                target_mode_amps = 32
-
-            elif self.selected_mode == MODE_SCHEDULE:
-                if self._is_schedule_active():
-                    target_mode_amps = 32
-                else:
-                    target_mode_amps = 0
-
-            elif self.selected_mode in [MODE_PV_ONLY, MODE_MIN_PV]:
-                excess_w = charger_real_power - grid_power
-                solar_amps = math.floor(excess_w / self.power_per_amp)
-                if self.selected_mode == MODE_PV_ONLY:
-                    target_mode_amps = solar_amps
-                else: 
-                    target_mode_amps = max(MIN_AMPS, solar_amps)
-
-        # --- 7. FINALIZACIJA ---
-        adjusted_amps = current_hw_amps
-        
-        amps_limit_maintain = math.floor((limit_maintain - house_load) / self.power_per_amp)
-        amps_limit_increase = math.floor((limit_increase - house_load) / self.power_per_amp)
-        
-        amps_limit_maintain = min(amps_limit_maintain, self.max_fuse_amps)
-        amps_limit_increase = min(amps_limit_increase, self.max_fuse_amps)
-
-        # Kandidat
-        if data_is_stale:
-            candidate_amps = 0
-        else:
-            candidate_amps = min(target_mode_amps, amps_limit_maintain)
-
-        # A. ZMANJŠEVANJE?
-        if candidate_amps < current_hw_amps:
-            is_emergency = False
-            current_total_amps = current_hw_amps + (house_load / self.power_per_amp)
-            
-            if current_total_amps > self.max_fuse_amps: is_emergency = True
-            if self.selected_mode != MODE_MAX_POWER and grid_power > limit_emergency: is_emergency = True
-
-            if is_emergency:
-                 _LOGGER.info("EVSCI: Kritična preobremenitev! Znižujem takoj.")
-                 if current_hw_amps > MIN_AMPS:
-                     adjusted_amps = MIN_AMPS
-                 else:
-                     adjusted_amps = 0
-            else:
-                time_since_change = now_time - self._last_amp_change_time
-                if time_since_change >= self.control_interval:
-                    adjusted_amps = candidate_amps
-                else:
-                    adjusted_amps = current_hw_amps
-
-        # B. POVEČEVANJE?
-        elif candidate_amps > current_hw_amps:
-            safe_target_up = min(target_mode_amps, amps_limit_increase)
-            
-            if safe_target_up > current_hw_amps:
-                time_since_change = now_time - self._last_amp_change_time
-                is_startup = (current_hw_amps < MIN_AMPS and safe_target_up >= MIN_AMPS)
-                
-                if is_startup or time_since_change >= self.control_interval:
-                    if is_startup:
-                        adjusted_amps = safe_target_up if safe_target_up < MIN_AMPS else MIN_AMPS
-                    else:
-                        max_step = current_hw_amps + RAMP_UP_STEP
-                        adjusted_amps = min(safe_target_up, max_step)
-                else:
-                    adjusted_amps = current_hw_amps
-            else:
-                adjusted_amps = current_hw_amps
-        else:
-            adjusted_amps = current_hw_amps
+            share = partial(
+                self.balancer.caps,
+                cfg.grid_entity,
+                self.entry.entry_id,
+                cfg.priority,
+                self.law.power_per_amp,
+                charger_real_power,
+                grid_power,
+                now_time,
+                charging=self.is_charging,
+            )
+
+        decision = self.law.step(
+            now_time,
+            self.selected_mode,
+            tariff,
+            grid_power,
+            charger_real_power,
+            current_hw_amps,
+            self.is_charging,
+            data_is_stale,
+            current_soc,
+            self.user_target_soc,
+            self._is_schedule_active(),
+            share,
+            phase_currents,
+            planned_amps,
+            self._next_tariff(now_time, tariff),
+            forecast_load,
+            now_time - grid_time if grid_time is not None else 0.0,
+        )
+        self.calculated_amp = decision.target_amps
 
-        # C. Minimum
-        if adjusted_amps < MIN_AMPS:
-            adjusted_amps = 0
+        emergency_event_time = None
+        if decision.is_emergency:
+            self.metrics.record_emergency()
+            emergency_event_time = grid_time
 
-        self.calculated_amp = adjusted_amps
-        
-        # --- 8. ODLOČANJE O STANJU STIKALA ---
-        final_switch_state = False
-        
-        if self.is_charging:
-            if should_session_be_active:
-                final_switch_state = True
-            else:
-                final_switch_state = False 
-        else:
-            if should_session_be_active and adjusted_amps >= MIN_AMPS:
-                final_switch_state = True
-            else:
-                final_switch_state = False
+        amps, switch = self._apply_changes(decision.target_amps, decision.switch_on, current_hw_amps, emergency_event_time)
+        if decision.phases is not None:
+            _LOGGER.info("EVSCI: Preklop polnjenja na %s faz%s.", decision.phases, "o" if decision.phases == 1 else "e")
+            self.actuator.submit(phases=decision.phases)
 
-        await self._apply_changes(adjusted_amps, final_switch_state, current_hw_amps)
+        # Mirovanje: priklop (status polnilnice) ali izbira načina cikel sprožita takoj
+        idle = not self.actuator.is_busy and is_idle(
+            self.selected_mode, self.is_charging, self._cable_connected if charger_status is not None else None
+        )
+        update_interval = IDLE_UPDATE_INTERVAL if idle else UPDATE_INTERVAL
+        if update_interval != self.update_interval:
+            _LOGGER.debug("EVSCI: %s", "Mirovanje - osveževanje na 60 s." if idle else "Konec mirovanja.")
+            self.update_interval = update_interval
+
+        self.metrics.record_stale(data_is_stale and self.selected_mode != MODE_OFF)
+        self.metrics.record_tick(
+            now_time,
+            safe_time_diff,
+            (time.perf_counter() - tick_start) * 1000.0,
+            self.selected_mode,
+            tariff,
+            grid_power,
+            charger_real_power,
+            current_hw_amps,
+            decision,
+            amps,
+            switch,
+        )
+        if self.telemetry is not None:
+            chunk = self.telemetry.record(
+                now_time,
+                self.selected_mode,
+                tariff,
+                grid_power,
+                charger_real_power,
+                current_hw_amps,
+                decision,
+                amps,
+                switch,
+                data_is_stale,
+            )
+            if chunk is not None:
+                self.hass.async_create_task(self._async_write_telemetry(self.telemetry, chunk))
 
         return {
             "grid_power": grid_power,
@@ -388,36 +828,171 @@ class EVSCICoordinator(DataUpdateCoordinator):
             "mode": self.selected_mode,
             "target_current": self.calculated_amp,
             "is_charging": self.is_charging,
-            "safety_amps_limit": amps_limit_maintain,
+            "phases": self.law.phases,
+            "safety_amps_limit": decision.amps_limit_maintain,
             "data_is_stale": data_is_stale,
-            "current_soc": current_soc if soc_is_valid else None,
-            "energy_inc_grid": self.energy_inc_grid,
-            "energy_inc_solar": self.energy_inc_solar,
-            "reset_session": self.reset_session_flag
+            "current_soc": current_soc,
+            "forecast_load": forecast_load,
+            "reaction_latency": self.reaction_latency,
         }
 
-    async def _apply_changes(self, target_amps, should_be_active, current_hw_amps):
-        """Pošiljanje ukazov."""
-        if target_amps != current_hw_amps:
-            if self.is_charging or should_be_active:
-                _LOGGER.info(f"EVSCI: Tok {current_hw_amps}A -> {target_amps}A")
-                await self.hass.services.async_call("number", SERVICE_SET_VALUE, {ATTR_ENTITY_ID: self.charger_current_entity, "value": target_amps})
-                self._last_amp_change_time = time.time()
-
-        if should_be_active and not self.is_charging:
-             if target_amps > 0: # Start Threshold
-                 _LOGGER.info("EVSCI: Start Session (Switch ON)")
-                 await self.hass.services.async_call("switch", SERVICE_TURN_ON, {ATTR_ENTITY_ID: self.charger_switch_entity})
-                 if target_amps > 0:
-                     await asyncio.sleep(1)
-                     await self.hass.services.async_call("number", SERVICE_SET_VALUE, {ATTR_ENTITY_ID: self.charger_current_entity, "value": target_amps})
-             
+    def _update_plan(self, now_time, house_load, current_soc):
+        """Tok iz načrta do odhoda. Načrt se preračuna le ob spremembi vhodov ali zaostanku."""
+        cfg = self.cfg
+        delivered_wh = (self.energy.session_grid + self.energy.session_solar) / 1000.0
+        departure = self._next_departure()
+        price_state = self.hass.states.get(cfg.price_entity) if cfg.price_entity else None
+        signature = (departure, self.user_target_soc, price_state.last_updated if price_state else None)
+
+        if self.planner.needs_replan(now_time, delivered_wh, signature):
+            capacity_wh = cfg.battery_capacity * 1000.0
+            if current_soc is not None:
+                needed_wh = capacity_wh * (self.user_target_soc - current_soc) / 100.0
+            else:
+                # Brez SoC: ciljni delež kapacitete, zmanjšan za že dostavljeno v seji
+                needed_wh = capacity_wh * self.user_target_soc / 100.0 - delivered_wh
+
+            plan = self.planner.replan(
+                now_time,
+                delivered_wh,
+                signature,
+                departure,
+                needed_wh,
+                self.law.power_per_amp,
+                self._block_at,
+                self.law.block_caps(MODE_DEPARTURE, house_load),
+                self._price_lookup(price_state),
+            )
+            _LOGGER.info(
+                "EVSCI: Načrt do odhoda: potrebno %.1f kWh, načrtovano %.1f kWh%s",
+                plan.needed_wh / 1000.0,
+                plan.planned_wh / 1000.0,
+                "" if plan.feasible else " (cilja ni mogoče doseči)",
+            )
+
+        return self.planner.amps_at(now_time)
+
+    def _finish_session(self, now_time):
+        """Odklop - zaključeno sejo doda v zgodovino in jo zapiše na konec datoteke."""
+        record = self.session.finish(now_time, self.energy.session_solar, self.energy.session_grid)
+        self._schedule_save(STATE_SAVE_DELAY)
+        if record is None:
+            return
+        self.history.append(record)
+        self.hass.async_create_task(self._async_write_session(record))
+
+    async def _async_write_session(self, record):
+        try:
+            await self.hass.async_add_executor_job(append_history, self._history_path, record)
+        except OSError as err:
+            _LOGGER.error("EVSCI: Seje ni mogoče zapisati v zgodovino (%s).", err)
+
+    async def _async_write_telemetry(self, recorder, chunk):
+        """Poln kos ciklov zapiše izven zanke dogodkov; medpomnilnik se nato vrne snemalniku."""
+        try:
+            await self.hass.async_add_executor_job(
+                write_chunk, self._telemetry_dir, chunk, self.cfg.telemetry_max_mb * 1_000_000
+            )
+        except OSError as err:
+            _LOGGER.error("EVSCI: Zapisa ciklov ni mogoče shraniti (%s).", err)
+        finally:
+            recorder.release(chunk)
+
+    def _current_price(self):
+        """Trenutna cena energije iz stanja senzorja cen ali None."""
+        if not self.cfg.price_entity:
+            return None
+        state = self.hass.states.get(self.cfg.price_entity)
+        try:
+            return float(state.state)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _next_tariff(self, now_time, tariff):
+        """Blok naslednjega 15-min intervala po koledarju NMPT.
+
+        Le, če se koledar ujema s trenutnim blokom iz senzorja - sicer (drug
+        tarifni sistem) ne napovedujemo.
+        """
+        if not self.law.uses_demand(self.selected_mode):
+            return None
+        if self._block_at(now_time) != tariff:
+            return None
+        return self._block_at((now_time // INTERVAL_SECONDS + 1) * INTERVAL_SECONDS)
+
+    def _next_departure(self):
+        """Naslednji čas odhoda (timestamp)."""
+        now = dt_util.now()
+        departure = now.replace(
+            hour=self.departure_time.hour, minute=self.departure_time.minute, second=0, microsecond=0
+        )
+        if departure <= now:
+            departure += timedelta(days=1)
+        return departure.timestamp()
+
+    @staticmethod
+    def _block_at(timestamp):
+        return tariff_block_at(dt_util.as_local(dt_util.utc_from_timestamp(timestamp)))
+
+    @staticmethod
+    def _price_lookup(price_state):
+        """Iz atributov senzorja cen (Nord Pool, ENTSO-E ...) zgradi funkcijo ts -> cena ali None."""
+        if price_state is None:
+            return None
+
+        entries = []
+        for key in ("raw_today", "raw_tomorrow", "forecast", "prices", "data"):
+            value = price_state.attributes.get(key)
+            if isinstance(value, list):
+                entries.extend(value)
+
+        slots = []
+        for item in entries:
+            if not isinstance(item, dict):
+                continue
+            start = item.get("start") or item.get("start_time") or item.get("startsAt")
+            price = item.get("value", item.get("price", item.get("total")))
+            if isinstance(start, str):
+                start = dt_util.parse_datetime(start)
+            try:
+                slots.append((start.timestamp(), float(price)))
+            except (AttributeError, TypeError, ValueError):
+                continue
+
+        if not slots:
+            return None
+        slots.sort()
+        starts = [start for start, _ in slots]
+        prices = [price for _, price in slots]
+        # Zadnja cena velja še toliko, kot je dolg predzadnji interval (privzeto 1 h)
+        horizon = starts[-1] + (starts[-1] - starts[-2] if len(starts) > 1 else 3600)
+
+        def price_at(timestamp):
+            index = bisect_right(starts, timestamp) - 1
+            if index < 0 or timestamp >= horizon:
+                return None
+            return prices[index]
+
+        return price_at
+
+    def _apply_changes(self, target_amps, should_be_active, current_hw_amps, event_time=None):
+        """Pošiljanje ukazov (prek aktuatorja - cikel ne čaka na polnilnico). Vrne (tok, stikalo)."""
+        amps, switch = plan_commands(target_amps, should_be_active, current_hw_amps, self.is_charging, self._cable_connected)
+
+        if amps is not None and amps != current_hw_amps:
+            _LOGGER.info(f"EVSCI: Tok {current_hw_amps}A -> {amps}A")
+        if switch is True:
+            _LOGGER.info("EVSCI: Start Session (Switch ON)")
+        elif switch is False:
+            _LOGGER.info("EVSCI: End Session (Switch OFF)")
         elif not should_be_active and self.is_charging:
-             if self._cable_connected:
-                 _LOGGER.info("EVSCI: End Session (Switch OFF)")
-                 await self.hass.services.async_call("switch", SERVICE_TURN_OFF, {ATTR_ENTITY_ID: self.charger_switch_entity})
-             else:
-                 _LOGGER.debug("EVSCI: Session inactive, cable unplugged. Skip switch OFF.")
+            _LOGGER.debug("EVSCI: Session inactive, cable unplugged. Skip switch OFF.")
+
+        if amps is not None:
+            self._submit_current(amps, event_time, "tick", switch)
+        elif switch is not None:
+            self.actuator.submit(None, switch)
+        return amps, switch
 
     def _get_float_state(self, entity_id):
         if not entity_id: return 0.0
@@ -436,4 +1011,8 @@ class EVSCICoordinator(DataUpdateCoordinator):
 
     def set_mode(self, mode):
         self.selected_mode = mode
+        self.save_state()
         self.async_set_updated_data(self.data)
+        if self.update_interval != UPDATE_INTERVAL:
+            # Iz mirovanja takoj v regulacijo (ne šele ob naslednjem redkem ciklu)
+            self.hass.async_create_task(self.async_request_refresh())
@@ -0,0 +1,69 @@
+"""EVSCI Demand - Povprečna moč v četrturnem obračunskem intervalu (brez odvisnosti od Home Assistanta)."""
+import math
+
+# Obračunski interval NMPT (s), poravnan na četrt ure
+INTERVAL_SECONDS = 900
+
+# Proračun ne delimo z manj kot toliko preostalega časa (sicer limit pred koncem intervala skače)
+MIN_REMAINING = 60.0
+
+# Daljša vrzel med vzorci se ne integrira (zadnja moč ne velja več) - precej nad
+# ciklom koordinatorja v mirovanju (60 s, dejanski razmik je malo daljši)
+MAX_SAMPLE_GAP = 180.0
+
+
+class DemandIntegrator:
+    """Energija tekočega četrturnega intervala, posodobitev O(1) na vzorec.
+
+    Med vzorcema velja zadnja izmerjena moč (sample-and-hold). Ob prehodu
+    meje intervala se del vzorca pripiše novemu intervalu.
+    """
+
+    __slots__ = ("interval_start", "energy_ws", "_last_time", "_last_power")
+
+    def __init__(self):
+        self.interval_start = None
+        self.energy_ws = 0.0
+        self._last_time = None
+        self._last_power = 0.0
+
+    @property
+    def interval_end(self):
+        return self.interval_start + INTERVAL_SECONDS
+
+    def update(self, now_time, grid_power):
+        """Doda vzorec moči omrežja (W)."""
+        start = math.floor(now_time / INTERVAL_SECONDS) * INTERVAL_SECONDS
+        last_time = self._last_time
+
+        if self.interval_start is None or start != self.interval_start:
+            # Nov interval: prištejemo le del od meje naprej
+            self.energy_ws = 0.0
+            if last_time is not None and now_time - last_time <= MAX_SAMPLE_GAP:
+                self.energy_ws = self._last_power * (now_time - max(last_time, start))
+            self.interval_start = start
+        elif last_time is not None and now_time - last_time <= MAX_SAMPLE_GAP:
+            self.energy_ws += self._last_power * (now_time - last_time)
+
+        self._last_time = now_time
+        self._last_power = grid_power
+
+    def average(self, now_time):
+        """Povprečna moč od začetka intervala (W)."""
+        elapsed = now_time - self.interval_start
+        return self.energy_ws / elapsed if elapsed > 0 else self._last_power
+
+    def remaining(self, now_time):
+        return self.interval_end - now_time
+
+    def allowed_power(self, now_time, limit_w, horizon=MIN_REMAINING):
+        """Moč, ki jo lahko rišemo do konca intervala, da povprečje ne preseže limit_w.
+
+        Odstopanje od limita se razporedi na preostanek intervala, a ne na manj
+        kot horizon sekund.
+        """
+        if self.interval_start is None or limit_w == math.inf:
+            return limit_w
+        elapsed = now_time - self.interval_start
+        remaining = self.interval_end - now_time
+        return limit_w + (limit_w * elapsed - self.energy_ws) / max(horizon, remaining)
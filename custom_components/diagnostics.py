@@ -0,0 +1,38 @@
+"""Diagnostika za EVSCI (Settings -> Devices & Services -> Download diagnostics)."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_OCPP_CHARGE_POINT, CONF_OCPP_HOST, CONF_P1_SOURCE
+
+# Naslovi v LAN in id polnilnice (z njim se lahko kdorkoli v omrežju predstavi kot polnilnica)
+TO_REDACT = {CONF_OCPP_HOST, CONF_OCPP_CHARGE_POINT, CONF_P1_SOURCE}
+# Ista podatka v stanju povezane polnilnice in števca P1
+TO_REDACT_STATE = {"id", "source"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Nastavitve, stanje koordinatorja in zgodovina odločitev regulacije."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    actuator = coordinator.actuator
+    state = coordinator.diagnostic_state()
+    for key in ("ocpp", "p1"):
+        if state[key] is not None:
+            state[key] = async_redact_data(state[key], TO_REDACT_STATE)
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": async_redact_data(dict(entry.options), TO_REDACT),
+        },
+        "state": state,
+        "actuator": {
+            "last_amps": actuator.last_amps,
+            "last_switch": actuator.last_switch,
+            "service_calls": actuator.service_calls,
+            "failed_calls": actuator.failed_calls,
+            "consecutive_failures": actuator.failures,
+            "offline_until": actuator.offline_until,
+        },
+        "energy": coordinator.energy.as_dict(),
+        "metrics": coordinator.metrics.as_dict(),
+    }
@@ -0,0 +1,121 @@
+"""EVSCI Energy - Števci energije z redčenjem objav (brez odvisnosti od Home Assistanta)."""
+
+# Ključi objavljenih vrednosti (enaki key_type senzorjev v sensor.py)
+ENERGY_KEYS = (
+    "session_total",
+    "session_solar",
+    "session_grid",
+    "lifetime_total",
+    "lifetime_solar",
+    "lifetime_grid",
+)
+
+DEFAULT_RESOLUTION = 0.01  # kWh
+DEFAULT_MAX_INTERVAL = 300  # s
+
+
+class EnergyAccumulator:
+    """Energija seje in skupna energija v celih mWh (seštevanje brez zaokrožitvenih napak).
+
+    Entitete dobijo novo vrednost le, ko se katera od vrednosti spremeni vsaj za
+    resolution ali ko od zadnje objave preteče max_interval (in je sprememba).
+    """
+
+    __slots__ = (
+        "session_grid",
+        "session_solar",
+        "lifetime_grid",
+        "lifetime_solar",
+        "resolution_mwh",
+        "max_interval",
+        "published",
+        "version",
+        "_published_mwh",
+        "_published_time",
+    )
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, max_interval=DEFAULT_MAX_INTERVAL):
+        self.session_grid = 0
+        self.session_solar = 0
+        self.lifetime_grid = 0
+        self.lifetime_solar = 0
+        self.resolution_mwh = max(1, round(resolution * 1_000_000))
+        self.max_interval = max_interval
+
+        self.published = dict.fromkeys(ENERGY_KEYS, 0.0)
+        self.version = 0
+        self._published_mwh = (0, 0, 0, 0)
+        self._published_time = 0.0
+
+    def configure(self, resolution, max_interval):
+        """Nova ločljivost objav (sprememba opcij) - števci ostanejo."""
+        self.resolution_mwh = max(1, round(resolution * 1_000_000))
+        self.max_interval = max_interval
+
+    def add(self, grid_w, solar_w, seconds):
+        """Prišteje energijo moči (W) v času seconds (s)."""
+        if grid_w > 0:
+            grid_mwh = round(grid_w * seconds / 3.6)
+            self.session_grid += grid_mwh
+            self.lifetime_grid += grid_mwh
+        if solar_w > 0:
+            solar_mwh = round(solar_w * seconds / 3.6)
+            self.session_solar += solar_mwh
+            self.lifetime_solar += solar_mwh
+
+    def reset_session(self):
+        self.session_grid = 0
+        self.session_solar = 0
+
+    def maybe_publish(self, now_time, force=False):
+        """Osveži objavljene vrednosti, če je sprememba dovolj velika. Vrne True ob objavi."""
+        # Seja se le resetira ali raste skupaj s skupno energijo - zadošča primerjava skupnih
+        old_session_grid, old_session_solar, old_grid, old_solar = self._published_mwh
+        session_reset = self.session_grid < old_session_grid or self.session_solar < old_session_solar
+        if not session_reset:
+            delta = max(self.lifetime_grid - old_grid, self.lifetime_solar - old_solar)
+            if delta == 0:
+                return False
+            if not force and delta < self.resolution_mwh and now_time - self._published_time < self.max_interval:
+                return False
+
+        current = (self.session_grid, self.session_solar, self.lifetime_grid, self.lifetime_solar)
+        self._published_mwh = current
+        self._published_time = now_time
+        self.version += 1
+
+        session_grid, session_solar, lifetime_grid, lifetime_solar = current
+        published = self.published
+        published["session_total"] = round((session_grid + session_solar) / 1_000_000, 3)
+        published["session_solar"] = round(session_solar / 1_000_000, 3)
+        published["session_grid"] = round(session_grid / 1_000_000, 3)
+        published["lifetime_total"] = round((lifetime_grid + lifetime_solar) / 1_000_000, 3)
+        published["lifetime_solar"] = round(lifetime_solar / 1_000_000, 3)
+        published["lifetime_grid"] = round(lifetime_grid / 1_000_000, 3)
+        return True
+
+    def as_dict(self):
+        """Podatki za shranjevanje."""
+        return {
+            "session_grid": self.session_grid,
+            "session_solar": self.session_solar,
+            "lifetime_grid": self.lifetime_grid,
+            "lifetime_solar": self.lifetime_solar,
+        }
+
+    def restore(self, data, now_time=0.0):
+        """Obnovi števce iz shranjenih podatkov."""
+        self.session_grid = int(data.get("session_grid", 0))
+        self.session_solar = int(data.get("session_solar", 0))
+        self.lifetime_grid = int(data.get("lifetime_grid", 0))
+        self.lifetime_solar = int(data.get("lifetime_solar", 0))
+        self.maybe_publish(now_time, force=True)
+
+    def seed_lifetime(self, key, kwh, now_time=0.0):
+        """Prevzem skupne energije iz starega stanja senzorja (pred uvedbo Store)."""
+        mwh = round(kwh * 1_000_000)
+        if key == "lifetime_grid":
+            self.lifetime_grid = max(self.lifetime_grid, mwh)
+        elif key == "lifetime_solar":
+            self.lifetime_solar = max(self.lifetime_solar, mwh)
+        self.maybe_publish(now_time, force=True)
@@ -0,0 +1,128 @@
+"""EVSCI Forecast - Naučen profil porabe hiše po dnevu v tednu in času dneva (brez odvisnosti od Home Assistanta)."""
+import math
+from array import array
+
+# Reže profila: četrt ure (kot obračun NMPT), 7 dni
+SLOT_SECONDS = 900
+SLOTS_PER_DAY = 86400 // SLOT_SECONDS
+SLOT_COUNT = 7 * SLOTS_PER_DAY
+
+# Ocenjujemo 90. percentil porabe v reži - ponavljajoče se konice, ne povprečje
+QUANTILE = 0.9
+
+# Korak ocene kvantila (delež razpršenosti reže) in utež razpršenosti (EWMA) na
+# SAMPLE_SECONDS opazovanja - vzorec se uteži s časom, ki ga pokriva
+SAMPLE_SECONDS = 5.0
+LEARN_RATE = 0.02
+SCALE_RATE = 0.01
+# Daljši razmik med vzorci se šteje le do te meje (kot energija v koordinatorju)
+MAX_SAMPLE_SECONDS = 60.0
+# Najmanjša razpršenost (W) - korak se ne ustavi pri mirni porabi
+MIN_SCALE = 50.0
+
+# Napoved velja, ko je reža opazovana toliko sekund (približno dva obiska), ne glede na cikel
+MIN_SECONDS = 1500
+
+# Različica zapisa v shrambi (1: število vzorcev po 5 s namesto sekund)
+PROFILE_VERSION = 2
+
+# 1. 1. 1970 je bil četrtek - indeks dneva od ponedeljka
+_EPOCH_WEEKDAY = 3
+
+
+def slot_index(local_time):
+    """Reža profila za lokalni čas (epoch sekunde s prištetim zamikom časovnega pasu)."""
+    day, seconds = divmod(int(local_time), 86400)
+    return ((day + _EPOCH_WEEKDAY) % 7) * SLOTS_PER_DAY + seconds // SLOT_SECONDS
+
+
+class HouseLoadProfile:
+    """Kvantil porabe hiše (omrežje - polnilnica) po četrturnih režah tedna.
+
+    Vsaka reža hrani le oceno kvantila, razpršenost in opazovan čas v
+    sekundah (array, O(1) pomnilnika na režo). Ocena se posodobi ob vsakem
+    vzorcu s stohastičnim približkom: nad oceno se dvigne za QUANTILE, pod
+    njo spusti za 1 - QUANTILE koraka, ki je sorazmeren razpršenosti reže in
+    času vzorca - cikel 5 s in 60 s v mirovanju se učita enako hitro.
+    """
+
+    __slots__ = ("quantile", "scale", "seconds")
+
+    def __init__(self):
+        self.quantile = array("f", bytes(4 * SLOT_COUNT))
+        self.scale = array("f", bytes(4 * SLOT_COUNT))
+        self.seconds = array("I", bytes(4 * SLOT_COUNT))
+
+    def update(self, local_time, house_load, dt=SAMPLE_SECONDS):
+        """Doda vzorec porabe hiše (W), ki velja dt sekund."""
+        index = slot_index(local_time)
+        seconds = self.seconds[index]
+        dt = min(max(dt, 0.0), MAX_SAMPLE_SECONDS)
+        if seconds == 0:
+            self.quantile[index] = house_load
+            self.scale[index] = max(MIN_SCALE, abs(house_load) * 0.5)
+        else:
+            weight = dt / SAMPLE_SECONDS
+            estimate = self.quantile[index]
+            scale = self.scale[index]
+            scale += (1.0 - (1.0 - SCALE_RATE) ** weight) * (abs(house_load - estimate) - scale)
+            scale = max(MIN_SCALE, scale)
+            step = LEARN_RATE * scale * weight
+            if house_load > estimate:
+                estimate += step * QUANTILE
+            else:
+                estimate -= step * (1.0 - QUANTILE)
+            self.quantile[index] = estimate
+            self.scale[index] = scale
+        self.seconds[index] = seconds + round(dt)
+
+    def predict(self, local_time):
+        """Kvantil porabe v reži ali None, dokler reža ni naučena."""
+        index = slot_index(local_time)
+        if self.seconds[index] < MIN_SECONDS:
+            return None
+        return self.quantile[index]
+
+    def peak(self, local_time, horizon):
+        """Največja napovedana poraba od zdaj do horizon sekund naprej (W) ali None."""
+        peak = None
+        end = local_time + horizon
+        moment = local_time
+        while True:
+            value = self.predict(moment)
+            if value is not None and (peak is None or value > peak):
+                peak = value
+            next_slot = (moment // SLOT_SECONDS + 1) * SLOT_SECONDS
+            if next_slot > end:
+                return peak
+            moment = next_slot
+
+    @property
+    def learned_slots(self):
+        return sum(1 for seconds in self.seconds if seconds >= MIN_SECONDS)
+
+    def as_dict(self):
+        """Zapis za shrambo (W zaokroženo)."""
+        return {
+            "version": PROFILE_VERSION,
+            "quantile": [round(value) for value in self.quantile],
+            "scale": [round(value) for value in self.scale],
+            "seconds": list(self.seconds),
+        }
+
+    def restore(self, data):
+        """Naloži shranjen profil; neveljaven zapis (neznana različica, dolžina) se prezre."""
+        try:
+            if data.get("version") != PROFILE_VERSION:
+                return False
+            seconds = array("I", data["seconds"])
+            quantile = array("f", data["quantile"])
+            scale = array("f", data["scale"])
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+            return False
+        if not len(quantile) == len(scale) == len(seconds) == SLOT_COUNT:
+            return False
+        if not all(math.isfinite(value) for value in quantile):
+            return False
+        self.quantile, self.scale, self.seconds = quantile, scale, seconds
+        return True
@@ -0,0 +1,57 @@
+"""EVSCI Meter - Ritem osveževanja števca omrežja in zaznava molka (brez odvisnosti od Home Assistanta)."""
+
+# Starost meritve omrežja (s), pri kateri toka ne povečujemo oz. polnjenje ustavimo -
+# veljata, dokler ritem števca ni znan, in kot zgornja meja za počasne števce
+METER_HOLD_AGE = 15.0
+METER_SAFE_AGE = 30.0
+
+# Molk, dolg toliko običajnih razmikov osveževanja, pomeni zamrznjen števec
+HOLD_PERIODS = 3.0
+SAFE_PERIODS = 6.0
+
+# Krajših razmikov ne upoštevamo (s)
+MIN_PERIOD = 1.0
+
+# Daljši razmik se upošteva hitro, krajši počasi - ocena sledi počasnejšim osvežitvam
+RISE_RATE = 0.5
+DECAY_RATE = 0.05
+
+
+class MeterWatch:
+    """Običajen razmik med osvežitvami števca in iz njega meje molka.
+
+    Sunek porabe hiše med molkom števca ostane neviden, zato mora regulacija
+    molk zaznati čim prej. P1 telegram vsako sekundo tako ustavi polnjenje po
+    nekaj sekundah, števec s počasnejšim ritmom pa ne povzroča lažnih pavz.
+    """
+
+    __slots__ = ("period", "_last_time")
+
+    def __init__(self):
+        self.period = METER_SAFE_AGE / SAFE_PERIODS
+        self._last_time = None
+
+    def update(self, timestamp):
+        """Nova meritev števca ob timestamp (s)."""
+        last_time = self._last_time
+        if last_time is not None and timestamp <= last_time:
+            return
+        self._last_time = timestamp
+        if last_time is None:
+            return
+        interval = min(max(timestamp - last_time, MIN_PERIOD), METER_SAFE_AGE)
+        rate = RISE_RATE if interval > self.period else DECAY_RATE
+        self.period += rate * (interval - self.period)
+
+    @property
+    def hold_age(self):
+        """Starost meritve, nad katero toka ne povečujemo (s)."""
+        return min(METER_HOLD_AGE, HOLD_PERIODS * self.period)
+
+    @property
+    def safe_age(self):
+        """Starost meritve, nad katero polnjenje takoj ustavimo (s)."""
+        return min(METER_SAFE_AGE, SAFE_PERIODS * self.period)
+
+    def as_dict(self):
+        return {"period": round(self.period, 2), "hold_age": round(self.hold_age, 1), "safe_age": round(self.safe_age, 1)}
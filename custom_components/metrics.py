@@ -0,0 +1,133 @@
+"""EVSCI Metrics - Diagnostika regulacijske zanke (brez odvisnosti od Home Assistanta)."""
+from bisect import bisect_left
+from collections import deque
+
+# Zgodovina korakov: pri ciklu 5 s pokrije zadnjo uro
+HISTORY_SIZE = 720
+
+# Polja zapisa v zgodovini (zapis je tuple - dodajanje brez slovarja na cikel)
+HISTORY_FIELDS = (
+    "time",
+    "mode",
+    "tariff",
+    "grid_power",
+    "charger_power",
+    "current_amps",
+    "branch",
+    "limited_by",
+    "limit_increase_amps",
+    "limit_maintain_amps",
+    "target_amps",
+    "switch_on",
+    "amps_command",
+    "switch_command",
+)
+
+# Zgornje meje razredov histograma trajanja cikla (ms), zadnji razred je odprt
+TICK_BUCKETS_MS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+
+COUNTER_KEYS = (
+    "ticks",
+    "commands",
+    "emergency_cuts",
+    "fast_path_cuts",
+    "stale_pauses",
+    "phase_switches",
+)
+
+
+class ControlMetrics:
+    """Krožni medpomnilnik odločitev, števci in histogram trajanja cikla."""
+
+    __slots__ = (
+        "history",
+        "counters",
+        "branches",
+        "limited_seconds",
+        "tick_histogram",
+        "tick_total_ms",
+        "tick_max_ms",
+        "_stale",
+    )
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.history = deque(maxlen=size)
+        self.counters = dict.fromkeys(COUNTER_KEYS, 0)
+        self.branches = {}
+        self.limited_seconds = {}
+        self.tick_histogram = [0] * (len(TICK_BUCKETS_MS) + 1)
+        self.tick_total_ms = 0.0
+        self.tick_max_ms = 0.0
+        self._stale = False
+
+    def record_tick(self, now_time, seconds, duration_ms, mode, tariff, grid_power, charger_power, current_amps, decision, amps, switch):
+        """Zapiše en cikel. seconds je čas od prejšnjega cikla (za čas omejitve)."""
+        self.history.append((
+            now_time,
+            mode,
+            tariff,
+            grid_power,
+            charger_power,
+            current_amps,
+            decision.branch,
+            decision.limited_by,
+            decision.amps_limit_increase,
+            decision.amps_limit_maintain,
+            decision.target_amps,
+            decision.switch_on,
+            amps,
+            switch,
+        ))
+
+        counters = self.counters
+        counters["ticks"] += 1
+        if amps is not None or switch is not None:
+            counters["commands"] += 1
+        if decision.phases is not None:
+            counters["phase_switches"] += 1
+
+        branch = decision.branch
+        self.branches[branch] = self.branches.get(branch, 0) + 1
+        limited_by = decision.limited_by
+        if limited_by is not None:
+            self.limited_seconds[limited_by] = self.limited_seconds.get(limited_by, 0.0) + seconds
+
+        self.tick_histogram[bisect_left(TICK_BUCKETS_MS, duration_ms)] += 1
+        self.tick_total_ms += duration_ms
+        if duration_ms > self.tick_max_ms:
+            self.tick_max_ms = duration_ms
+
+    def record_emergency(self, fast_path=False):
+        self.counters["fast_path_cuts" if fast_path else "emergency_cuts"] += 1
+
+    def record_stale(self, is_stale):
+        """Šteje začetke pavz zaradi zastarelih podatkov (ne vsakega cikla pavze)."""
+        if is_stale and not self._stale:
+            self.counters["stale_pauses"] += 1
+        self._stale = is_stale
+
+    @property
+    def tick_mean_ms(self):
+        ticks = self.counters["ticks"]
+        return self.tick_total_ms / ticks if ticks else None
+
+    def summary(self):
+        """Števci in histogram (atributi senzorja)."""
+        histogram = {}
+        for bound, count in zip(TICK_BUCKETS_MS, self.tick_histogram):
+            histogram[f"<={bound:g}ms"] = count
+        histogram[f">{TICK_BUCKETS_MS[-1]:g}ms"] = self.tick_histogram[-1]
+        return {
+            **self.counters,
+            "branches": dict(self.branches),
+            "limited_seconds": {key: round(value) for key, value in self.limited_seconds.items()},
+            "tick_max_ms": round(self.tick_max_ms, 2),
+            "tick_histogram": histogram,
+        }
+
+    def as_dict(self):
+        """Celoten posnetek za prenos diagnostike."""
+        return {
+            "summary": self.summary(),
+            "history": [dict(zip(HISTORY_FIELDS, record)) for record in self.history],
+        }
@@ -1 +1,38 @@
+"""Number entitete za EVSCI."""
+from homeassistant.components.number import NumberEntity, NumberMode
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import PERCENTAGE
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
+from .const import DOMAIN
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback):
+    """Nastavi number entitete."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    async_add_entities([EVSCITargetBatteryLimit(coordinator)], True)
+
+class EVSCITargetBatteryLimit(CoordinatorEntity, NumberEntity):
+    """Ciljni SoC - seja se ustavi ob cilju, načrt do odhoda računa energijo do cilja."""
+    _attr_has_entity_name = True
+    _attr_name = "Target Battery Limit"
+    _attr_icon = "mdi:battery-charging-80"
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_native_min_value = 10
+    _attr_native_max_value = 100
+    _attr_native_step = 5
+    _attr_mode = NumberMode.SLIDER
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator.entry.entry_id}_target_soc"
+
+    @property
+    def native_value(self) -> float:
+        return self.coordinator.user_target_soc
+
+    async def async_set_native_value(self, value: float) -> None:
+        self.coordinator.user_target_soc = int(value)
+        self.coordinator.save_state()
+        await self.coordinator.async_refresh()
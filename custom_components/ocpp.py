@@ -0,0 +1,482 @@
+"""EVSCI OCPP - Lokalni centralni sistem OCPP 1.6J (websocket strežnik na LAN, brez odvisnosti od Home Assistanta)."""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+_LOGGER = logging.getLogger(__name__)
+
+SUBPROTOCOL = "ocpp1.6"
+
+# Vrste sporočil OCPP-J
+CALL = 2
+CALLRESULT = 3
+CALLERROR = 4
+
+# Časovne omejitve in intervali (s)
+CALL_TIMEOUT = 10.0
+HEARTBEAT_INTERVAL = 60
+METER_INTERVAL = 5
+# Starejša meritev ne velja - regulacija takrat bere entitete
+METER_MAX_AGE = 60.0
+# Povezano polnilnico lahko nova povezana z istim id zamenja šele, ko toliko časa molči
+# (ponovni zagon polnilnice) - živa povezava se ne prevzame
+TAKEOVER_AFTER = 2 * HEARTBEAT_INTERVAL
+
+# Veličine, ki jih polnilnica pošilja v MeterValues (nastavi se ob zagonu)
+METER_MEASURANDS = "Power.Active.Import,Current.Import,Current.Offered,Energy.Active.Import.Register"
+
+CONNECTOR_ID = 1
+# Stanja konektorja s tekočo transakcijo - po ponovni povezavi njen id poiščemo
+TRANSACTION_STATUSES = frozenset(["Charging", "SuspendedEV", "SuspendedEVSE"])
+ID_TAG = "EVSCI"
+# Naš TxDefaultProfile - nov profil z istim id in stackLevel zamenja prejšnjega
+PROFILE_ID = 1
+
+
+class OcppError(Exception):
+    """Polnilnica ni povezana, ukaza ni sprejela ali ni odgovorila."""
+
+
+def parse_meter_values(meter_value):
+    """Zadnje vrednosti veličin iz seznama meterValue (MeterValues, StopTransaction).
+
+    Vrne dict s ključi power (W), currents (A na L1-L3), offered (A) in
+    energy (Wh) - le tiste, ki so v sporočilu.
+    """
+    reading = {}
+    currents = {}
+    phase_power = {}
+    for sample in meter_value or ():
+        for value in sample.get("sampledValue", ()):
+            try:
+                number = float(value["value"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            measurand = value.get("measurand", "Energy.Active.Import.Register")
+            phase = (value.get("phase") or "")[:2]
+            unit = value.get("unit")
+            if measurand == "Power.Active.Import":
+                if unit == "kW":
+                    number *= 1000.0
+                if phase:
+                    phase_power[phase] = number
+                else:
+                    reading["power"] = number
+            elif measurand == "Current.Import":
+                currents[phase or "L1"] = number
+            elif measurand == "Current.Offered":
+                reading["offered"] = number
+            elif measurand == "Energy.Active.Import.Register" and not phase:
+                reading["energy"] = number * 1000.0 if unit == "kWh" else number
+    if "power" not in reading and phase_power:
+        reading["power"] = sum(phase_power.values())
+    if currents:
+        reading["currents"] = tuple(currents.get(phase, 0.0) for phase in ("L1", "L2", "L3"))
+    return reading
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class ChargePoint:
+    """Ena povezana polnilnica: stanje konektorja, meritve, transakcija in klici CALL/CALLRESULT."""
+
+    def __init__(self, charge_point_id, ws, central):
+        self.id = charge_point_id
+        self._ws = ws
+        self._central = central
+        self._pending = {}
+        self._message_ids = itertools.count(1)
+        self._tasks = set()
+        # Stanje konektorja po povezavi še ni preverjeno
+        self._synced = False
+
+        self.info = {}
+        self.status = None
+        self.power = None
+        self.currents = None
+        self.offered = None
+        self.energy = None
+        self.meter_time = None
+        self.transaction_id = None
+        # Končana transakcija - pozne MeterValues z njenim id je ne obudijo
+        self._stopped_transaction_id = None
+        # Čas zadnjega sporočila polnilnice (monotonic)
+        self.last_seen = time.monotonic()
+        # Zadnji sprejeti limit profila (A) - velja, dokler polnilnica ne pošlje Current.Offered
+        self.current_limit = None
+
+        self._handlers = {
+            "BootNotification": self._on_boot_notification,
+            "Heartbeat": self._on_heartbeat,
+            "StatusNotification": self._on_status_notification,
+            "MeterValues": self._on_meter_values,
+            "StartTransaction": self._on_start_transaction,
+            "StopTransaction": self._on_stop_transaction,
+            "Authorize": self._on_authorize,
+            "DataTransfer": self._on_data_transfer,
+            "FirmwareStatusNotification": self._on_notification,
+            "DiagnosticsStatusNotification": self._on_notification,
+        }
+
+    @property
+    def charging(self):
+        """Transakcija teče (ekvivalent vklopljenega stikala polnilnice)."""
+        return self.transaction_id is not None
+
+    @property
+    def amps(self):
+        """Tok, ki ga polnilnica ponuja vozilu (A) ali None."""
+        return self.offered if self.offered is not None else self.current_limit
+
+    def fresh(self, now_time):
+        return self.meter_time is not None and now_time - self.meter_time <= METER_MAX_AGE
+
+    async def async_handle(self, raw):
+        """Obdela eno sporočilo polnilnice."""
+        self.last_seen = time.monotonic()
+        try:
+            message = json.loads(raw)
+            message_type, message_id = message[0], message[1]
+        except (ValueError, TypeError, IndexError, KeyError):
+            _LOGGER.warning("EVSCI: OCPP %s: neveljavno sporočilo %s", self.id, raw[:200])
+            return
+
+        if message_type == CALL:
+            action, payload = message[2], message[3] if len(message) > 3 else {}
+            handler = self._handlers.get(action)
+            if handler is None:
+                await self._send([CALLERROR, message_id, "NotImplemented", f"{action} not supported", {}])
+                return
+            try:
+                response = handler(payload)
+            except (KeyError, TypeError, ValueError) as err:
+                await self._send([CALLERROR, message_id, "FormationViolation", str(err), {}])
+                return
+            await self._send([CALLRESULT, message_id, response])
+            if not self._synced:
+                # Klic polnilnici šele po odgovoru na njeno prvo sporočilo
+                self._synced = True
+                self._background(self._async_sync(action == "BootNotification"))
+        elif message_type in (CALLRESULT, CALLERROR):
+            future = self._pending.get(message_id)
+            if future is None or future.done():
+                return
+            if message_type == CALLRESULT:
+                future.set_result(message[2] if len(message) > 2 else {})
+            else:
+                future.set_exception(OcppError(f"{message[2]}: {message[3] if len(message) > 3 else ''}"))
+
+    async def async_call(self, action, payload):
+        """Pošlje CALL in počaka na odgovor polnilnice."""
+        message_id = str(next(self._message_ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self._send([CALL, message_id, action, payload])
+            async with asyncio.timeout(CALL_TIMEOUT):
+                return await future
+        except TimeoutError as err:
+            raise OcppError(f"{action}: no response from {self.id}") from err
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def _send(self, message):
+        try:
+            await self._ws.send_str(json.dumps(message))
+        except (ConnectionError, RuntimeError) as err:
+            raise OcppError(f"{self.id} disconnected") from err
+
+    def disconnected(self):
+        """Povezava je prekinjena - čakajoči klici dobijo napako."""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(OcppError(f"{self.id} disconnected"))
+        for task in self._tasks:
+            task.cancel()
+
+    async def async_close(self):
+        await self._ws.close(code=WSCloseCode.GOING_AWAY, message=b"replaced")
+
+    def _background(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # --- Ukazi polnilnici ---
+
+    async def async_set_current(self, amps):
+        """Limit toka prek TxDefaultProfile (velja za tekočo in naslednje transakcije)."""
+        response = await self.async_call(
+            "SetChargingProfile",
+            {
+                "connectorId": CONNECTOR_ID,
+                "csChargingProfiles": {
+                    "chargingProfileId": PROFILE_ID,
+                    "stackLevel": 0,
+                    "chargingProfilePurpose": "TxDefaultProfile",
+                    "chargingProfileKind": "Relative",
+                    "chargingSchedule": {
+                        "chargingRateUnit": "A",
+                        "chargingSchedulePeriod": [{"startPeriod": 0, "limit": float(amps)}],
+                    },
+                },
+            },
+        )
+        if response.get("status") != "Accepted":
+            raise OcppError(f"SetChargingProfile {amps} A: {response.get('status')}")
+        self.current_limit = float(amps)
+
+    async def async_set_charging(self, on):
+        """Začne (RemoteStartTransaction) ali konča (RemoteStopTransaction) polnjenje."""
+        if on == self.charging:
+            return
+        if on:
+            response = await self.async_call("RemoteStartTransaction", {"connectorId": CONNECTOR_ID, "idTag": ID_TAG})
+        else:
+            response = await self.async_call("RemoteStopTransaction", {"transactionId": self.transaction_id})
+        if response.get("status") != "Accepted":
+            action = "RemoteStartTransaction" if on else "RemoteStopTransaction"
+            raise OcppError(f"{action}: {response.get('status')}")
+
+    async def _async_sync(self, booted):
+        """Prvo sporočilo po povezavi: po zagonu nastavitve, nato stanje konektorja.
+
+        Po ponovnem zagonu Home Assistanta ali prekinjeni povezavi id tekoče
+        transakcije ni znan - stanje Charging/SuspendedEV ga sproži (MeterValues).
+        """
+        if booted:
+            await self._async_configure()
+        await self._async_trigger("StatusNotification")
+
+    async def _async_trigger(self, message):
+        """TriggerMessage - polnilnica pošlje zahtevano sporočilo konektorja."""
+        try:
+            response = await self.async_call("TriggerMessage", {"requestedMessage": message, "connectorId": CONNECTOR_ID})
+        except OcppError as err:
+            _LOGGER.debug("EVSCI: OCPP %s: TriggerMessage %s ni uspel (%s)", self.id, message, err)
+            return
+        if response.get("status") != "Accepted":
+            _LOGGER.debug("EVSCI: OCPP %s: TriggerMessage %s zavrnjen (%s)", self.id, message, response.get("status"))
+
+    async def _async_configure(self):
+        """Po zagonu polnilnice nastavi pogostost in vsebino MeterValues."""
+        for key, value in (
+            ("MeterValueSampleInterval", str(METER_INTERVAL)),
+            ("MeterValuesSampledData", METER_MEASURANDS),
+        ):
+            try:
+                response = await self.async_call("ChangeConfiguration", {"key": key, "value": value})
+            except OcppError as err:
+                _LOGGER.warning("EVSCI: OCPP %s: %s ni nastavljen (%s)", self.id, key, err)
+                continue
+            if response.get("status") not in ("Accepted", "RebootRequired"):
+                _LOGGER.warning("EVSCI: OCPP %s: %s = %s zavrnjeno (%s)", self.id, key, value, response.get("status"))
+
+    # --- Sporočila polnilnice ---
+
+    def _on_boot_notification(self, payload):
+        self.info = {
+            "vendor": payload.get("chargePointVendor"),
+            "model": payload.get("chargePointModel"),
+            "firmware": payload.get("firmwareVersion"),
+        }
+        _LOGGER.info("EVSCI: OCPP %s: zagon (%s %s)", self.id, self.info["vendor"], self.info["model"])
+        return {"status": "Accepted", "currentTime": _now_iso(), "interval": HEARTBEAT_INTERVAL}
+
+    def _on_heartbeat(self, payload):
+        return {"currentTime": _now_iso()}
+
+    def _on_status_notification(self, payload):
+        # Konektor 0 je polnilnica kot celota - zanima nas le konektor vozila
+        if payload.get("connectorId") != CONNECTOR_ID:
+            return {}
+        status = payload["status"]
+        if status in TRANSACTION_STATUSES and self.transaction_id is None:
+            # Transakcija teče, a je nismo začeli mi (ponovna povezava) - id je v MeterValues
+            self._background(self._async_trigger("MeterValues"))
+        elif status == "Available" and self.transaction_id is not None:
+            # StopTransaction se je izgubil med prekinitvijo
+            _LOGGER.info("EVSCI: OCPP %s: transakcija %s ne teče več", self.id, self.transaction_id)
+            self.transaction_id = None
+        if status != self.status:
+            self.status = status
+            self._central.notify(True)
+        return {}
+
+    def _on_meter_values(self, payload):
+        transaction_id = payload.get("transactionId")
+        if transaction_id is not None and self.transaction_id is None and transaction_id != self._stopped_transaction_id:
+            self.transaction_id = transaction_id
+            _LOGGER.info("EVSCI: OCPP %s: tekoča transakcija %s", self.id, transaction_id)
+            self._central.notify(True)
+        self._update_meter(payload.get("meterValue"))
+        return {}
+
+    def _on_start_transaction(self, payload):
+        self.transaction_id = self._central.next_transaction_id()
+        _LOGGER.info("EVSCI: OCPP %s: začetek transakcije %s", self.id, self.transaction_id)
+        self._central.notify(True)
+        return {"transactionId": self.transaction_id, "idTagInfo": {"status": "Accepted"}}
+
+    def _on_stop_transaction(self, payload):
+        self._update_meter(payload.get("transactionData"))
+        _LOGGER.info("EVSCI: OCPP %s: konec transakcije %s", self.id, payload.get("transactionId"))
+        self._stopped_transaction_id = payload.get("transactionId", self.transaction_id)
+        self.transaction_id = None
+        self.power = 0.0
+        self._central.notify(True)
+        return {"idTagInfo": {"status": "Accepted"}}
+
+    def _on_authorize(self, payload):
+        return {"idTagInfo": {"status": "Accepted"}}
+
+    def _on_data_transfer(self, payload):
+        return {"status": "UnknownVendorId"}
+
+    def _on_notification(self, payload):
+        return {}
+
+    def _update_meter(self, meter_value):
+        reading = parse_meter_values(meter_value)
+        if not reading:
+            return
+        self.power = reading.get("power", self.power)
+        self.currents = reading.get("currents", self.currents)
+        self.offered = reading.get("offered", self.offered)
+        self.energy = reading.get("energy", self.energy)
+        self.meter_time = time.time()
+        self._central.notify(False)
+
+    def as_dict(self):
+        """Stanje za diagnostiko."""
+        return {
+            "id": self.id,
+            **self.info,
+            "status": self.status,
+            "transaction_id": self.transaction_id,
+            "power": self.power,
+            "currents": self.currents,
+            "offered": self.offered,
+            "current_limit": self.current_limit,
+            "energy": self.energy,
+            "meter_time": self.meter_time,
+        }
+
+
+class OcppCentralSystem:
+    """Websocket strežnik OCPP 1.6J za eno polnilnico.
+
+    Polnilnica se poveže na ws://<host>:<port>/<charge_point_id>. Sprejme se
+    le nastavljen charge_point_id; nova povezava z istim id zamenja prejšnjo
+    šele, ko ta TAKEOVER_AFTER sekund molči (ponovni zagon polnilnice).
+    """
+
+    def __init__(self, port, charge_point_id, host):
+        # ValueError brez id ali naslova - sicer bi ukaze prevzel katerikoli odjemalec v LAN
+        if not charge_point_id or not charge_point_id.strip():
+            raise ValueError("OCPP charge point ID is required")
+        if not host or not host.strip():
+            raise ValueError("OCPP listen address is required")
+        self.port = port
+        self.host = host.strip()
+        self.charge_point_id = charge_point_id.strip()
+        self.charge_point = None
+        # callback(status_changed) ob novi meritvi ali spremembi stanja
+        self.on_update = None
+        self._runner = None
+        self._transaction_ids = itertools.count(int(time.time()))
+
+    @property
+    def connected(self):
+        return self.charge_point is not None
+
+    def fresh_charge_point(self, now_time):
+        """Povezana polnilnica s svežo meritvijo ali None."""
+        charge_point = self.charge_point
+        if charge_point is None or not charge_point.fresh(now_time):
+            return None
+        return charge_point
+
+    def next_transaction_id(self):
+        return next(self._transaction_ids)
+
+    def notify(self, status_changed):
+        if self.on_update is not None:
+            self.on_update(status_changed)
+
+    async def async_start(self):
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self._handle_websocket)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        _LOGGER.info("EVSCI: OCPP centralni sistem posluša na %s:%s.", self.host, self.port)
+
+    async def async_stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.charge_point = None
+
+    async def async_set_current(self, amps):
+        await self._require().async_set_current(amps)
+
+    async def async_set_charging(self, on):
+        await self._require().async_set_charging(on)
+
+    def _require(self):
+        if self.charge_point is None:
+            raise OcppError("no charge point connected")
+        return self.charge_point
+
+    async def _handle_websocket(self, request):
+        charge_point_id = request.match_info["path"].rstrip("/").rsplit("/", 1)[-1]
+        if charge_point_id != self.charge_point_id:
+            _LOGGER.warning("EVSCI: OCPP: zavrnjena povezava neznane polnilnice %r", charge_point_id)
+            raise web.HTTPNotFound()
+        previous = self.charge_point
+        if previous is not None and time.monotonic() - previous.last_seen < TAKEOVER_AFTER:
+            _LOGGER.warning("EVSCI: OCPP: zavrnjena druga povezava polnilnice %s (%s) - prejšnja je še živa.", charge_point_id, request.remote)
+            raise web.HTTPConflict()
+
+        ws = web.WebSocketResponse(protocols=(SUBPROTOCOL,))
+        await ws.prepare(request)
+        if ws.ws_protocol != SUBPROTOCOL:
+            await ws.close(code=WSCloseCode.PROTOCOL_ERROR, message=b"ocpp1.6 subprotocol required")
+            return ws
+
+        charge_point = ChargePoint(charge_point_id, ws, self)
+        previous, self.charge_point = self.charge_point, charge_point
+        if previous is not None:
+            previous.disconnected()
+            await previous.async_close()
+        _LOGGER.info("EVSCI: OCPP polnilnica %s povezana.", charge_point_id)
+
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    try:
+                        await charge_point.async_handle(message.data)
+                    except OcppError:
+                        break
+                elif message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            charge_point.disconnected()
+            if self.charge_point is charge_point:
+                self.charge_point = None
+                _LOGGER.warning("EVSCI: OCPP polnilnica %s ni več povezana.", charge_point_id)
+                self.notify(True)
+        return ws
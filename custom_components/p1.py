@@ -0,0 +1,316 @@
+"""EVSCI P1 - Branje telegramov števca DSMR P1 s serijskih vrat ali TCP (brez odvisnosti od Home Assistanta)."""
+import asyncio
+import logging
+import os
+import re
+import time
+
+try:
+    import termios
+except ImportError:  # pragma: no cover - le POSIX
+    termios = None
+
+_LOGGER = logging.getLogger(__name__)
+
+# DSMR 4/5: 115200 baud, 8N1
+BAUDRATE = 115200
+
+# Starejši telegram ne velja - regulacija takrat bere entiteto omrežja (DSMR 4 pošilja na 10 s)
+TELEGRAM_MAX_AGE = 15.0
+
+# Ponovna povezava po prekinitvi (s, podvaja se do največ)
+RECONNECT_DELAY = 2.0
+RECONNECT_MAX_DELAY = 60.0
+
+# Daljši kos brez konca telegrama je smeti (tipičen telegram ima ~1 kB)
+MAX_TELEGRAM = 8192
+
+# OBIS koda -> (ključ, faza); moči v kW, tokovi v A, napetosti v V
+OBIS = {
+    "1-0:1.7.0": ("import", None),
+    "1-0:2.7.0": ("export", None),
+    "1-0:21.7.0": ("import", 0),
+    "1-0:41.7.0": ("import", 1),
+    "1-0:61.7.0": ("import", 2),
+    "1-0:22.7.0": ("export", 0),
+    "1-0:42.7.0": ("export", 1),
+    "1-0:62.7.0": ("export", 2),
+    "1-0:31.7.0": ("current", 0),
+    "1-0:51.7.0": ("current", 1),
+    "1-0:71.7.0": ("current", 2),
+    "1-0:32.7.0": ("voltage", 0),
+    "1-0:52.7.0": ("voltage", 1),
+    "1-0:72.7.0": ("voltage", 2),
+}
+
+_LINE = re.compile(rb"^(\d+-\d+:\d+\.\d+\.\d+)\(([^)*]*)(?:\*([^)]*))?\)", re.MULTILINE)
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data):
+    """CRC16/ARC telegrama DSMR 4/5 (od "/" do vključno "!")."""
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def parse_telegram(telegram):
+    """Meritve iz telegrama (bytes od "/" do konca vrstice s CRC) ali None ob napaki CRC.
+
+    Vrne dict s ključi power (W, uvoz minus izvoz), currents (A po fazah L1-L3,
+    predznak iz smeri moči faze) in voltages (V) - le tiste, ki so v telegramu.
+    Telegrami DSMR 2.2 nimajo CRC in se sprejmejo brez preverjanja.
+    """
+    end = telegram.rfind(b"!")
+    if end < 0:
+        return None
+    checksum = telegram[end + 1:end + 5]
+    if checksum.strip():
+        try:
+            if int(checksum, 16) != crc16(telegram[:end + 1]):
+                return None
+        except ValueError:
+            return None
+
+    total = {"import": None, "export": None}
+    phases = {"import": [None] * 3, "export": [None] * 3, "current": [None] * 3, "voltage": [None] * 3}
+    for code, value, unit in _LINE.findall(telegram, 0, end):
+        key = OBIS.get(code.decode("ascii"))
+        if key is None:
+            continue
+        try:
+            number = float(value)
+        except ValueError:
+            continue
+        if unit == b"kW":
+            number *= 1000.0
+        name, phase = key
+        if phase is None:
+            total[name] = number
+        else:
+            phases[name][phase] = number
+
+    reading = {}
+    if total["import"] is not None:
+        reading["power"] = total["import"] - (total["export"] or 0.0)
+
+    phase_power = [
+        None if imported is None else imported - (exported or 0.0)
+        for imported, exported in zip(phases["import"], phases["export"])
+    ]
+    if "power" not in reading and any(power is not None for power in phase_power):
+        reading["power"] = sum(power for power in phase_power if power is not None)
+
+    currents = []
+    for power, current, voltage in zip(phase_power, phases["current"], phases["voltage"]):
+        if power is not None and voltage:
+            # Tok iz moči faze ima boljšo ločljivost kot cel amper v telegramu
+            currents.append(power / voltage)
+        elif current is not None:
+            currents.append(-current if power is not None and power < 0 else current)
+        else:
+            currents.append(None)
+    if any(current is not None for current in currents):
+        reading["currents"] = tuple(currents)
+    if any(voltage is not None for voltage in phases["voltage"]):
+        reading["voltages"] = tuple(phases["voltage"])
+    return reading
+
+
+def parse_source(source):
+    """("serial", pot) za napravo ali ("tcp", host, vrata) za "host:port" / "tcp://host:port"."""
+    source = source.strip()
+    if source.startswith("/"):
+        return ("serial", source)
+    address = source.removeprefix("tcp://")
+    host, separator, port = address.rpartition(":")
+    if not separator or not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid P1 source {source!r} (expected /dev/... or host:port)")
+    return ("tcp", host.strip("[]"), int(port))
+
+
+def _configure_tty(fd):
+    """Serijska vrata: 115200 8N1, surovi način. Napake kot OSError (ponovni poskus kasneje)."""
+    if termios is None:
+        raise OSError("serial ports need termios (POSIX)")
+    try:
+        attrs = termios.tcgetattr(fd)
+        attrs[0] = 0  # iflag: brez pretvorb
+        attrs[1] = 0  # oflag
+        attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL
+        attrs[3] = 0  # lflag: surovi način
+        attrs[4] = attrs[5] = getattr(termios, f"B{BAUDRATE}")
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except termios.error as err:
+        raise OSError(*err.args) from err
+
+
+class P1Protocol(asyncio.Protocol):
+    """Razreže tok bajtov na telegrame in vsakega sproti razčleni."""
+
+    def __init__(self, on_telegram, on_lost):
+        self._on_telegram = on_telegram
+        self._on_lost = on_lost
+        self._buffer = bytearray()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        buffer = self._buffer
+        buffer += data
+        while True:
+            end = buffer.find(b"!")
+            if end < 0:
+                if len(buffer) > MAX_TELEGRAM:
+                    buffer.clear()
+                break
+            line_end = buffer.find(b"\n", end)
+            if line_end < 0:
+                break
+            # Začetek zadnjega telegrama pred "!" (ob povezavi sredi telegrama je prvi nepopoln)
+            start = buffer.rfind(b"/", 0, end)
+            telegram = bytes(buffer[start:line_end + 1]) if start >= 0 else None
+            del buffer[:line_end + 1]
+            if telegram is not None:
+                self._on_telegram(parse_telegram(telegram))
+
+    def eof_received(self):
+        return False
+
+    def connection_lost(self, exc):
+        self._on_lost(exc)
+
+
+class P1Reader:
+    """Bere števec P1 in ob vsakem veljavnem telegramu pokliče on_telegram().
+
+    Ob prekinitvi se znova poveže (zamik se podvaja do RECONNECT_MAX_DELAY).
+    """
+
+    def __init__(self, source):
+        self.source = source
+        # ValueError ob neveljavnem naslovu - še preden se zažene branje
+        self._address = parse_source(source)
+        self.reading = None
+        self.telegram_time = None
+        self.telegrams = 0
+        self.crc_errors = 0
+        self.connected = False
+        # callback() ob vsakem veljavnem telegramu
+        self.on_telegram = None
+        self._task = None
+        self._transport = None
+        self._lost = None
+
+    def fresh(self, now_time):
+        return self.telegram_time is not None and now_time - self.telegram_time <= TELEGRAM_MAX_AGE
+
+    def fresh_reading(self, now_time):
+        """Zadnje meritve, če je telegram svež in ima moč, sicer None."""
+        if not self.fresh(now_time) or "power" not in self.reading:
+            return None
+        return self.reading
+
+    def async_start(self, create_task=None):
+        """Zažene branje; create_task(coro) vrne task (npr. task v ozadju config entryja)."""
+        if create_task is None:
+            create_task = asyncio.get_running_loop().create_task
+        self._task = create_task(self._async_run())
+
+    async def async_stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _handle_telegram(self, reading):
+        if reading is None:
+            self.crc_errors += 1
+            return
+        self.reading = reading
+        self.telegram_time = time.time()
+        self.telegrams += 1
+        if self.on_telegram is not None:
+            self.on_telegram()
+
+    def _handle_lost(self, exc):
+        self.connected = False
+        if self._lost is not None and not self._lost.done():
+            self._lost.set_result(exc)
+
+    async def _async_run(self):
+        source = self._address
+        delay = RECONNECT_DELAY
+        while True:
+            loop = asyncio.get_running_loop()
+            self._lost = loop.create_future()
+            try:
+                if source[0] == "serial":
+                    self._transport = await self._async_open_serial(loop, source[1])
+                else:
+                    self._transport, _ = await loop.create_connection(self._protocol, source[1], source[2])
+            except OSError as err:
+                _LOGGER.warning("EVSCI: Števca P1 %s ni mogoče odpreti (%s) - ponovno čez %.0f s.", self.source, err, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            self.connected = True
+            telegrams = self.telegrams
+            _LOGGER.info("EVSCI: Števec P1 %s povezan.", self.source)
+            exc = await self._lost
+            self._transport = None
+            _LOGGER.warning("EVSCI: Povezava s števcem P1 %s prekinjena (%s).", self.source, exc or "EOF")
+            if self.telegrams > telegrams:
+                delay = RECONNECT_DELAY
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _protocol(self):
+        return P1Protocol(self._handle_telegram, self._handle_lost)
+
+    async def _async_open_serial(self, loop, path):
+        fd = os.open(path, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            if os.isatty(fd):
+                _configure_tty(fd)
+            pipe = os.fdopen(fd, "rb", buffering=0)
+        except BaseException:
+            os.close(fd)
+            raise
+        transport, _ = await loop.connect_read_pipe(self._protocol, pipe)
+        return transport
+
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "connected": self.connected,
+            "telegrams": self.telegrams,
+            "crc_errors": self.crc_errors,
+            "telegram_time": self.telegram_time,
+            "reading": self.reading,
+        }
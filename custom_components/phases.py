@@ -0,0 +1,150 @@
+"""EVSCI Phases - Preklop med 1-faznim in 3-faznim polnjenjem (brez odvisnosti od Home Assistanta)."""
+import math
+
+# Polnilnica je ustavljena, ko njena moč pade pod (W)
+STOPPED_POWER = 100.0
+
+# Če se polnjenje v tem času ne ustavi, preklop opustimo (s)
+PAUSE_TIMEOUT = 60.0
+
+# Polnilnica mora preklop potrditi v tem času, sicer ga opustimo (s)
+CONFIRM_TIMEOUT = 60.0
+
+# Premor po potrjenem preklopu, preden polnjenje znova vklopimo (s)
+RESUME_DELAY = 10.0
+
+# Toliko časa mora presežek neprekinjeno zahtevati drugo število faz (s)
+DOWN_DELAY = 60.0
+UP_DELAY = 120.0
+
+# Stanja zaporedja preklopa
+STATE_IDLE = "idle"
+STATE_PAUSING = "pausing"
+STATE_SWITCHING = "switching"
+STATE_RESUMING = "resuming"
+
+
+class PhaseSwitchController:
+    """Število faz polnjenja in varno zaporedje preklopa.
+
+    Pri majhnem PV presežku (pod minimalnim tokom na treh fazah) polnimo
+    enofazno, pri presežku nad tem + hysteresis_w spet trifazno. Pogoj mora
+    veljati DOWN_DELAY oz. UP_DELAY sekund, nazaj na tri faze pa gremo šele
+    min_dwell sekund po zadnjem preklopu. Ko presežek pade za več kot
+    hysteresis_w pod minimum treh faz, preklopimo na eno fazo takoj - sicer bi
+    se PV seja ustavila. Zaporedje: ustavi polnjenje,
+    počakaj, da moč pade, pošlji preklop, počakaj potrditev in premor, nato
+    polnjenje nadaljuje običajna regulacija (zagon na minimalnem toku).
+    """
+
+    __slots__ = (
+        "hysteresis_w",
+        "min_dwell",
+        "phases",
+        "target",
+        "state",
+        "switches",
+        "_state_since",
+        "_last_switch",
+        "_wanted_since",
+    )
+
+    def __init__(self, phases, hysteresis_w, min_dwell):
+        self.configure(hysteresis_w, min_dwell)
+        self.phases = phases
+        self.target = phases
+        self.state = STATE_IDLE
+        self.switches = 0
+        self._state_since = -math.inf
+        self._last_switch = -math.inf
+        self._wanted_since = None
+
+    def configure(self, hysteresis_w, min_dwell):
+        self.hysteresis_w = hysteresis_w
+        self.min_dwell = min_dwell
+
+    @property
+    def busy(self):
+        """Preklop je v teku - polnjenje mora stati."""
+        return self.state != STATE_IDLE
+
+    def _set_state(self, now_time, state):
+        self.state = state
+        self._state_since = now_time
+
+    def confirm(self, now_time, phases):
+        """Stanje stikala faz na polnilnici (None = neznano). Vrne True, če se je število faz spremenilo."""
+        if phases is None or phases == self.phases:
+            return False
+        if self.state == STATE_SWITCHING and phases == self.target:
+            self._set_state(now_time, STATE_RESUMING)
+        elif self.state != STATE_IDLE:
+            return False
+        # Preklop je potrjen ali pa ga je naredil nekdo drug (aplikacija polnilnice)
+        self.phases = phases
+        self.target = phases
+        self._last_switch = now_time
+        return True
+
+    def surplus_phases(self, now_time, excess_w, three_phase_min_w):
+        """Želeno število faz pri PV presežku excess_w (W) - s histerezo in zakasnitvijo."""
+        if self.phases == 3:
+            wanted = excess_w < three_phase_min_w
+            delay = DOWN_DELAY if excess_w >= three_phase_min_w - self.hysteresis_w else 0.0
+        else:
+            wanted = excess_w >= three_phase_min_w + self.hysteresis_w
+            delay = UP_DELAY
+
+        if not wanted:
+            self._wanted_since = None
+            return self.phases
+        if self._wanted_since is None:
+            self._wanted_since = now_time
+        if now_time - self._wanted_since < delay:
+            return self.phases
+        if self.phases == 1 and now_time - self._last_switch < self.min_dwell:
+            return self.phases
+        return 1 if self.phases == 3 else 3
+
+    def request(self, now_time, phases):
+        """Začne preklop na phases, če ni že v teku. Ukaz pošlje update(), ko polnjenje stoji."""
+        if self.busy or phases == self.phases:
+            return
+        self.target = phases
+        self._wanted_since = None
+        self._set_state(now_time, STATE_PAUSING)
+
+    def update(self, now_time, is_charging, charger_power):
+        """Korak zaporedja. Vrne število faz za ukaz polnilnici ali None."""
+        state = self.state
+        elapsed = now_time - self._state_since
+
+        if state == STATE_PAUSING:
+            if not is_charging and charger_power < STOPPED_POWER:
+                self._set_state(now_time, STATE_SWITCHING)
+                self.switches += 1
+                return self.target
+            if elapsed > PAUSE_TIMEOUT:
+                self._abort(now_time)
+
+        elif state == STATE_SWITCHING and elapsed > CONFIRM_TIMEOUT:
+            self._abort(now_time)
+
+        elif state == STATE_RESUMING and elapsed >= RESUME_DELAY:
+            self._set_state(now_time, STATE_IDLE)
+
+        return None
+
+    def _abort(self, now_time):
+        """Preklop ni uspel - ostanemo na potrjenem številu faz, nov poskus šele po min_dwell."""
+        self.target = self.phases
+        self._last_switch = now_time
+        self._set_state(now_time, STATE_IDLE)
+
+    def as_dict(self):
+        return {
+            "phases": self.phases,
+            "target": self.target,
+            "state": self.state,
+            "switches": self.switches,
+        }
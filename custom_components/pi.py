@@ -0,0 +1,45 @@
+"""EVSCI PI - Regulator povečevanja toka z anti-windupom (brez odvisnosti od Home Assistanta)."""
+import math
+
+# Daljši razmik med koraki (npr. po pavzi) ne polni integrala (s)
+MAX_DT = 30.0
+
+
+class PICurrentController:
+    """PI regulator toka proti razpoložljivemu toku (limit povečanja).
+
+    Napaka je razlika med ciljnim in trenutnim tokom, izhod je prirastek toka.
+    Proporcionalni del pripelje tok blizu cilja v nekaj ciklih, integral
+    zapre zadnje ampere, ki jih zaokroževanje navzdol sicer ne bi. Prirastek
+    je omejen na max_step na cikel, izhod nikoli ne preseže cilja (brez
+    prenihaja). Ko je izhod omejen, integral ne raste (pogojna integracija).
+    """
+
+    __slots__ = ("kp", "ki", "max_step", "integral", "_last_time")
+
+    def __init__(self, kp, ki, max_step):
+        self.configure(kp, ki, max_step)
+        self.reset()
+
+    def configure(self, kp, ki, max_step):
+        self.kp = kp
+        self.ki = ki
+        self.max_step = max_step
+
+    def reset(self):
+        self.integral = 0.0
+        self._last_time = None
+
+    def step(self, now_time, setpoint, current):
+        """Nov tok (cel A) na poti od current proti setpoint."""
+        error = setpoint - current
+        dt = 0.0 if self._last_time is None else min(MAX_DT, max(0.0, now_time - self._last_time))
+        self._last_time = now_time
+
+        integral = self.integral + self.ki * error * dt
+        increment = self.kp * error + integral
+        if increment >= self.max_step or current + increment >= setpoint:
+            # Nasičenje: omejen korak, integral ostane
+            return min(setpoint, math.floor(current + self.max_step))
+        self.integral = integral
+        return math.floor(current + max(0.0, increment))
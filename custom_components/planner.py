@@ -0,0 +1,203 @@
+"""EVSCI Planner - Načrt polnjenja do časa odhoda (brez odvisnosti od Home Assistanta)."""
+import datetime
+import math
+from array import array
+from functools import lru_cache
+
+from .control import MIN_AMPS
+
+# Dolžina reže načrta (s) - poravnano na četrt ure kot obračun NMPT
+SLOT_SECONDS = 900
+
+# Zaostanek za načrtom (Wh), pri katerem načrt preračunamo
+REPLAN_DEVIATION_WH = 1000.0
+
+# Fiksni prazniki v Sloveniji (mesec, dan) - dela prosti dnevi so v nižjem bloku
+HOLIDAYS = frozenset([
+    (1, 1), (1, 2), (2, 8), (4, 27), (5, 1), (5, 2),
+    (6, 25), (8, 15), (10, 31), (11, 1), (12, 25), (12, 26),
+])
+
+# Višja sezona omrežnine: november - februar
+HIGH_SEASON_MONTHS = frozenset([11, 12, 1, 2])
+
+
+@lru_cache(maxsize=4)
+def _easter_monday(year):
+    """Velikonočni ponedeljek (gregorijanski koledar, anonimni algoritem)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return datetime.date(year, month, day) + datetime.timedelta(days=1)
+
+
+def is_workday(day):
+    """Delovni dan za namen časovnih blokov (pon-pet, brez praznikov)."""
+    if day.weekday() >= 5 or (day.month, day.day) in HOLIDAYS:
+        return False
+    return day != _easter_monday(day.year)
+
+
+def tariff_block_at(moment):
+    """Časovni blok omrežnine (1-5) za lokalni datetime po slovenskem urniku."""
+    hour = moment.hour
+    if 7 <= hour < 14 or 16 <= hour < 20:
+        block = 1
+    elif 6 <= hour < 7 or 14 <= hour < 16 or 20 <= hour < 22:
+        block = 2
+    else:
+        block = 3
+
+    if moment.month not in HIGH_SEASON_MONTHS:
+        block += 1
+    if not is_workday(moment.date()):
+        block += 1
+    return block
+
+
+class ChargePlan:
+    """Tok po četrturnih režah od start do odhoda; iskanje toka je indeks v array."""
+
+    __slots__ = ("start", "departure", "amps", "blocks", "prices", "cumulative_wh", "needed_wh", "planned_wh")
+
+    def __init__(self, start, departure, needed_wh):
+        self.start = start
+        self.departure = departure
+        self.needed_wh = needed_wh
+        self.planned_wh = 0.0
+        self.amps = array("b")
+        self.blocks = array("b")
+        self.prices = []
+        # Načrtovana energija ob začetku vsake reže (Wh), zadnji element = skupaj
+        self.cumulative_wh = array("d")
+
+    @property
+    def feasible(self):
+        return self.planned_wh + 1.0 >= self.needed_wh
+
+    def slot_bounds(self, index):
+        """Začetek in konec reže (prva je lahko krajša - začne se ob start)."""
+        slot_start = (self.start // SLOT_SECONDS + index) * SLOT_SECONDS
+        return max(slot_start, self.start), min(slot_start + SLOT_SECONDS, self.departure)
+
+    def _index(self, now_time):
+        return int(now_time // SLOT_SECONDS - self.start // SLOT_SECONDS)
+
+    def amps_at(self, now_time):
+        index = self._index(now_time)
+        if 0 <= index < len(self.amps) and now_time < self.departure:
+            return self.amps[index]
+        return 0
+
+    def expected_wh(self, now_time):
+        """Energija, ki bi jo po načrtu do now_time že morali dobiti."""
+        index = self._index(now_time)
+        if index < 0:
+            return 0.0
+        if index >= len(self.amps):
+            return self.cumulative_wh[-1]
+        slot_start, slot_end = self.slot_bounds(index)
+        done = self.cumulative_wh[index]
+        slot_wh = self.cumulative_wh[index + 1] - done
+        if slot_end <= slot_start:
+            return done
+        return done + slot_wh * min(1.0, max(0.0, (now_time - slot_start) / (slot_end - slot_start)))
+
+    def next_start(self, now_time):
+        """Začetek trenutne ali naslednje reže s polnjenjem (ali None)."""
+        first = max(0, self._index(now_time))
+        for index in range(first, len(self.amps)):
+            if self.amps[index] > 0:
+                return self.slot_bounds(index)[0]
+        return None
+
+
+def plan_charge(now_time, departure, needed_wh, power_per_amp, block_at, cap_amps, price_at=None):
+    """Najcenejši načrt toka po režah, ki do odhoda dostavi needed_wh.
+
+    block_at(ts) vrne blok reže, cap_amps {blok: največji tok} upošteva limit
+    bloka, price_at(ts) vrne ceno ali None. Reže brez cene pridejo na vrsto
+    zadnje; sicer odloča višji blok (cenejša omrežnina) in zgodnejši čas.
+    Cena je linearna v energiji, zato je požrešno polnjenje najcenejših rež
+    optimalno.
+    """
+    plan = ChargePlan(now_time, departure, max(0.0, needed_wh))
+    if departure <= now_time:
+        plan.cumulative_wh.append(0.0)
+        return plan
+
+    count = int(math.ceil(departure / SLOT_SECONDS) - now_time // SLOT_SECONDS)
+    durations = []
+    for index in range(count):
+        plan.amps.append(0)
+        slot_start, slot_end = plan.slot_bounds(index)
+        durations.append(max(0.0, slot_end - slot_start))
+        plan.blocks.append(block_at(slot_start))
+        plan.prices.append(price_at(slot_start) if price_at is not None else None)
+
+    def cost(index):
+        price = plan.prices[index]
+        return (price is None, price or 0.0, -plan.blocks[index], index)
+
+    remaining = plan.needed_wh
+    for index in sorted(range(count), key=cost):
+        if remaining <= 0:
+            break
+        cap = cap_amps.get(plan.blocks[index], 0)
+        hours = durations[index] / 3600.0
+        if cap < MIN_AMPS or hours <= 0:
+            continue
+        amps = min(cap, max(MIN_AMPS, math.ceil(remaining / (power_per_amp * hours))))
+        plan.amps[index] = amps
+        remaining -= amps * power_per_amp * hours
+
+    total = 0.0
+    plan.cumulative_wh.append(0.0)
+    for index in range(count):
+        total += plan.amps[index] * power_per_amp * durations[index] / 3600.0
+        plan.cumulative_wh.append(total)
+    plan.planned_wh = total
+    return plan
+
+
+class DeparturePlanner:
+    """Hrani načrt seje in odloča, kdaj ga je treba preračunati."""
+
+    def __init__(self):
+        self.plan = None
+        self._signature = None
+        self._base_wh = 0.0
+
+    def invalidate(self):
+        self.plan = None
+
+    def needs_replan(self, now_time, delivered_wh, signature):
+        """Nov načrt ob spremembi vhodov (odhod, cilj, cene), po odhodu ali ob zaostanku.
+
+        Neizvedljiv načrt (npr. izračunan med konico porabe hiše) poskusimo znova
+        vsako režo.
+        """
+        plan = self.plan
+        if plan is None or signature != self._signature or now_time >= plan.departure:
+            return True
+        if not plan.feasible and now_time - plan.start >= SLOT_SECONDS:
+            return True
+        shortfall = plan.expected_wh(now_time) - (delivered_wh - self._base_wh)
+        return shortfall > REPLAN_DEVIATION_WH
+
+    def replan(self, now_time, delivered_wh, signature, *args, **kwargs):
+        """Argumente za plan_charge poda klicatelj (ta razred ne pozna HA)."""
+        self.plan = plan_charge(now_time, *args, **kwargs)
+        self._signature = signature
+        self._base_wh = delivered_wh
+        return self.plan
+
+    def amps_at(self, now_time):
+        return self.plan.amps_at(now_time) if self.plan is not None else 0
@@ -0,0 +1,153 @@
+"""EVSCI PV - Glajenje sončnega presežka in histereza vklopa (brez odvisnosti od Home Assistanta)."""
+import math
+from array import array
+
+from .const import PV_SMOOTHING_EWMA, PV_SMOOTHING_MEDIAN
+
+# Najmanjši razmik vzorcev v medpomnilniku (s) - hitrejši vzorci (izredni izračuni)
+# prepišejo zadnjega, zato kapaciteta iz okna zadošča ne glede na pogostost klicev
+MIN_SAMPLE_SPACING = 5.0
+
+
+def buffer_size(window):
+    """Kapaciteta krožnega medpomnilnika (vzorcev), ki pokrije okno window (s)."""
+    return max(1, math.ceil(window / MIN_SAMPLE_SPACING) + 1)
+
+
+class PVSurplusController:
+    """Zglajen presežek PV in odločitev o vklopu/izklopu seje PV Only.
+
+    Vzorci presežka (W) gredo v krožni medpomnilnik (array), velik za okno
+    glajenja pri razmiku MIN_SAMPLE_SPACING. Glajenje je EWMA s
+    časovno konstanto window ali drseča mediana vzorcev zadnjih window sekund.
+    Seja se začne, ko zglajen presežek doseže minimalni tok, in ustavi, ko pade
+    pod minimum za več kot hysteresis_w - oboje šele po minimalnem času
+    vklopa/izklopa.
+    """
+
+    __slots__ = (
+        "method",
+        "window",
+        "hysteresis_w",
+        "min_on",
+        "min_off",
+        "active",
+        "_since",
+        "_times",
+        "_values",
+        "_index",
+        "_count",
+        "_ewma",
+        "_last_time",
+    )
+
+    def __init__(self, method, window, hysteresis_w, min_on, min_off):
+        self.method = method
+        self.window = window
+        self.hysteresis_w = hysteresis_w
+        self.min_on = min_on
+        self.min_off = min_off
+
+        size = buffer_size(window)
+        self._times = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+        self.reset(False)
+
+    def configure(self, method, window, hysteresis_w, min_on, min_off):
+        """Nove nastavitve med delovanjem; vzorci in stanje seje ostanejo."""
+        if method != self.method:
+            self._ewma = None
+        self.method = method
+        self.window = window
+        self.hysteresis_w = hysteresis_w
+        self.min_on = min_on
+        self.min_off = min_off
+        if buffer_size(window) != len(self._times):
+            self._resize(buffer_size(window))
+
+    def _resize(self, size):
+        """Nova kapaciteta medpomnilnika; ohrani najnovejše vzorce po vrsti."""
+        capacity = len(self._times)
+        order = [(self._index - self._count + i) % capacity for i in range(self._count)][-size:]
+        times = array("d", bytes(8 * size))
+        values = array("d", bytes(8 * size))
+        for i, old in enumerate(order):
+            times[i] = self._times[old]
+            values[i] = self._values[old]
+        self._times = times
+        self._values = values
+        self._count = len(order)
+        self._index = self._count % size
+
+    def reset(self, active, now_time=-math.inf):
+        """Počisti zgodovino (npr. ob preklopu v PV način); active = trenutno stanje polnjenja."""
+        self._index = 0
+        self._count = 0
+        self._ewma = None
+        self._last_time = None
+        self.active = active
+        self._since = now_time
+
+    def update(self, now_time, excess_w):
+        """Doda vzorec in vrne zglajen presežek (W)."""
+        capacity = len(self._times)
+        last = (self._index - 1) % capacity
+        if self._count and now_time - self._times[last] < MIN_SAMPLE_SPACING:
+            # Prehiter vzorec nadomesti zadnjega (čas reže ostane)
+            self._values[last] = excess_w
+        else:
+            index = self._index
+            self._times[index] = now_time
+            self._values[index] = excess_w
+            self._index = (index + 1) % capacity
+            if self._count < capacity:
+                self._count += 1
+
+        if self.method == PV_SMOOTHING_EWMA:
+            if self._ewma is None or self.window <= 0:
+                self._ewma = excess_w
+            else:
+                dt = max(0.0, now_time - self._last_time)
+                alpha = 1.0 - math.exp(-dt / self.window)
+                self._ewma += alpha * (excess_w - self._ewma)
+            self._last_time = now_time
+            return self._ewma
+
+        if self.method == PV_SMOOTHING_MEDIAN:
+            return self._median(now_time)
+
+        return excess_w
+
+    def _median(self, now_time):
+        """Mediana vzorcev v zadnjih window sekundah."""
+        times = self._times
+        # Zadnja reža je vedno v oknu, tudi če je okno krajše od razmika vzorcev
+        oldest = min(now_time - self.window, times[(self._index - 1) % len(times)])
+        values = self._values
+        recent = sorted(values[i] for i in range(self._count) if times[i] >= oldest)
+        n = len(recent)
+        if n % 2:
+            return recent[n // 2]
+        return (recent[n // 2 - 1] + recent[n // 2]) / 2.0
+
+    def pv_only_amps(self, now_time, smoothed_w, power_per_amp, min_amps, start_power_per_amp=None):
+        """Ciljni tok za PV Only s histerezo in minimalnimi časi vklopa/izklopa.
+
+        start_power_per_amp določa prag vklopa/izklopa, če se razlikuje od
+        trenutne moči na amper (s preklopom faz odloča ena faza).
+        """
+        min_w = min_amps * (start_power_per_amp or power_per_amp)
+        dwell = now_time - self._since
+
+        if self.active:
+            if smoothed_w < min_w - self.hysteresis_w and dwell >= self.min_on:
+                self.active = False
+                self._since = now_time
+        elif smoothed_w >= min_w and dwell >= self.min_off:
+            self.active = True
+            self._since = now_time
+
+        if not self.active:
+            return 0
+        # V pasu histereze ostanemo na minimumu
+        return max(min_amps, math.floor(smoothed_w / power_per_amp))
@@ -0,0 +1,185 @@
+"""EVSCI Response - Naučen model odziva polnilnice in števca na ukaz toka (brez odvisnosti od Home Assistanta)."""
+
+# Iz manjših sprememb ukaza se ne učimo - šum porabe hiše je primerljiv (A)
+MIN_LEARN_STEP = 2
+
+# Deleža spremembe moči, pri katerih štejemo začetek in konec odziva
+START_FRACTION = 0.1
+DONE_FRACTION = 0.9
+# Števec omrežja je odziv zaznal, ko vidi polovico spremembe
+METER_FRACTION = 0.5
+
+# Opazovanje brez odziva (avto omejuje tok ...) prekinemo po (s)
+OBSERVE_TIMEOUT = 120.0
+
+# Utež novega opazovanja (EWMA)
+LEARN_RATE = 0.3
+
+# Model velja po toliko opazovanjih
+MIN_OBSERVATIONS = 3
+
+# Prilagojen interval regulacije: ustalitev + rezerva, omejeno na [min, max] (s)
+SETTLE_MARGIN = 5.0
+# Dokler model ne velja, toliko časa po ukazu štejemo, da odziv še teče (s)
+DEFAULT_SETTLE = 15.0
+MIN_ADAPTIVE_INTERVAL = 10.0
+MAX_ADAPTIVE_INTERVAL = 120.0
+
+
+class ChargerResponseModel:
+    """Zamik in čas naraščanja moči polnilnice ter zamik števca omrežja po ukazu.
+
+    Po vsakem večjem ukazu opazuje moč polnilnice (zamik do 10 % in čas do
+    90 % spremembe) in moč omrežja (zamik števca do 50 %). Naučen model
+    napove, koliko moči polnilnice števec omrežja že vidi - poraba hiše
+    (omrežje - polnilnica) se tik po ukazu tako ne šteje dvakrat.
+    """
+
+    __slots__ = (
+        "delay",
+        "ramp",
+        "meter_lag",
+        "observations",
+        "_command_time",
+        "_from_power",
+        "_delta",
+        "_grid_from",
+        "_learning",
+        "_modulating",
+        "_started",
+        "_done",
+        "_meter_seen",
+        "_last_charger",
+        "_last_grid",
+    )
+
+    def __init__(self):
+        self.delay = 0.0
+        self.ramp = 0.0
+        self.meter_lag = 0.0
+        self.observations = 0
+        self._command_time = None
+        self._from_power = 0.0
+        self._delta = 0.0
+        self._grid_from = 0.0
+        self._learning = False
+        self._modulating = False
+        self._started = None
+        self._done = None
+        self._meter_seen = None
+        self._last_charger = 0.0
+        self._last_grid = 0.0
+
+    @property
+    def observing(self):
+        """Čaka na odziv ukaza - vzorci med cikli izboljšajo meritev zamika."""
+        return self._learning
+
+    @property
+    def learned(self):
+        return self.observations >= MIN_OBSERVATIONS
+
+    @property
+    def settle_time(self):
+        """Čas od ukaza do ustaljene meritve na števcu (s) ali None, dokler model ne velja."""
+        if not self.learned:
+            return None
+        return self.delay + self.ramp + self.meter_lag
+
+    def settle_wait(self):
+        """Najkrajši razmik med zaporednimi ukazi, da je odziv prejšnjega že izmerjen (s)."""
+        settle_time = self.settle_time
+        return DEFAULT_SETTLE if settle_time is None else settle_time + SETTLE_MARGIN
+
+    def control_interval(self, default):
+        """Razmik med koraki regulacije: iz naučene ustalitve, sicer nastavljen interval."""
+        settle_time = self.settle_time
+        if settle_time is None:
+            return default
+        return min(MAX_ADAPTIVE_INTERVAL, max(MIN_ADAPTIVE_INTERVAL, settle_time + SETTLE_MARGIN))
+
+    def command(self, now_time, amps, power_per_amp, min_amps):
+        """Poslan nov tok - začetek opazovanja odziva.
+
+        Učimo se le iz spremembe toka med polnjenjem (vklop in izklop imata
+        drugačen odziv - avto se zbuja) in le po mirovanju - med odzivom
+        prejšnjega ukaza bi izmerili prekratek zamik.
+        """
+        to_power = amps * power_per_amp if amps >= min_amps else 0.0
+        quiet = self._command_time is None or now_time - self._command_time >= self.settle_wait()
+        self._command_time = now_time
+        self._from_power = self._last_charger
+        self._delta = to_power - self._last_charger
+        self._grid_from = self._last_grid
+        self._modulating = self._last_charger > 0 and to_power > 0
+        self._learning = self._modulating and quiet and abs(self._delta) >= MIN_LEARN_STEP * power_per_amp
+        self._started = None
+        self._done = None
+        self._meter_seen = None
+
+    def observe(self, now_time, charger_power, grid_power):
+        """Vzorec moči polnilnice in omrežja (W)."""
+        self._last_charger = charger_power
+        self._last_grid = grid_power
+        if not self._learning:
+            return
+
+        elapsed = now_time - self._command_time
+        if elapsed > OBSERVE_TIMEOUT:
+            self._learning = False
+            return
+
+        delta = self._delta
+        if self._done is None:
+            progress = (charger_power - self._from_power) / delta
+            if self._started is None and progress >= START_FRACTION:
+                self._started = elapsed
+            if self._started is not None and progress >= DONE_FRACTION:
+                self._done = elapsed
+        if self._meter_seen is None and (grid_power - self._grid_from) / delta >= METER_FRACTION:
+            self._meter_seen = elapsed
+
+        if self._done is not None and self._meter_seen is not None:
+            self._learn(self._started, self._done - self._started, self._meter_seen)
+
+    def _learn(self, started, rise, meter_seen):
+        """Iz časov 10 % in 90 % odziva izpelje linearno naraščanje 0-100 %."""
+        self._learning = False
+        ramp = rise / (DONE_FRACTION - START_FRACTION)
+        delay = max(0.0, started - START_FRACTION * ramp)
+        # Števec vidi polovico spremembe sredi naraščanja moči polnilnice
+        meter_lag = max(0.0, meter_seen - (delay + ramp * METER_FRACTION))
+        if self.observations == 0:
+            self.delay, self.ramp, self.meter_lag = delay, ramp, meter_lag
+        else:
+            self.delay += LEARN_RATE * (delay - self.delay)
+            self.ramp += LEARN_RATE * (ramp - self.ramp)
+            self.meter_lag += LEARN_RATE * (meter_lag - self.meter_lag)
+        self.observations += 1
+
+    def metered_charger_power(self, now_time, charger_power):
+        """Moč polnilnice, ki jo števec omrežja že vidi (W).
+
+        Med ustalitvijo po ukazu jo napove model, sicer je to izmerjena moč.
+        """
+        if not self._modulating or not self.learned:
+            return charger_power
+        elapsed = now_time - self._command_time - self.delay - self.meter_lag
+        if elapsed >= self.ramp + SETTLE_MARGIN:
+            return charger_power
+        if elapsed < 0:
+            progress = 0.0
+        elif self.ramp <= 0:
+            progress = 1.0
+        else:
+            progress = min(1.0, elapsed / self.ramp)
+        return self._from_power + self._delta * progress
+
+    def as_dict(self):
+        """Stanje modela (diagnostika)."""
+        return {
+            "delay": round(self.delay, 2),
+            "ramp": round(self.ramp, 2),
+            "meter_lag": round(self.meter_lag, 2),
+            "observations": self.observations,
+        }
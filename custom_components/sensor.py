@@ -1,4 +1,6 @@
 """Senzorji za EVSCI."""
+import time
+
 from homeassistant.components.sensor import (
     SensorEntity,
     SensorDeviceClass,
@@ -6,10 +8,14 @@ from homeassistant.components.sensor import (
     RestoreSensor, # NOVO: Za lifetime senzorje
 )
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.const import UnitOfPower, UnitOfElectricCurrent, UnitOfEnergy
+from homeassistant.const import UnitOfPower, UnitOfElectricCurrent, UnitOfEnergy, UnitOfTime
+from homeassistant.util import dt as dt_util
 
 from .const import DOMAIN
 
+# Senzor metrik zapiše stanje največ enkrat na minuto (s)
+METRICS_WRITE_INTERVAL = 60
+
 async def async_setup_entry(hass, entry, async_add_entities):
     """Nastavi senzorje."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
@@ -18,6 +24,9 @@ async def async_setup_entry(hass, entry, async_add_entities):
         EVSCITargetCurrent(coordinator),
         EVSCIGridMonitor(coordinator),
         EVSCITariffMonitor(coordinator),
+        EVSCIReactionLatency(coordinator),
+        EVSCIChargePlan(coordinator),
+        EVSCIControlMetrics(coordinator),
         
         # NOVO: Energetski senzorji
         EVSCISessionEnergy(coordinator, "session_total", "Session Energy Total"),
@@ -32,6 +41,9 @@ async def async_setup_entry(hass, entry, async_add_entities):
     if coordinator.data and coordinator.data.get("solar_power") is not None:
          sensors.append(EVSCISolarMonitor(coordinator))
 
+    if coordinator.cfg.phase_switching:
+        sensors.append(EVSCIChargingPhases(coordinator))
+
     async_add_entities(sensors, True)
 
 
@@ -42,6 +54,11 @@ class EVSCIBaseSensor(CoordinatorEntity, SensorEntity):
         self._attr_has_entity_name = True
         self._entry_id = coordinator.entry.entry_id
 
+    def _data(self, key, default):
+        """Vrednost zadnjega cikla; pred prvim ciklom (teče v ozadju) je stanje neznano."""
+        data = self.coordinator.data
+        return data.get(key, default) if data is not None else None
+
 class EVSCITargetCurrent(EVSCIBaseSensor):
     _attr_name = "Target Current"
     _attr_native_unit_of_measurement = UnitOfElectricCurrent.AMPERE
@@ -51,7 +68,7 @@ class EVSCITargetCurrent(EVSCIBaseSensor):
         self._attr_unique_id = f"{self._entry_id}_target_curr"
     @property
     def native_value(self):
-        return self.coordinator.data.get("target_current", 0)
+        return self._data("target_current", 0)
 
 class EVSCIGridMonitor(EVSCIBaseSensor):
     _attr_name = "Monitored Grid Power"
@@ -63,7 +80,7 @@ class EVSCIGridMonitor(EVSCIBaseSensor):
         self._attr_unique_id = f"{self._entry_id}_mon_grid"
     @property
     def native_value(self):
-        return self.coordinator.data.get("grid_power", 0)
+        return self._data("grid_power", 0)
 
 class EVSCISolarMonitor(EVSCIBaseSensor):
     _attr_name = "Monitored Solar Power"
@@ -75,7 +92,7 @@ class EVSCISolarMonitor(EVSCIBaseSensor):
         self._attr_unique_id = f"{self._entry_id}_mon_solar"
     @property
     def native_value(self):
-        return self.coordinator.data.get("solar_power", 0)
+        return self._data("solar_power", 0)
 
 class EVSCITariffMonitor(EVSCIBaseSensor):
     _attr_name = "Monitored Tariff Block"
@@ -85,26 +102,171 @@ class EVSCITariffMonitor(EVSCIBaseSensor):
         self._attr_unique_id = f"{self._entry_id}_mon_tariff"
     @property
     def native_value(self):
-        return self.coordinator.data.get("tariff", 1)
+        return self._data("tariff", 1)
+
+class EVSCIChargingPhases(EVSCIBaseSensor):
+    """Število faz polnjenja (s preklopom 1/3 faze)."""
+    _attr_name = "Charging Phases"
+    _attr_icon = "mdi:sine-wave"
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._entry_id}_charging_phases"
+    @property
+    def native_value(self):
+        return self._data("phases", None)
+    @property
+    def extra_state_attributes(self):
+        phase_switch = self.coordinator.law.phase_switch
+        return {"target": phase_switch.target, "state": phase_switch.state}
+
+class EVSCIReactionLatency(EVSCIBaseSensor):
+    """Čas od spremembe vhodnega stanja do ukaza number.set_value ob preobremenitvi."""
+    _attr_name = "Overload Reaction Latency"
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_icon = "mdi:timer-alert-outline"
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._entry_id}_reaction_latency"
+    @property
+    def native_value(self):
+        latency = self.coordinator.reaction_latency
+        if latency is None:
+            return None
+        return round(latency * 1000)
+    @property
+    def extra_state_attributes(self):
+        return {"source": self.coordinator.reaction_source}
+
+class EVSCIChargePlan(EVSCIBaseSensor):
+    """Načrt polnjenja do odhoda: stanje je začetek naslednje reže s polnjenjem, reže so v atributih."""
+    _attr_name = "Charge Plan"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_icon = "mdi:calendar-clock"
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._entry_id}_charge_plan"
+        self._written = None
+        self._attributes = {}
+        self._attributes_plan = None
+
+    def _next_start(self):
+        plan = self.coordinator.planner.plan
+        if plan is None:
+            return None
+        return plan.next_start(dt_util.utcnow().timestamp())
+
+    @property
+    def native_value(self):
+        start = self._next_start()
+        return dt_util.utc_from_timestamp(start) if start is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        plan = self.coordinator.planner.plan
+        if plan is not self._attributes_plan:
+            # Atribute zgradimo le ob novem načrtu
+            self._attributes_plan = plan
+            self._attributes = self._build_attributes(plan) if plan is not None else {}
+        return self._attributes
+
+    @staticmethod
+    def _build_attributes(plan):
+        slots = []
+        for index, amps in enumerate(plan.amps):
+            if amps > 0:
+                start, end = plan.slot_bounds(index)
+                slots.append({
+                    "start": dt_util.as_local(dt_util.utc_from_timestamp(start)).isoformat(),
+                    "end": dt_util.as_local(dt_util.utc_from_timestamp(end)).isoformat(),
+                    "amps": amps,
+                    "block": plan.blocks[index],
+                    "price": plan.prices[index],
+                })
+        return {
+            "departure": dt_util.as_local(dt_util.utc_from_timestamp(plan.departure)).isoformat(),
+            "needed_kwh": round(plan.needed_wh / 1000.0, 2),
+            "planned_kwh": round(plan.planned_wh / 1000.0, 2),
+            "feasible": plan.feasible,
+            "slots": slots,
+        }
+
+    def _handle_coordinator_update(self) -> None:
+        """Zapis le ob novem načrtu ali novi reži, ne vsakih 5 sekund."""
+        current = (self.coordinator.planner.plan, self._next_start())
+        if current != self._written:
+            self._written = current
+            self.async_write_ha_state()
+
+class EVSCIControlMetrics(EVSCIBaseSensor):
+    """Povprečno trajanje cikla regulacije; števci in histogram so v atributih."""
+    _attr_name = "Control Metrics"
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_icon = "mdi:chart-box-outline"
+    _attr_suggested_display_precision = 2
+    # Atributi se spreminjajo ves čas - v zgodovino (recorder) gre le stanje
+    _unrecorded_attributes = frozenset({
+        "ticks", "commands", "emergency_cuts", "fast_path_cuts", "stale_pauses",
+        "branches", "limited_seconds", "tick_max_ms", "tick_histogram",
+        "service_calls", "failed_calls",
+    })
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self._entry_id}_control_metrics"
+        self._written_time = 0.0
+    @property
+    def native_value(self):
+        mean = self.coordinator.metrics.tick_mean_ms
+        return round(mean, 3) if mean is not None else None
+    @property
+    def extra_state_attributes(self):
+        actuator = self.coordinator.actuator
+        return {
+            **self.coordinator.metrics.summary(),
+            "service_calls": actuator.service_calls,
+            "failed_calls": actuator.failed_calls,
+        }
+    def _handle_coordinator_update(self) -> None:
+        """Zapis največ enkrat na METRICS_WRITE_INTERVAL, ne vsakih 5 sekund."""
+        now_time = time.monotonic()
+        if now_time - self._written_time >= METRICS_WRITE_INTERVAL:
+            self._written_time = now_time
+            self.async_write_ha_state()
 
 # --- NOVI RAZREDI ZA ENERGIJO ---
 
-class EVSCISessionEnergy(EVSCIBaseSensor):
-    """Senzor za energijo seje (resetira se ob priklopu)."""
+class EVSCIEnergyBase(EVSCIBaseSensor):
+    """Skupni del senzorjev energije - vrednost vodi akumulator v koordinatorju.
+
+    Stanje se zapiše le, ko akumulator objavi novo vrednost (redčenje zapisov).
+    """
     _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
     _attr_device_class = SensorDeviceClass.ENERGY
-    _attr_state_class = SensorStateClass.TOTAL
-    
+
     def __init__(self, coordinator, key_type, name):
         super().__init__(coordinator)
-        self._key_type = key_type # 'session_total', 'session_solar', 'session_grid'
+        self._key_type = key_type # 'session_total', 'lifetime_solar', ...
         self._attr_name = name
         self._attr_unique_id = f"{self._entry_id}_{key_type}"
-        self._state = 0.0
+        self._written_version = None
 
     @property
     def native_value(self):
-        return self._state
+        return self.coordinator.energy.published[self._key_type]
+
+    def _handle_coordinator_update(self) -> None:
+        """Piše le ob novi objavi akumulatorja, ne vsakih 5 sekund."""
+        version = self.coordinator.energy.version
+        if version != self._written_version:
+            self._written_version = version
+            self.async_write_ha_state()
+
+
+class EVSCISessionEnergy(EVSCIEnergyBase):
+    """Senzor za energijo seje (resetira se ob priklopu)."""
+    _attr_state_class = SensorStateClass.TOTAL
 
     @property
     def icon(self):
@@ -112,74 +274,25 @@ class EVSCISessionEnergy(EVSCIBaseSensor):
         if "grid" in self._key_type: return "mdi:transmission-tower"
         return "mdi:ev-station"
 
-    def _handle_coordinator_update(self) -> None:
-        """Kliče se vsakih 5 sekund, ko coordinator objavi nove podatke."""
-        data = self.coordinator.data
-        
-        # Preveri za reset signal
-        if data.get("reset_session"):
-            self._state = 0.0
-        
-        # Preberi prirastek (increment)
-        inc_grid = data.get("energy_inc_grid", 0.0)
-        inc_solar = data.get("energy_inc_solar", 0.0)
-        
-        # Prištej glede na tip senzorja
-        if "solar" in self._key_type:
-            self._state += inc_solar
-        elif "grid" in self._key_type:
-            self._state += inc_grid
-        else: # Total
-            self._state += (inc_grid + inc_solar)
-            
-        self.async_write_ha_state()
-
-
-class EVSCILifetimeEnergy(EVSCIBaseSensor, RestoreSensor):
-    """Trajni števec energije (se ne resetira, ohrani stanje ob restartu)."""
-    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
-    _attr_device_class = SensorDeviceClass.ENERGY
+
+class EVSCILifetimeEnergy(EVSCIEnergyBase, RestoreSensor):
+    """Trajni števec energije (se ne resetira, stanje hrani koordinator v Store)."""
     _attr_state_class = SensorStateClass.TOTAL_INCREASING
-    
-    def __init__(self, coordinator, key_type, name):
-        super().__init__(coordinator)
-        self._key_type = key_type
-        self._attr_name = name
-        self._attr_unique_id = f"{self._entry_id}_{key_type}"
-        self._state = 0.0
 
     async def async_added_to_hass(self) -> None:
-        """Ob zagonu obnovi zadnje stanje."""
+        """Prehod s starejše verzije: zadnje stanje senzorja prevzamemo le, če Store še ni obstajal."""
         await super().async_added_to_hass()
+        if self._key_type == "lifetime_total" or not self.coordinator.needs_energy_migration:
+            return
         last_state = await self.async_get_last_state()
         if last_state:
             try:
-                self._state = float(last_state.state)
+                self.coordinator.seed_lifetime_energy(self._key_type, float(last_state.state))
             except (ValueError, TypeError):
-                self._state = 0.0
-
-    @property
-    def native_value(self):
-        return self._state
+                pass
         
     @property
     def icon(self):
         if "solar" in self._key_type: return "mdi:solar-power"
         if "grid" in self._key_type: return "mdi:transmission-tower"
         return "mdi:counter"
-
-    def _handle_coordinator_update(self) -> None:
-        """Prištej prirastek."""
-        data = self.coordinator.data
-        
-        inc_grid = data.get("energy_inc_grid", 0.0)
-        inc_solar = data.get("energy_inc_solar", 0.0)
-        
-        if "solar" in self._key_type:
-            self._state += inc_solar
-        elif "grid" in self._key_type:
-            self._state += inc_grid
-        else: # Total
-            self._state += (inc_grid + inc_solar)
-            
-        self.async_write_ha_state()
@@ -0,0 +1,294 @@
+"""EVSCI Storitve - Poizvedbe po zgodovini sej in samodejna nastavitev parametrov."""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse, callback
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .autotune import (
+    DEFAULT_BUFFERS,
+    DEFAULT_INTERVALS,
+    choose,
+    evaluate,
+    init_worker,
+    pack_trace,
+    pareto_front,
+    resample,
+    simulation_options,
+)
+from .const import DOMAIN, CONF_BUFFER, CONF_CONTROL_INTERVAL, MODES, MODE_OFF, MODE_DYNAMIC
+
+SERVICE_GET_SESSIONS = "get_sessions"
+SERVICE_AUTOTUNE = "autotune"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_GROUP_BY = "group_by"
+ATTR_LIST_SESSIONS = "list_sessions"
+ATTR_DAYS = "days"
+ATTR_MODE = "mode"
+ATTR_BUFFERS = "buffers"
+ATTR_INTERVALS = "intervals"
+ATTR_MAX_OVERLOAD = "max_overload_seconds"
+ATTR_APPLY = "apply"
+
+GROUP_NONE = "none"
+GROUP_DAY = "day"
+GROUP_WEEK = "week"
+GROUP_MONTH = "month"
+GROUP_YEAR = "year"
+GROUPS = [GROUP_NONE, GROUP_DAY, GROUP_WEEK, GROUP_MONTH, GROUP_YEAR]
+
+# Največ skupin in posameznih sej v enem odgovoru
+MAX_GROUPS = 1000
+MAX_SESSIONS = 500
+
+# Autotune: največ procesov (simulacija zasede celo jedro)
+AUTOTUNE_MAX_WORKERS = 4
+
+GET_SESSIONS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_GROUP_BY, default=GROUP_NONE): vol.In(GROUPS),
+        vol.Optional(ATTR_LIST_SESSIONS, default=False): cv.boolean,
+    }
+)
+
+AUTOTUNE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_DAYS, default=7): vol.All(vol.Coerce(int), vol.Range(min=1, max=30)),
+        vol.Optional(ATTR_MODE): vol.In([mode for mode in MODES if mode != MODE_OFF]),
+        vol.Optional(ATTR_BUFFERS, default=list(DEFAULT_BUFFERS)): vol.All(
+            cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=0, max=5000))]
+        ),
+        vol.Optional(ATTR_INTERVALS, default=list(DEFAULT_INTERVALS)): vol.All(
+            cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=5, max=300))]
+        ),
+        vol.Optional(ATTR_MAX_OVERLOAD, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(ATTR_APPLY, default=False): cv.boolean,
+    }
+)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant):
+    """Registrira storitve (enkrat za vse vnose)."""
+    if hass.services.has_service(DOMAIN, SERVICE_GET_SESSIONS):
+        return
+
+    async def async_get_sessions(call: ServiceCall):
+        coordinator = _coordinator(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+        history = coordinator.history
+        start = _timestamp(call.data.get(ATTR_START))
+        end = _timestamp(call.data.get(ATTR_END))
+
+        response = {"total": history.aggregate(start, end)}
+
+        group_by = call.data[ATTR_GROUP_BY]
+        if group_by != GROUP_NONE and len(history):
+            lo, hi = history.span(start, end)
+            groups = []
+            if hi > lo:
+                bounds = _group_bounds(history.starts[lo], history.starts[hi - 1], group_by)
+                for group_start, group_end in zip(bounds, bounds[1:]):
+                    aggregate = history.aggregate(max(group_start, start or group_start), min(group_end, end or group_end))
+                    if aggregate["sessions"]:
+                        groups.append({"start": dt_util.utc_from_timestamp(group_start).isoformat(), **aggregate})
+            response["groups"] = groups
+
+        if call.data[ATTR_LIST_SESSIONS]:
+            lo, hi = history.span(start, end)
+            sessions = []
+            for index in range(max(lo, hi - MAX_SESSIONS), hi):
+                session = history.session(index)
+                session["start"] = dt_util.utc_from_timestamp(session["start"]).isoformat()
+                session["end"] = dt_util.utc_from_timestamp(session["end"]).isoformat()
+                sessions.append(session)
+            response["sessions"] = sessions
+
+        return response
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_SESSIONS,
+        async_get_sessions,
+        schema=GET_SESSIONS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    running = set()
+
+    async def async_autotune(call: ServiceCall):
+        coordinator = _coordinator(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+        entry = coordinator.entry
+        if entry.entry_id in running:
+            raise ServiceValidationError("Autotune is already running for this charger.")
+        mode = call.data.get(ATTR_MODE) or (coordinator.selected_mode if coordinator.selected_mode != MODE_OFF else MODE_DYNAMIC)
+        days = call.data[ATTR_DAYS]
+        candidates = [(buffer_watts, interval) for buffer_watts in call.data[ATTR_BUFFERS] for interval in call.data[ATTR_INTERVALS]]
+
+        running.add(entry.entry_id)
+        try:
+            trace = await _async_history_trace(hass, coordinator.cfg, days)
+            if len(trace) == 0:
+                raise ServiceValidationError("No recorded history for the grid sensor.")
+            options, phase_switch = simulation_options({**entry.data, **entry.options})
+            results = await _async_evaluate(hass, trace, options, phase_switch, mode, candidates)
+        finally:
+            running.discard(entry.entry_id)
+
+        front = pareto_front(results)
+        chosen = choose(front, call.data[ATTR_MAX_OVERLOAD])
+        applied = bool(call.data[ATTR_APPLY] and chosen)
+        if applied:
+            hass.config_entries.async_update_entry(
+                entry,
+                options={**entry.options, CONF_BUFFER: chosen["buffer"], CONF_CONTROL_INTERVAL: chosen["control_interval"]},
+            )
+        return {
+            "mode": mode,
+            "days": days,
+            "candidates": len(results),
+            "front": front,
+            "chosen": chosen,
+            "applied": applied,
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_AUTOTUNE,
+        async_autotune,
+        schema=AUTOTUNE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+@callback
+def async_unload_services(hass: HomeAssistant):
+    """Odstrani storitve, ko ni več nobenega vnosa."""
+    if not hass.data.get(DOMAIN):
+        hass.services.async_remove(DOMAIN, SERVICE_GET_SESSIONS)
+        hass.services.async_remove(DOMAIN, SERVICE_AUTOTUNE)
+
+
+async def _async_history_trace(hass, cfg, days):
+    """Posnetek zadnjih days dni iz recorderja (branje in prevzorčenje v executorju)."""
+    from homeassistant.components.recorder import get_instance, history
+
+    end = dt_util.utcnow()
+    start = end - timedelta(days=days)
+    entity_ids = [
+        entity_id
+        for entity_id in (cfg.grid_entity, cfg.charger_power_entity, cfg.tariff_entity, cfg.charger_status_entity)
+        if entity_id
+    ]
+    states = await get_instance(hass).async_add_executor_job(
+        partial(
+            history.get_significant_states,
+            hass,
+            start,
+            end,
+            entity_ids,
+            significant_changes_only=False,
+            no_attributes=True,
+        )
+    )
+
+    def points(entity_id):
+        if not entity_id:
+            return None
+        return [(state.last_updated.timestamp(), state.state) for state in states.get(entity_id, ())]
+
+    def build():
+        if not states.get(cfg.grid_entity):
+            return resample(0.0, 0.0, (), ())
+        return resample(
+            start.timestamp(),
+            end.timestamp(),
+            points(cfg.grid_entity),
+            points(cfg.charger_power_entity) or (),
+            points(cfg.tariff_entity),
+            points(cfg.charger_status_entity),
+        )
+
+    return await hass.async_add_executor_job(build)
+
+
+async def _async_evaluate(hass, trace, options, phase_switch, mode, candidates):
+    """Kandidate predvaja v ločenih procesih - vsak proces dobi posnetek enkrat in svoj del mreže."""
+    workers = max(1, min(os.cpu_count() or 1, AUTOTUNE_MAX_WORKERS, len(candidates)))
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(pack_trace(trace),),
+    )
+    try:
+        parts = await asyncio.gather(
+            *(
+                hass.loop.run_in_executor(pool, evaluate, options, phase_switch, mode, candidates[worker::workers])
+                for worker in range(workers)
+            )
+        )
+    finally:
+        await hass.async_add_executor_job(pool.shutdown)
+    return [result for part in parts for result in part]
+
+
+def _coordinator(hass, entry_id):
+    """Koordinator izbranega vnosa; brez izbire le, če je vnos en sam."""
+    coordinators = hass.data.get(DOMAIN, {})
+    if entry_id is None:
+        if len(coordinators) != 1:
+            raise ServiceValidationError(f"With {len(coordinators)} chargers set up, {ATTR_CONFIG_ENTRY_ID} is required.")
+        return next(iter(coordinators.values()))
+    if entry_id not in coordinators:
+        raise ServiceValidationError(f"Unknown {ATTR_CONFIG_ENTRY_ID} {entry_id}.")
+    return coordinators[entry_id]
+
+
+def _timestamp(value):
+    """Datum/čas iz klica storitve (brez pasu = lokalni čas) v epoch sekunde."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_util.get_default_time_zone())
+    return value.timestamp()
+
+
+def _group_bounds(first, last, group_by):
+    """Meje skupin v lokalnem času od skupine s first do skupine z last (timestamp)."""
+    moment = dt_util.as_local(dt_util.utc_from_timestamp(first)).replace(hour=0, minute=0, second=0, microsecond=0)
+    if group_by == GROUP_WEEK:
+        moment -= timedelta(days=moment.weekday())
+    elif group_by == GROUP_MONTH:
+        moment = moment.replace(day=1)
+    elif group_by == GROUP_YEAR:
+        moment = moment.replace(month=1, day=1)
+
+    bounds = [moment.timestamp()]
+    while bounds[-1] <= last and len(bounds) <= MAX_GROUPS:
+        # Prištevanje k lokalnemu času ohrani polnoč tudi ob premiku na poletni čas
+        if group_by == GROUP_DAY:
+            moment += timedelta(days=1)
+        elif group_by == GROUP_WEEK:
+            moment += timedelta(days=7)
+        elif group_by == GROUP_MONTH:
+            moment = moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+        else:
+            moment = moment.replace(year=moment.year + 1)
+        bounds.append(moment.timestamp())
+    return bounds
+
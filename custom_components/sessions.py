@@ -0,0 +1,263 @@
+"""EVSCI Sessions - Zgodovina polnjenj v kompaktni datoteki in hitre agregacije (brez odvisnosti od Home Assistanta)."""
+import math
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+# Glava datoteke in zapis seje (little-endian, fiksna dolžina):
+# začetek, konec (epoch s), sončna in omrežna energija (mWh), energija po blokih 1-5 (mWh),
+# strošek (1/10000 valute), največji tok (A), SoC ob začetku in koncu (%, -1 = neznano)
+FILE_MAGIC = b"EVSH"
+FILE_VERSION = 1
+HEADER = struct.Struct("<4sB")
+RECORD = struct.Struct("<ddII5IiBbb")
+
+BLOCKS = 5
+COST_SCALE = 10000
+UNKNOWN_SOC = -1
+
+
+class SessionTracker:
+    """Seja v teku: energija po tarifnih blokih, strošek, največji tok in SoC."""
+
+    __slots__ = ("start", "block_mwh", "cost", "priced", "peak_amps", "soc_start", "soc_end")
+
+    def __init__(self):
+        self.start = None
+        self.block_mwh = [0] * BLOCKS
+        self.cost = 0.0
+        self.priced = False
+        self.peak_amps = 0
+        self.soc_start = None
+        self.soc_end = None
+
+    @property
+    def active(self):
+        return self.start is not None
+
+    def begin(self, now_time):
+        """Priklop kabla - nova seja."""
+        self.__init__()
+        self.start = now_time
+
+    def add(self, tariff, charger_w, grid_w, seconds, price, amps, soc):
+        """Prišteje cikel seje: moč polnilnice in njen omrežni del (W), cena (na kWh) ali None."""
+        if not self.active:
+            return
+        if charger_w > 0 and 1 <= tariff <= BLOCKS:
+            self.block_mwh[tariff - 1] += round(charger_w * seconds / 3.6)
+        if price is not None and grid_w > 0:
+            self.cost += grid_w * seconds / 3_600_000.0 * price
+            self.priced = True
+        if charger_w > 0 and amps > self.peak_amps:
+            self.peak_amps = amps
+        if soc is not None:
+            if self.soc_start is None:
+                self.soc_start = soc
+            self.soc_end = soc
+
+    def finish(self, now_time, solar_mwh, grid_mwh):
+        """Odklop kabla - zapis seje (tuple za SessionHistory.append) ali None, če ni bilo polnjenja."""
+        start = self.start
+        self.start = None
+        if start is None or solar_mwh + grid_mwh <= 0:
+            return None
+        return (
+            start,
+            max(start, now_time),
+            solar_mwh,
+            grid_mwh,
+            *self.block_mwh,
+            round(self.cost * COST_SCALE) if self.priced else 0,
+            min(255, round(self.peak_amps)),
+            UNKNOWN_SOC if self.soc_start is None else self.soc_start,
+            UNKNOWN_SOC if self.soc_end is None else self.soc_end,
+        )
+
+    def as_dict(self):
+        """Stanje za shrambo - seja preživi ponovni zagon."""
+        return {
+            "start": self.start,
+            "block_mwh": list(self.block_mwh),
+            "cost": self.cost,
+            "priced": self.priced,
+            "peak_amps": self.peak_amps,
+            "soc_start": self.soc_start,
+            "soc_end": self.soc_end,
+        }
+
+    def restore(self, data):
+        try:
+            start = data.get("start")
+            self.start = float(start) if start is not None else None
+            block_mwh = [int(value) for value in data.get("block_mwh", ())]
+            if len(block_mwh) == BLOCKS:
+                self.block_mwh = block_mwh
+            self.cost = float(data.get("cost", 0.0))
+            self.priced = bool(data.get("priced", False))
+            self.peak_amps = float(data.get("peak_amps", 0))
+            self.soc_start = data.get("soc_start")
+            self.soc_end = data.get("soc_end")
+        except (AttributeError, TypeError, ValueError):
+            self.__init__()
+
+
+class SessionHistory:
+    """Zaključene seje po stolpcih (array), urejene po začetku.
+
+    Energija, strošek in trajanje so shranjeni kot kumulativne vsote, zato so
+    vsote poljubnega časovnega okna dve bisekciji in nekaj odštevanj - ne
+    glede na to, koliko let zgodovine je v datoteki. Le največji tok zahteva
+    pregled sej v oknu.
+    """
+
+    __slots__ = ("starts", "ends", "peak_amps", "soc_start", "soc_end", "_solar", "_grid", "_blocks", "_cost", "_hours")
+
+    def __init__(self):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.peak_amps = array("B")
+        self.soc_start = array("b")
+        self.soc_end = array("b")
+        # Kumulativne vsote: element i je vsota prvih i sej
+        self._solar = array("q", [0])
+        self._grid = array("q", [0])
+        self._blocks = [array("q", [0]) for _ in range(BLOCKS)]
+        self._cost = array("q", [0])
+        self._hours = array("d", [0.0])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def append(self, record):
+        """Doda zaključeno sejo (tuple oblike RECORD)."""
+        if self.starts and record[0] < self.starts[-1]:
+            # Premik ure nazaj - redko, indeks zgradimo znova
+            self._rebuild(sorted([*self.records(), record]))
+            return
+        self._push(record)
+
+    def _push(self, record):
+        start, end, solar, grid, *rest = record
+        blocks, (cost, peak, soc_start, soc_end) = rest[:BLOCKS], rest[BLOCKS:]
+        self.starts.append(start)
+        self.ends.append(end)
+        self.peak_amps.append(peak)
+        self.soc_start.append(soc_start)
+        self.soc_end.append(soc_end)
+        self._solar.append(self._solar[-1] + solar)
+        self._grid.append(self._grid[-1] + grid)
+        for column, value in zip(self._blocks, blocks):
+            column.append(column[-1] + value)
+        self._cost.append(self._cost[-1] + cost)
+        self._hours.append(self._hours[-1] + (end - start) / 3600.0)
+
+    def _rebuild(self, records):
+        self.__init__()
+        for record in records:
+            self._push(record)
+
+    def record(self, index):
+        """Zapis seje index (tuple oblike RECORD)."""
+        return (
+            self.starts[index],
+            self.ends[index],
+            self._solar[index + 1] - self._solar[index],
+            self._grid[index + 1] - self._grid[index],
+            *(column[index + 1] - column[index] for column in self._blocks),
+            self._cost[index + 1] - self._cost[index],
+            self.peak_amps[index],
+            self.soc_start[index],
+            self.soc_end[index],
+        )
+
+    def records(self):
+        return [self.record(index) for index in range(len(self))]
+
+    def span(self, start=None, end=None):
+        """Indeksi sej, ki so se začele v [start, end)."""
+        lo = 0 if start is None else bisect_left(self.starts, start)
+        hi = len(self) if end is None else bisect_left(self.starts, end)
+        return lo, max(lo, hi)
+
+    def aggregate(self, start=None, end=None):
+        """Vsote sej, ki so se začele v [start, end) - O(log n), največji tok O(k) za k sej v oknu."""
+        lo, hi = self.span(start, end)
+        solar = self._solar[hi] - self._solar[lo]
+        grid = self._grid[hi] - self._grid[lo]
+        total = solar + grid
+        return {
+            "sessions": hi - lo,
+            "energy_total": round(total / 1_000_000, 3),
+            "energy_solar": round(solar / 1_000_000, 3),
+            "energy_grid": round(grid / 1_000_000, 3),
+            "solar_share": round(100.0 * solar / total, 1) if total else None,
+            "energy_by_block": {
+                str(block + 1): round((column[hi] - column[lo]) / 1_000_000, 3)
+                for block, column in enumerate(self._blocks)
+            },
+            "cost": round((self._cost[hi] - self._cost[lo]) / COST_SCALE, 2),
+            "hours": round(self._hours[hi] - self._hours[lo], 2),
+            "peak_amps": max(self.peak_amps[lo:hi], default=0),
+        }
+
+    def session(self, index):
+        """Posamezna seja za odgovor storitve."""
+        start, end, solar, grid, *rest = self.record(index)
+        soc_start, soc_end = rest[-2:]
+        return {
+            "start": start,
+            "end": end,
+            "energy_total": round((solar + grid) / 1_000_000, 3),
+            "energy_solar": round(solar / 1_000_000, 3),
+            "energy_grid": round(grid / 1_000_000, 3),
+            "energy_by_block": {str(block + 1): round(value / 1_000_000, 3) for block, value in enumerate(rest[:BLOCKS])},
+            "cost": round(rest[BLOCKS] / COST_SCALE, 2),
+            "peak_amps": rest[BLOCKS + 1],
+            "soc_start": None if soc_start == UNKNOWN_SOC else soc_start,
+            "soc_end": None if soc_end == UNKNOWN_SOC else soc_end,
+        }
+
+    def load(self, payload):
+        """Zgradi indeks iz vsebine datoteke. Vrne dolžino veljavnega dela (nedokončan zadnji zapis se zavrže)."""
+        self.__init__()
+        if len(payload) < HEADER.size:
+            return 0
+        magic, version = HEADER.unpack_from(payload)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError("unsupported session history file")
+        valid = HEADER.size + (len(payload) - HEADER.size) // RECORD.size * RECORD.size
+        records = [
+            record
+            for record in RECORD.iter_unpack(memoryview(payload)[HEADER.size:valid])
+            if math.isfinite(record[0]) and math.isfinite(record[1])
+        ]
+        records.sort()
+        self._rebuild(records)
+        return valid
+
+
+def read_history(path):
+    """Prebere datoteko zgodovine (blokirajoče - v executorju). Poškodovan rep odreže."""
+    history = SessionHistory()
+    try:
+        with open(path, "rb") as file:
+            payload = file.read()
+    except FileNotFoundError:
+        return history
+    valid = history.load(payload)
+    if valid != len(payload):
+        with open(path, "r+b") as file:
+            file.truncate(valid)
+    return history
+
+
+def append_history(path, record):
+    """Doda zapis seje na konec datoteke (blokirajoče - v executorju)."""
+    with open(path, "ab") as file:
+        if file.tell() == 0:
+            file.write(HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        file.write(RECORD.pack(*record))
+        file.flush()
+        os.fsync(file.fileno())
@@ -0,0 +1,747 @@
+"""EVSCI Simulation - Predvajanje posnetkov skozi regulacijski zakon z navidezno uro (brez Home Assistanta)."""
+import csv
+import datetime
+import math
+import random
+from array import array
+from collections import Counter, deque
+
+from .const import (
+    MODE_OFF,
+    MODE_DYNAMIC,
+    MODE_SCHEDULE,
+    MODE_DEPARTURE,
+    MODE_NO_CHANGE,
+    CONF_GRID_SENSOR,
+    CONF_TARIFF_SENSOR,
+    CONF_CHARGER_SWITCH,
+    CONF_CHARGER_CURRENT,
+    CONF_CHARGER_POWER,
+    CONF_CHARGER_STATUS,
+    CONF_EV_SOC_SENSOR,
+    CONF_PHASE_SWITCH,
+)
+from .control import (
+    ControlConfig,
+    ControlLaw,
+    MIN_AMPS,
+    STALE_DATA_THRESHOLD,
+    is_cable_connected,
+    is_idle,
+    is_schedule_active,
+    plan_commands,
+    split_ev_power,
+)
+from .demand import INTERVAL_SECONDS
+from .energy import ENERGY_KEYS, EnergyAccumulator
+from .forecast import HouseLoadProfile
+from .planner import DeparturePlanner
+
+# Entitete v simuliranem hass
+SIM_ENTITIES = {
+    CONF_GRID_SENSOR: "sensor.sim_grid_power",
+    CONF_TARIFF_SENSOR: "sensor.sim_tariff",
+    CONF_CHARGER_SWITCH: "switch.sim_charger",
+    CONF_CHARGER_CURRENT: "number.sim_charger_current",
+    CONF_CHARGER_POWER: "sensor.sim_charger_power",
+    CONF_CHARGER_STATUS: "sensor.sim_charger_status",
+    CONF_EV_SOC_SENSOR: "sensor.sim_ev_soc",
+}
+
+# Stikalo faz (le z phase_switch=True)
+SIM_PHASE_SWITCH = "switch.sim_phase_switch"
+
+# Izhodne entitete integracije (sensor.py), ki se zapišejo ob vsaki posodobitvi
+OUTPUT_ENTITIES = (
+    "sensor.target_current",
+    "sensor.monitored_grid_power",
+    "sensor.monitored_tariff_block",
+)
+
+# Senzorji energije - zapišejo se le ob objavi akumulatorja
+ENERGY_ENTITIES = tuple(f"sensor.{key}_energy" for key in ENERGY_KEYS)
+
+TICK_INTERVAL = 5.0
+# Kot EVSCICoordinator.IDLE_UPDATE_INTERVAL - cikel v mirovanju (s)
+IDLE_TICK_INTERVAL = 60.0
+
+# Kot EVSCICoordinator.FORECAST_HORIZON (s)
+FORECAST_HORIZON = 900
+
+
+class FakeState:
+    """Nadomestek za homeassistant.core.State."""
+
+    __slots__ = ("entity_id", "state", "attributes", "last_updated_timestamp")
+
+    def __init__(self, entity_id, state, timestamp, attributes=None):
+        self.entity_id = entity_id
+        self.state = state
+        self.attributes = attributes or {}
+        self.last_updated_timestamp = timestamp
+
+    @property
+    def last_updated(self):
+        return datetime.datetime.fromtimestamp(self.last_updated_timestamp, datetime.timezone.utc)
+
+
+class FakeStates:
+    """Nadomestek za hass.states. Kot v HA se nespremenjeno stanje ne zapiše.
+
+    calls šteje vse klice async_set, writes le dejanske spremembe (vrstice v recorderju).
+    """
+
+    def __init__(self):
+        self._states = {}
+        self.calls = 0
+        self.writes = 0
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def async_set(self, entity_id, new_state, attributes=None, timestamp=0.0):
+        self.calls += 1
+        new_state = str(new_state)
+        state = self._states.get(entity_id)
+        if state is not None and state.state == new_state and (attributes is None or state.attributes == attributes):
+            return
+        self.writes += 1
+        self._states[entity_id] = FakeState(entity_id, new_state, timestamp, attributes)
+
+
+class FakeServices:
+    """Nadomestek za hass.services - šteje klice in jih preda registriranim obdelovalcem."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._handlers = {}
+
+    def register(self, domain, service, handler):
+        self._handlers[(domain, service)] = handler
+
+    def call(self, domain, service, data):
+        self.calls[f"{domain}.{service}"] += 1
+        handler = self._handlers.get((domain, service))
+        if handler is not None:
+            handler(data)
+
+    async def async_call(self, domain, service, service_data=None, blocking=False, **kwargs):
+        self.call(domain, service, service_data or {})
+
+
+class FakeHass:
+    """Lokalni nadomestek za hass (states + services)."""
+
+    def __init__(self):
+        self.states = FakeStates()
+        self.services = FakeServices()
+        self.data = {}
+
+
+class VirtualClock:
+    """Navidezna ura simulacije (epoch sekunde)."""
+
+    __slots__ = ("now",)
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class SimulatedCharger:
+    """Preprost model polnilnice: tok velja takoj na entiteti, moč sledi z zamikom in linearno naraste v ramp_time.
+
+    Stikalo faz (SIM_PHASE_SWITCH) preklopi takoj; preklop med polnjenjem se šteje v unsafe_phase_switches.
+    """
+
+    def __init__(self, hass: FakeHass, clock: VirtualClock, power_per_amp, response_delay=2.0, ramp_time=0.0, phases=3):
+        self.clock = clock
+        self.phase_power = power_per_amp / phases
+        self.phases = phases
+        self.power_per_amp = power_per_amp
+        self.phase_switches = 0
+        self.unsafe_phase_switches = 0
+        self.response_delay = response_delay
+        self.ramp_time = ramp_time
+        self.switch = False
+        self.amps = 0.0
+        self.effective_amps = 0.0
+        self._pending = []
+        self._ramp = None  # (začetek, od, do)
+
+        hass.services.register("number", "set_value", self._set_value)
+        hass.services.register("switch", "turn_on", lambda data: self._set_switch(data, True))
+        hass.services.register("switch", "turn_off", lambda data: self._set_switch(data, False))
+
+    def _set_value(self, data):
+        self.amps = float(data["value"])
+        self._pending.append((self.clock.now + self.response_delay, self.amps))
+
+    def _set_switch(self, data, on):
+        if data.get("entity_id") != SIM_PHASE_SWITCH:
+            self.switch = on
+            return
+        phases = 3 if on else 1
+        if phases != self.phases:
+            self.phase_switches += 1
+            if self.switch and self.effective_amps >= MIN_AMPS:
+                self.unsafe_phase_switches += 1
+            self.phases = phases
+            self.power_per_amp = self.phase_power * phases
+
+    def advance(self, now):
+        """Uveljavi ukaze, katerih zamik je potekel."""
+        pending = self._pending
+        while pending and pending[0][0] <= now:
+            start, amps = pending.pop(0)
+            if self.ramp_time > 0:
+                self._ramp = (start, self.effective_amps, amps)
+            else:
+                self.effective_amps = amps
+        if self._ramp is not None:
+            start, from_amps, to_amps = self._ramp
+            progress = min(1.0, (now - start) / self.ramp_time)
+            self.effective_amps = from_amps + (to_amps - from_amps) * progress
+            if progress >= 1.0:
+                self._ramp = None
+
+    def power(self, connected):
+        if not (self.switch and connected) or self.effective_amps < MIN_AMPS:
+            return 0.0
+        return self.effective_amps * self.power_per_amp
+
+
+class Trace:
+    """Posnetek meritev (stolpčno, array-backed).
+
+    house_power je neto moč hiše brez polnilnice (omrežje - polnilnica), zato
+    lahko simulacija moč polnilnice zamenja s svojo.
+    """
+
+    __slots__ = ("time", "house_power", "tariff", "connected", "soc")
+
+    def __init__(self):
+        self.time = array("d")
+        self.house_power = array("d")
+        self.tariff = array("b")
+        self.connected = array("b")
+        self.soc = array("d")
+
+    def __len__(self):
+        return len(self.time)
+
+    def append(self, t, house_power, tariff=1, connected=True, soc=math.nan):
+        self.time.append(t)
+        self.house_power.append(house_power)
+        self.tariff.append(tariff)
+        self.connected.append(1 if connected else 0)
+        self.soc.append(soc)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Naloži CSV s stolpci time, grid_power, charger_power, tariff, status, soc.
+
+        time je epoch v sekundah ali ISO datum; manjkajoči stolpci dobijo privzete vrednosti.
+        """
+        trace = cls()
+        last_tariff = 1
+        with open(path, newline="", encoding="utf-8") as handle:
+            reader = csv.reader(handle)
+            header = next(reader)
+            columns = {name.strip(): idx for idx, name in enumerate(header)}
+            i_time = columns["time"]
+            i_grid = columns.get("grid_power")
+            i_charger = columns.get("charger_power")
+            i_tariff = columns.get("tariff")
+            i_status = columns.get("status")
+            i_soc = columns.get("soc")
+
+            for row in reader:
+                raw_time = row[i_time]
+                try:
+                    t = float(raw_time)
+                except ValueError:
+                    t = datetime.datetime.fromisoformat(raw_time).timestamp()
+
+                grid_power = _column(row, i_grid, 0.0)
+                charger_power = _column(row, i_charger, 0.0)
+
+                tariff = int(_column(row, i_tariff, last_tariff))
+                if 1 <= tariff <= 5:
+                    last_tariff = tariff
+                else:
+                    tariff = last_tariff
+
+                connected = True if i_status is None else is_cable_connected(row[i_status])
+                trace.append(t, grid_power - charger_power, tariff, connected, _column(row, i_soc, math.nan))
+        return trace
+
+
+# Sintetični profili obremenitve
+PROFILE_PV_DAY = "pv_day"
+PROFILE_HEATPUMP_EVENING = "heatpump_evening"
+PROFILE_OVERLOAD_BURSTS = "overload_bursts"
+PROFILES = (PROFILE_PV_DAY, PROFILE_HEATPUMP_EVENING, PROFILE_OVERLOAD_BURSTS)
+
+
+def tariff_block_for_hour(hour, weekend=False):
+    """Poenostavljen urnik blokov NMPT (višja sezona)."""
+    if weekend:
+        return 3 if (7 <= hour < 14 or 16 <= hour < 20) else 4
+    if 7 <= hour < 14 or 16 <= hour < 20:
+        return 1
+    if 6 <= hour < 7 or 14 <= hour < 16 or 20 <= hour < 22:
+        return 2
+    return 3
+
+
+def synthetic_trace(profile, hours=24.0, start=1_717_192_800.0, period=1.0, seed=0):
+    """Zgradi sintetičen Trace (privzeti začetek: 1. 6. 2024, 00:00 UTC)."""
+    rng = random.Random(seed)
+    trace = Trace()
+    samples = int(hours * 3600 / period)
+
+    cloud = 1.0
+    burst_until = -1.0
+    burst_power = 0.0
+    for k in range(samples):
+        t = start + k * period
+        seconds = k * period
+        hour = (seconds / 3600.0) % 24
+        load = 300.0 + 150.0 * rng.random()
+
+        if profile == PROFILE_PV_DAY:
+            # Sonce z mimoidočimi oblaki (naključni sprehod faktorja oblačnosti)
+            cloud = min(1.0, max(0.2, cloud + rng.gauss(0.0, 0.02)))
+            pv = max(0.0, math.sin((hour - 6.0) / 14.0 * math.pi)) * 7000.0 * cloud
+            load -= pv
+            connected = 8 <= hour < 18
+        elif profile == PROFILE_HEATPUMP_EVENING:
+            # Toplotna črpalka 20 min vklop / 20 min izklop zvečer, pečica ob 18h
+            if 17 <= hour < 23 and int(seconds // 1200) % 2 == 0:
+                load += 2500.0
+            if 18 <= hour < 19:
+                load += 2000.0
+            connected = hour >= 17 or hour < 7
+        else:
+            # Kratki sunki 6-9 kW (kuhalnik, grelnik vode ...)
+            if seconds >= burst_until and rng.random() < period / 900.0:
+                burst_until = seconds + rng.uniform(10.0, 60.0)
+                burst_power = rng.uniform(6000.0, 9000.0)
+            if seconds < burst_until:
+                load += burst_power
+            connected = True
+
+        trace.append(t, load, tariff_block_for_hour(int(hour)), connected)
+    return trace
+
+
+def _column(row, index, default):
+    if index is None:
+        return default
+    try:
+        return float(row[index])
+    except (IndexError, ValueError):
+        return default
+
+
+class SimulationResult:
+    """Izhod simulacije."""
+
+    def __init__(self):
+        self.tick_time = array("d")
+        self.target_amps = array("d")
+        self.switch_actions = []
+        self.service_calls = Counter()
+        self.coordinator_updates = 0
+        self.entity_writes = 0
+        self.state_writes = 0
+        self.seconds_over_fuse = 0.0
+        # Najdaljša neprekinjena preobremenitev varovalke, ki jo povzroča polnilnica (hiša sama je pod limitom)
+        self.max_seconds_over_fuse = 0.0
+        self.max_over_fuse_start = None
+        self.seconds_over_block = 0.0
+        self.intervals_over_block = 0  # 15-min intervali s povprečjem nad limitom bloka (obračun NMPT)
+        self.phase_switches = 0
+        self.unsafe_phase_switches = 0  # preklop faz med polnjenjem
+        self.max_interval_excess_w = 0.0
+        self.grid_kwh = 0.0
+        self.solar_kwh = 0.0
+        self.duration = 0.0
+
+    @property
+    def switch_cycles(self):
+        return sum(1 for _, on in self.switch_actions if on)
+
+    def summary(self):
+        return {
+            "duration_h": round(self.duration / 3600, 3),
+            "ticks": len(self.tick_time),
+            "service_calls": dict(self.service_calls),
+            "service_calls_total": sum(self.service_calls.values()),
+            "coordinator_updates": self.coordinator_updates,
+            "entity_writes": self.entity_writes,
+            "state_writes": self.state_writes,
+            "switch_cycles": self.switch_cycles,
+            "seconds_over_fuse": round(self.seconds_over_fuse, 1),
+            "max_seconds_over_fuse": round(self.max_seconds_over_fuse, 1),
+            "seconds_over_block": round(self.seconds_over_block, 1),
+            "intervals_over_block": self.intervals_over_block,
+            "max_interval_excess_w": round(self.max_interval_excess_w, 1),
+            "phase_switches": self.phase_switches,
+            "unsafe_phase_switches": self.unsafe_phase_switches,
+            "grid_kwh": round(self.grid_kwh, 3),
+            "solar_kwh": round(self.solar_kwh, 3),
+        }
+
+
+class Simulator:
+    """Predvaja Trace skozi ControlLaw enako kot EVSCICoordinator._async_update_data."""
+
+    def __init__(
+        self,
+        options,
+        trace: Trace,
+        mode=MODE_DYNAMIC,
+        target_soc=100,
+        schedule=(datetime.time(22, 0), datetime.time(6, 0)),
+        departure=datetime.time(7, 0),
+        tick_interval=TICK_INTERVAL,
+        response_delay=2.0,
+        ramp_time=0.0,
+        meter_delay=0.0,
+        fast_path=True,
+        model_entities=False,
+        phase_switch=False,
+        load_profile=None,
+        meter_gaps=(),
+    ):
+        entities = {**SIM_ENTITIES, CONF_PHASE_SWITCH: SIM_PHASE_SWITCH} if phase_switch else SIM_ENTITIES
+        self.cfg = ControlConfig({**entities, **options}, {})
+        self.law = ControlLaw(self.cfg)
+        self.trace = trace
+        self.mode = mode
+        self.target_soc = target_soc
+        self.schedule_start, self.schedule_end = schedule
+        self.departure = departure
+        self.planner = DeparturePlanner()
+        self.tick_interval = tick_interval
+        self.fast_path = fast_path
+
+        self.clock = VirtualClock(trace.time[0] if len(trace) else 0.0)
+        self.hass = FakeHass()
+        self.charger = SimulatedCharger(
+            self.hass, self.clock, self.cfg.power_per_amp, response_delay, ramp_time, self.cfg.phases
+        )
+        # Števec omrežja zaostaja za dejansko močjo (vzorcev)
+        self.meter_delay = meter_delay
+        # Okna (začetek, konec), ko se entiteta omrežja ne osvežuje (zamrznjen senzor)
+        self.meter_gaps = sorted(meter_gaps)
+        self._cable_connected = False
+        self._idle = False
+
+        # Model izhodnih entitet (za štetje zapisov stanj)
+        self.model_entities = model_entities
+        self.outputs = FakeStates()
+        self.energy = EnergyAccumulator(self.cfg.energy_resolution, self.cfg.energy_max_interval)
+        self._energy_written_version = None
+        self._last_tick_time = None
+
+        # Profil porabe hiše - lahko že naučen iz prejšnjega predvajanja
+        self.load_profile = load_profile if load_profile is not None else HouseLoadProfile()
+        start = datetime.datetime.fromtimestamp(self.clock.now).astimezone()
+        self._utc_offset = start.utcoffset().total_seconds()
+
+    def run(self) -> SimulationResult:
+        result = SimulationResult()
+        trace = self.trace
+        n = len(trace)
+        if n == 0:
+            return result
+
+        times = trace.time
+        house = trace.house_power
+        tariffs = trace.tariff
+        connected = trace.connected
+        charger = self.charger
+        clock = self.clock
+        power_per_amp = self.cfg.power_per_amp
+        max_fuse_amps = self.cfg.max_fuse_amps
+        block_limits = self.cfg.block_limits
+        fast_path = self.fast_path
+        sample_period = (times[-1] - times[0]) / (n - 1) if n > 1 else 1.0
+
+        next_tick = times[0]
+        grid_wh = 0.0
+        solar_wh = 0.0
+        interval = None
+        interval_ws = 0.0
+        interval_limit = 0.0
+        response = self.law.response
+        meter_samples = int(round(self.meter_delay / sample_period)) + 1
+        meter_power = deque([0.0] * meter_samples, maxlen=meter_samples)
+        gaps = self.meter_gaps
+        gap_index = 0
+        meter_value = None
+        meter_time = times[0]
+        over_fuse_start = None
+
+        for i in range(n):
+            t = times[i]
+            clock.now = t
+            dt = times[i + 1] - t if i + 1 < n else sample_period
+
+            charger.advance(t)
+            charger_power = charger.power(connected[i])
+            grid_power = house[i] + charger_power
+            tariff = tariffs[i]
+            # Vrednost števca omrežja (z zamikom) - to vidi regulacija
+            meter_power.append(charger_power)
+            while gap_index < len(gaps) and gaps[gap_index][1] <= t:
+                gap_index += 1
+            frozen = meter_value is not None and gap_index < len(gaps) and gaps[gap_index][0] <= t
+            if not frozen:
+                meter_value = house[i] + meter_power[0]
+                meter_time = t
+                self.law.meter.update(t)
+            metered_grid_power = meter_value
+
+            # --- METRIKE ---
+            # Poraba hiše enakomerno po fazah priključka, polnilnica na svojih fazah
+            house_amps = house[i] / power_per_amp
+            if house_amps + charger_power / charger.power_per_amp > max_fuse_amps:
+                result.seconds_over_fuse += dt
+                if charger_power > 0 and house_amps <= max_fuse_amps:
+                    if over_fuse_start is None:
+                        over_fuse_start = t
+                    if t + dt - over_fuse_start > result.max_seconds_over_fuse:
+                        result.max_seconds_over_fuse = t + dt - over_fuse_start
+                        result.max_over_fuse_start = over_fuse_start
+                else:
+                    over_fuse_start = None
+            else:
+                over_fuse_start = None
+            if grid_power > block_limits[tariff]:
+                result.seconds_over_block += dt
+            quarter = t // INTERVAL_SECONDS
+            if quarter != interval:
+                if interval is not None and interval_ws > interval_limit * INTERVAL_SECONDS:
+                    result.intervals_over_block += 1
+                    excess = interval_ws / INTERVAL_SECONDS - interval_limit
+                    result.max_interval_excess_w = max(result.max_interval_excess_w, excess)
+                interval = quarter
+                interval_ws = 0.0
+                interval_limit = block_limits[tariff]
+            interval_ws += grid_power * dt
+            if charger_power > 0:
+                ev_grid, ev_solar = split_ev_power(charger_power, grid_power)
+                grid_wh += ev_grid * dt / 3600.0
+                solar_wh += ev_solar * dt / 3600.0
+
+            if response.observing:
+                # Kot koordinator: odziv na ukaz se meri ob vsaki spremembi stanja
+                response.observe(t, charger_power, metered_grid_power)
+
+            if self._idle and connected[i] != self._cable_connected:
+                # Kot koordinator: sprememba statusa polnilnice sproži cikel takoj
+                next_tick = t
+            if t >= next_tick:
+                self._tick(t, i, metered_grid_power, charger_power, result, t - meter_time)
+                if self._idle:
+                    next_tick = t + max(IDLE_TICK_INTERVAL, self.tick_interval)
+                while next_tick <= t:
+                    next_tick += self.tick_interval
+            elif fast_path and not frozen and charger.switch and self.mode != MODE_OFF:
+                # Hitra pot: preobremenitev se obdela ob vsakem vzorcu, ne šele ob ciklu
+                self._fast_path(t, metered_grid_power, charger_power, tariff, result)
+
+        result.grid_kwh = grid_wh / 1000.0
+        result.solar_kwh = solar_wh / 1000.0
+        result.duration = times[-1] - times[0] + sample_period
+        result.phase_switches = charger.phase_switches
+        result.unsafe_phase_switches = charger.unsafe_phase_switches
+        result.service_calls = self.hass.services.calls
+        result.entity_writes = self.outputs.calls
+        result.state_writes = self.outputs.writes
+        return result
+
+    def _publish(self, t, i, grid_power, charger_power):
+        """Zapiše trenutne vrednosti v simulirane entitete."""
+        states = self.hass.states
+        trace = self.trace
+        states.async_set(SIM_ENTITIES[CONF_GRID_SENSOR], grid_power, timestamp=t)
+        states.async_set(SIM_ENTITIES[CONF_CHARGER_POWER], charger_power, timestamp=t)
+        states.async_set(SIM_ENTITIES[CONF_TARIFF_SENSOR], trace.tariff[i], timestamp=t)
+        states.async_set(SIM_ENTITIES[CONF_CHARGER_SWITCH], "on" if self.charger.switch else "off", timestamp=t)
+        states.async_set(SIM_ENTITIES[CONF_CHARGER_CURRENT], self.charger.amps, timestamp=t)
+        states.async_set(SIM_ENTITIES[CONF_CHARGER_STATUS], "Charging" if trace.connected[i] else "0", timestamp=t)
+        soc = trace.soc[i]
+        states.async_set(SIM_ENTITIES[CONF_EV_SOC_SENSOR], "unknown" if math.isnan(soc) else int(soc), timestamp=t)
+        if self.cfg.phase_switching:
+            states.async_set(SIM_PHASE_SWITCH, "on" if self.charger.phases == 3 else "off", timestamp=t)
+
+    def _tick(self, t, i, grid_power, charger_power, result, meter_age=0.0):
+        """En cikel koordinatorja."""
+        cfg = self.cfg
+        self._publish(t, i, grid_power, charger_power)
+        states = self.hass.states
+
+        data_is_stale = meter_age > STALE_DATA_THRESHOLD
+        tariff = int(states.get(cfg.tariff_entity).state)
+        current_hw_amps = float(states.get(cfg.charger_current_entity).state)
+        is_charging = states.get(cfg.charger_switch_entity).state == "on"
+
+        soc_state = states.get(cfg.ev_soc_entity).state
+        current_soc = int(soc_state) if soc_state.isdigit() else None
+
+        # Energija (kot koordinator: vzorec ob ciklu * čas od zadnjega cikla)
+        time_diff = 0.0 if self._last_tick_time is None else min(t - self._last_tick_time, 60.0)
+        self._last_tick_time = t
+        ev_grid, ev_solar = split_ev_power(charger_power, grid_power)
+        self.energy.add(ev_grid, ev_solar, time_diff)
+        force_publish = False
+
+        # Logika priklopa
+        is_connected_now = is_cable_connected(states.get(cfg.charger_status_entity).state)
+        if is_connected_now and not self._cable_connected:
+            self.energy.reset_session()
+            self.planner.invalidate()
+            force_publish = True
+            if cfg.auto_mode_on_plugin != MODE_NO_CHANGE:
+                self.mode = cfg.auto_mode_on_plugin
+        elif not is_connected_now and self._cable_connected:
+            self.planner.invalidate()
+            if cfg.reset_on_unplug:
+                self.mode = MODE_OFF
+        self._cable_connected = is_connected_now
+        self.energy.maybe_publish(t, force_publish)
+
+        schedule_active = False
+        if self.mode == MODE_SCHEDULE:
+            local_time = datetime.datetime.fromtimestamp(t).time()
+            schedule_active = is_schedule_active(self.schedule_start, self.schedule_end, local_time)
+
+        next_tariff = None
+        if self.law.uses_demand(self.mode):
+            next_tariff = self._block_at((t // INTERVAL_SECONDS + 1) * INTERVAL_SECONDS)
+
+        planned_amps = 0
+        if self.mode == MODE_DEPARTURE and self._cable_connected:
+            planned_amps = self._plan_amps(t, grid_power - charger_power, current_soc)
+
+        if cfg.phase_switching:
+            self.law.confirm_phases(t, 3 if states.get(SIM_PHASE_SWITCH).state == "on" else 1)
+
+        local_time = t + self._utc_offset
+        self.load_profile.update(local_time, grid_power - charger_power, time_diff)
+        forecast_load = self.load_profile.peak(local_time, FORECAST_HORIZON) if cfg.load_forecast else None
+
+        decision = self.law.step(
+            t,
+            self.mode,
+            tariff,
+            grid_power,
+            charger_power,
+            current_hw_amps,
+            is_charging,
+            data_is_stale,
+            current_soc,
+            self.target_soc,
+            schedule_active,
+            None,
+            None,
+            planned_amps,
+            next_tariff,
+            forecast_load,
+            meter_age,
+        )
+
+        result.tick_time.append(t)
+        result.target_amps.append(decision.target_amps)
+
+        amps, switch = plan_commands(decision.target_amps, decision.switch_on, current_hw_amps, is_charging, self._cable_connected)
+        self._send(t, amps, switch, result, decision.phases)
+        self._publish_outputs(t, decision.target_amps, tariff, grid_power, result)
+        self._idle = amps is None and switch is None and is_idle(self.mode, is_charging, self._cable_connected)
+
+    def _plan_amps(self, t, house_load, current_soc):
+        """Kot EVSCICoordinator._update_plan; prihodnje bloke pozna iz posnetka, cen ni."""
+        delivered_wh = (self.energy.session_grid + self.energy.session_solar) / 1000.0
+        now = datetime.datetime.fromtimestamp(t)
+        departure = now.replace(hour=self.departure.hour, minute=self.departure.minute, second=0, microsecond=0)
+        if departure <= now:
+            departure += datetime.timedelta(days=1)
+        signature = (departure.timestamp(), self.target_soc, None)
+
+        if self.planner.needs_replan(t, delivered_wh, signature):
+            capacity_wh = self.cfg.battery_capacity * 1000.0
+            if current_soc is not None:
+                needed_wh = capacity_wh * (self.target_soc - current_soc) / 100.0
+            else:
+                needed_wh = capacity_wh * self.target_soc / 100.0 - delivered_wh
+            self.planner.replan(
+                t,
+                delivered_wh,
+                signature,
+                departure.timestamp(),
+                needed_wh,
+                self.law.power_per_amp,
+                self._block_at,
+                self.law.block_caps(MODE_DEPARTURE, house_load),
+            )
+        return self.planner.amps_at(t)
+
+    def _block_at(self, timestamp):
+        """Blok iz posnetka (po koncu posnetka velja zadnji)."""
+        times = self.trace.time
+        if len(times) < 2:
+            return self.trace.tariff[0]
+        period = (times[-1] - times[0]) / (len(times) - 1)
+        index = min(len(times) - 1, max(0, int((timestamp - times[0]) / period)))
+        return self.trace.tariff[index]
+
+    def _publish_outputs(self, t, target_amps, tariff, grid_power, result):
+        """Posodobitev koordinatorja - kot v sensor.py vsak senzor zapiše svoje stanje."""
+        result.coordinator_updates += 1
+        if not self.model_entities:
+            return
+
+        outputs = self.outputs
+        outputs.async_set(OUTPUT_ENTITIES[0], target_amps, timestamp=t)
+        outputs.async_set(OUTPUT_ENTITIES[1], grid_power, timestamp=t)
+        outputs.async_set(OUTPUT_ENTITIES[2], tariff, timestamp=t)
+
+        energy = self.energy
+        if energy.version != self._energy_written_version:
+            self._energy_written_version = energy.version
+            published = energy.published
+            for key, entity_id in zip(ENERGY_KEYS, ENERGY_ENTITIES):
+                outputs.async_set(entity_id, published[key], timestamp=t)
+
+    def _fast_path(self, t, grid_power, charger_power, tariff, result):
+        """Ekvivalent EVSCICoordinator._async_emergency_check."""
+        current_hw_amps = self.charger.amps
+        if not self.law.is_emergency(self.mode, tariff, grid_power, charger_power, current_hw_amps, None, t):
+            return
+        adjusted_amps = MIN_AMPS if current_hw_amps > MIN_AMPS else 0
+        if adjusted_amps != current_hw_amps:
+            self._send(t, adjusted_amps, None, result)
+            self._publish_outputs(t, adjusted_amps, tariff, grid_power, result)
+
+    def _send(self, t, amps, switch, result, phases=None):
+        """Ukazi polnilnici - enako zaporedje kot ChargerActuator."""
+        services = self.hass.services
+        if switch is True:
+            services.call("switch", "turn_on", {})
+            result.switch_actions.append((t, True))
+        if amps is not None and amps != self.charger.amps:
+            services.call("number", "set_value", {"value": amps})
+            self.law.last_amp_change_time = t
+            self.law.response.command(t, amps, self.law.power_per_amp, MIN_AMPS)
+        if switch is False:
+            services.call("switch", "turn_off", {})
+            result.switch_actions.append((t, False))
+        if phases is not None:
+            services.call("switch", "turn_on" if phases == 3 else "turn_off", {"entity_id": SIM_PHASE_SWITCH})
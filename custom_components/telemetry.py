@@ -0,0 +1,263 @@
+"""EVSCI Telemetry - Zapis vsakega cikla v stolpčne datoteke .npz (brez odvisnosti od Home Assistanta).
+
+Vsaka datoteka je en kos (največ CHUNK_ROWS ciklov ali CHUNK_SECONDS) s
+stolpcem .npy za vsako polje - numpy.load(pot) jo prebere neposredno,
+read_chunk() pa brez numpy.
+"""
+import ast
+import math
+import os
+import struct
+import sys
+import time
+import zipfile
+from array import array
+
+from .const import MODES
+from .control import (
+    BRANCH_OFF,
+    BRANCH_STALE,
+    BRANCH_EMERGENCY,
+    BRANCH_DECREASE,
+    BRANCH_STARTUP,
+    BRANCH_RAMP_UP,
+    BRANCH_HOLD,
+    BRANCH_PHASE_SWITCH,
+    LIMIT_FUSE,
+    LIMIT_BLOCK,
+    LIMIT_SHARE,
+    LIMIT_FORECAST,
+)
+
+# Kos: največ toliko ciklov ali sekund (pri ciklu 5 s je kos ena ura)
+CHUNK_ROWS = 3600
+CHUNK_SECONDS = 3600
+# Vnaprej alocirani medpomnilniki - en se polni, drugi se lahko piše na disk
+BUFFERS = 2
+
+FILE_PREFIX = "telemetry-"
+FILE_SUFFIX = ".npz"
+
+# Stolpci: ime, typecode (array) in dtype (.npy)
+COLUMNS = (
+    ("time", "d", "<f8"),
+    ("grid", "f", "<f4"),
+    ("charger", "f", "<f4"),
+    ("current_amps", "f", "<f4"),
+    ("target_amps", "f", "<f4"),
+    ("amps_command", "f", "<f4"),  # NaN = brez ukaza
+    ("tariff", "b", "|i1"),
+    ("mode", "B", "|u1"),  # indeks v mode_labels
+    ("branch", "B", "|u1"),  # indeks v branch_labels
+    ("limited_by", "B", "|u1"),  # indeks v limited_by_labels ("" = brez omejitve)
+    ("switch_command", "b", "|i1"),  # -1 = brez ukaza, 0/1 = izklop/vklop
+    ("stale", "B", "|u1"),
+)
+
+# Oznake kod - shranijo se v vsak kos, da je datoteka samozadostna
+LABELS = {
+    "mode": tuple(MODES),
+    "branch": (
+        BRANCH_OFF,
+        BRANCH_STALE,
+        BRANCH_EMERGENCY,
+        BRANCH_DECREASE,
+        BRANCH_STARTUP,
+        BRANCH_RAMP_UP,
+        BRANCH_HOLD,
+        BRANCH_PHASE_SWITCH,
+    ),
+    "limited_by": ("", LIMIT_FUSE, LIMIT_BLOCK, LIMIT_SHARE, LIMIT_FORECAST),
+}
+_CODES = {name: {label: code for code, label in enumerate(labels)} for name, labels in LABELS.items()}
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+class TelemetryBuffer:
+    """Stolpci enega kosa, alocirani vnaprej za CHUNK_ROWS ciklov."""
+
+    __slots__ = ("columns", "rows", "start")
+
+    def __init__(self, capacity):
+        self.columns = tuple(array(typecode, bytes(array(typecode).itemsize * capacity)) for _, typecode, _ in COLUMNS)
+        self.rows = 0
+        self.start = None
+
+
+class TelemetryRecorder:
+    """Polni medpomnilnik cikel za ciklom; poln kos vrne za zapis izven zanke dogodkov.
+
+    Pomnilnik je omejen na BUFFERS kosov. Če pisanje zaostaja in prostega
+    medpomnilnika ni, se cikli zavržejo (števec dropped).
+    """
+
+    __slots__ = ("_capacity", "_chunk_seconds", "_free", "_current", "dropped", "written")
+
+    def __init__(self, capacity=CHUNK_ROWS, chunk_seconds=CHUNK_SECONDS, buffers=BUFFERS):
+        self._capacity = capacity
+        self._chunk_seconds = chunk_seconds
+        self._free = [TelemetryBuffer(capacity) for _ in range(buffers)]
+        self._current = self._free.pop()
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, now_time, mode, tariff, grid_power, charger_power, current_amps, decision, amps, switch, stale):
+        """Zapiše cikel. Vrne poln TelemetryBuffer za write_chunk ali None."""
+        buffer = self._current
+        if buffer is None:
+            buffer = self._current = self._free.pop() if self._free else None
+            if buffer is None:
+                self.dropped += 1
+                return None
+
+        row = buffer.rows
+        if row == 0:
+            buffer.start = now_time
+        (
+            times,
+            grid,
+            charger,
+            current,
+            target,
+            command,
+            tariffs,
+            modes,
+            branches,
+            limited,
+            switches,
+            stales,
+        ) = buffer.columns
+        times[row] = now_time
+        grid[row] = grid_power
+        charger[row] = charger_power
+        current[row] = current_amps
+        target[row] = decision.target_amps
+        command[row] = math.nan if amps is None else amps
+        tariffs[row] = tariff
+        modes[row] = _CODES["mode"].get(mode, 0)
+        branches[row] = _CODES["branch"].get(decision.branch, 0)
+        limited[row] = _CODES["limited_by"].get(decision.limited_by or "", 0)
+        switches[row] = -1 if switch is None else int(switch)
+        stales[row] = stale
+        buffer.rows = row + 1
+
+        if buffer.rows >= self._capacity or now_time - buffer.start >= self._chunk_seconds:
+            return self.take()
+        return None
+
+    def take(self):
+        """Odda trenutni kos (tudi nepoln, npr. ob zaustavitvi) ali None, če je prazen."""
+        buffer = self._current
+        if buffer is None or buffer.rows == 0:
+            return None
+        self._current = self._free.pop() if self._free else None
+        return buffer
+
+    def release(self, buffer):
+        """Kos je zapisan - medpomnilnik je spet prost."""
+        self.written += buffer.rows
+        buffer.rows = 0
+        buffer.start = None
+        if self._current is None:
+            self._current = buffer
+        else:
+            self._free.append(buffer)
+
+    def as_dict(self):
+        return {
+            "rows": self._current.rows if self._current else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+def _npy(payload, descr, count):
+    """Datoteka .npy (različica 1.0) za enodimenzionalen stolpec."""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({count},), }}".encode("latin1")
+    header += b" " * (63 - (len(NPY_MAGIC) + 2 + len(header)) % 64) + b"\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header + payload
+
+
+def _column_bytes(values, rows):
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values = array(values.typecode, values[:rows])
+        values.byteswap()
+        return values.tobytes()
+    return memoryview(values)[:rows].tobytes()
+
+
+def _labels_npy(labels):
+    width = max(1, max(len(label) for label in labels))
+    payload = b"".join(label.ljust(width, "\0").encode("utf-32-le") for label in labels)
+    return _npy(payload, f"<U{width}", len(labels))
+
+
+def write_chunk(directory, buffer, max_bytes):
+    """Zapiše kos v datoteko .npz in pobriše najstarejše kose nad max_bytes (blokirajoče - v executorju)."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{FILE_PREFIX}{time.strftime('%Y%m%dT%H%M%S', time.gmtime(buffer.start))}{FILE_SUFFIX}"
+    path = os.path.join(directory, name)
+    temporary = path + ".tmp"
+    rows = buffer.rows
+    with zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for (column, _, descr), values in zip(COLUMNS, buffer.columns):
+            archive.writestr(f"{column}.npy", _npy(_column_bytes(values, rows), descr, rows))
+        for column, labels in LABELS.items():
+            archive.writestr(f"{column}_labels.npy", _labels_npy(labels))
+    os.replace(temporary, path)
+    rotate(directory, max_bytes)
+    return path
+
+
+def list_chunks(directory):
+    """Poti kosov od najstarejšega do najnovejšega."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(names)
+        if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+    ]
+
+
+def rotate(directory, max_bytes):
+    """Briše najstarejše kose, dokler skupna velikost ne pade pod max_bytes. Zadnji kos ostane."""
+    chunks = [(path, os.path.getsize(path)) for path in list_chunks(directory)]
+    total = sum(size for _, size in chunks)
+    for path, size in chunks[:-1]:
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def read_chunk(path):
+    """Prebere kos brez numpy: dict stolpec -> array (oznake kot tuple nizov)."""
+    typecodes = {column: typecode for column, typecode, _ in COLUMNS}
+    result = {}
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.namelist():
+            column = member.removesuffix(".npy")
+            data = archive.read(member)
+            if data[:len(NPY_MAGIC)] != NPY_MAGIC:
+                continue
+            header_length = struct.unpack_from("<H", data, len(NPY_MAGIC))[0]
+            offset = len(NPY_MAGIC) + 2
+            header = ast.literal_eval(data[offset:offset + header_length].decode("latin1"))
+            payload = data[offset + header_length:]
+            descr = header["descr"]
+            if descr.startswith("<U"):
+                width = int(descr[2:]) * 4
+                result[column] = tuple(
+                    payload[i:i + width].decode("utf-32-le").rstrip("\0") for i in range(0, len(payload), width)
+                )
+            elif column in typecodes:
+                values = array(typecodes[column])
+                values.frombytes(payload)
+                if sys.byteorder == "big" and values.itemsize > 1:
+                    values.byteswap()
+                result[column] = values
+    return result
@@ -15,6 +15,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
     async_add_entities([
         EVSCIScheduleStart(coordinator),
         EVSCIScheduleEnd(coordinator),
+        EVSCIDepartureTime(coordinator),
     ], True)
 
 class EVSCIScheduleStart(CoordinatorEntity, TimeEntity):
@@ -35,6 +36,7 @@ class EVSCIScheduleStart(CoordinatorEntity, TimeEntity):
     async def async_set_value(self, value: datetime.time) -> None:
         """Shrani vrednost v koordinator."""
         self.coordinator.schedule_start = value
+        self.coordinator.save_state()
         # Sproži posodobitev, da se logika takoj preračuna
         await self.coordinator.async_refresh()
 
@@ -54,4 +56,25 @@ class EVSCIScheduleEnd(CoordinatorEntity, TimeEntity):
 
     async def async_set_value(self, value: datetime.time) -> None:
         self.coordinator.schedule_end = value
+        self.coordinator.save_state()
+        await self.coordinator.async_refresh()
+
+class EVSCIDepartureTime(CoordinatorEntity, TimeEntity):
+    """Ura odhoda za način Departure."""
+    _attr_has_entity_name = True
+    _attr_name = "Departure Time"
+    _attr_icon = "mdi:car-clock"
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{coordinator.entry.entry_id}_departure_time"
+
+    @property
+    def native_value(self) -> datetime.time | None:
+        return self.coordinator.departure_time
+
+    async def async_set_value(self, value: datetime.time) -> None:
+        # Nov čas odhoda spremeni podpis načrta - naslednji cikel ga preračuna
+        self.coordinator.departure_time = value
+        self.coordinator.save_state()
         await self.coordinator.async_refresh()
@@ -0,0 +1,9 @@
+"""Čisti moduli integracije so v testih dosegljivi kot paket "evsci" (glej tools/_evsci.py)."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import _evsci  # noqa: E402
+
+_evsci.load()
@@ -0,0 +1,128 @@
+"""ChargerActuator: napake ukazov, ponovni poskus in nujni ukazi med backoffom."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import voluptuous as vol
+
+from evsci import actuator
+from evsci.actuator import ChargerActuator
+
+
+class FakeServices:
+    def __init__(self):
+        self.calls = []
+        self.errors = []
+
+    async def async_call(self, domain, service, data, blocking=False):
+        self.calls.append((domain, service, data.get("value")))
+        # None v seznamu napak = uspešen klic
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+
+class FakeHass:
+    def __init__(self):
+        self.services = FakeServices()
+        self.states = {"switch.charger": SimpleNamespace(state="on"), "number.current": SimpleNamespace(state="16")}
+
+
+async def _wait_for(condition, timeout=2.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def _run(test):
+    hass = FakeHass()
+    charger = ChargerActuator(hass, "switch.charger", "number.current")
+    task = asyncio.create_task(charger._async_run())
+    try:
+        await test(hass, charger)
+        assert not task.done()
+    finally:
+        task.cancel()
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(actuator, "BACKOFF_MIN", 0.2)
+
+
+def test_unexpected_error_is_retried():
+    async def test(hass, charger):
+        hass.services.errors.append(vol.Invalid("value out of range"))
+        charger.submit(amps=10)
+        await _wait_for(lambda: charger.last_amps == 10)
+        assert hass.services.calls == [("number", "set_value", 10), ("number", "set_value", 10)]
+        assert charger.failed_calls == 1
+        assert charger.failures == 0
+
+    asyncio.run(_run(test))
+
+
+def test_task_survives_repeated_errors():
+    async def test(hass, charger):
+        hass.services.errors.extend([RuntimeError("boom"), RuntimeError("boom")])
+        charger.submit(amps=10)
+        await _wait_for(lambda: charger.failed_calls == 2)
+        await _wait_for(lambda: charger.last_amps == 10)
+        charger.submit(amps=12)
+        await _wait_for(lambda: charger.last_amps == 12)
+
+    asyncio.run(_run(test))
+
+
+def test_reduction_skips_backoff(monkeypatch):
+    monkeypatch.setattr(actuator, "BACKOFF_MIN", 60.0)
+
+    async def test(hass, charger):
+        charger.submit(amps=16)
+        await _wait_for(lambda: charger.last_amps == 16)
+        hass.services.errors.append(RuntimeError("boom"))
+        charger.submit(amps=20)
+        await _wait_for(lambda: charger.failed_calls == 1)
+        # Povečanje čaka na backoff, zmanjšanje ne
+        await asyncio.sleep(0.1)
+        assert charger.last_amps == 16
+        charger.submit(amps=6)
+        await _wait_for(lambda: charger.last_amps == 6)
+        assert charger.offline_until == 0.0
+
+    asyncio.run(_run(test))
+
+
+def test_newer_command_replaces_requeued():
+    async def test(hass, charger):
+        hass.services.errors.append(RuntimeError("boom"))
+        charger.submit(amps=10)
+        await _wait_for(lambda: charger.failed_calls == 1)
+        charger.submit(amps=8)
+        await _wait_for(lambda: charger.last_amps == 8)
+        await asyncio.sleep(0.3)
+        assert [value for _, _, value in hass.services.calls] == [10, 8]
+
+    asyncio.run(_run(test))
+
+
+def test_partial_failure_requeues_only_failed_part():
+    async def test(hass, charger):
+        async def acked(entity_id, target, timeout):
+            return True
+
+        charger._async_wait_for_state = acked
+        # Vklop uspe, nastavitev toka ne
+        hass.services.errors.extend([None, RuntimeError("boom")])
+        charger.submit(amps=10, switch=True)
+        await _wait_for(lambda: charger.failed_calls == 1)
+        assert charger.last_switch is True
+        assert charger.last_switch_time > 0
+        await _wait_for(lambda: charger.last_amps == 10)
+        assert hass.services.calls == [
+            ("switch", "turn_on", None),
+            ("number", "set_value", 10),
+            ("number", "set_value", 10),
+        ]
+
+    asyncio.run(_run(test))
@@ -0,0 +1,89 @@
+"""Delitev varovalke: water_fill in LoadBalancer.caps."""
+import pytest
+
+from evsci.allocator import DEMAND_TIMEOUT, ChargerDemand, LoadBalancer, water_fill
+from evsci.control import MIN_AMPS
+
+PPA = 690.0  # W/A pri treh fazah
+
+
+def _demand(request_amps, priority=1, charger_power=0.0):
+    demand = ChargerDemand()
+    demand.priority = priority
+    demand.power_per_amp = PPA
+    demand.charger_power = charger_power
+    demand.request_w = request_amps * PPA
+    demand.min_w = MIN_AMPS * PPA
+    return demand
+
+
+def test_water_fill_splits_surplus_by_priority():
+    alloc = water_fill({"a": _demand(32, 1), "b": _demand(32, 3)}, 24 * PPA)
+    assert alloc["a"] == pytest.approx(9 * PPA)
+    assert alloc["b"] == pytest.approx(15 * PPA)
+
+
+def test_water_fill_gives_surplus_of_saturated_charger_to_others():
+    alloc = water_fill({"a": _demand(8), "b": _demand(32)}, 30 * PPA)
+    assert alloc["a"] == pytest.approx(8 * PPA)
+    assert alloc["b"] == pytest.approx(22 * PPA)
+
+
+def test_water_fill_pauses_lowest_priority_without_room_for_minimums():
+    alloc = water_fill({"a": _demand(32, 1), "b": _demand(32, 2)}, 10 * PPA)
+    assert alloc["a"] == 0.0
+    assert alloc["b"] == pytest.approx(10 * PPA)
+
+
+def test_water_fill_prefers_charging_session_at_equal_priority():
+    alloc = water_fill({"a": _demand(32, charger_power=0.0), "b": _demand(32, charger_power=4000.0)}, 8 * PPA)
+    assert alloc == {"a": 0.0, "b": pytest.approx(8 * PPA)}
+
+
+def test_water_fill_ignores_zero_demand():
+    alloc = water_fill({"a": _demand(0), "b": _demand(32)}, 20 * PPA)
+    assert alloc == {"a": 0.0, "b": pytest.approx(20 * PPA)}
+
+
+def _caps(balancer, charger_id, now, request_amps=32, charger_power=0.0, grid_power=0.0, charging=True):
+    return balancer.caps(
+        "sensor.grid", charger_id, 1, PPA, charger_power, grid_power, now, request_amps, 25 * PPA, 25 * PPA, charging=charging
+    )
+
+
+def test_caps_alone_is_unlimited():
+    assert _caps(LoadBalancer(), "a", 0.0) == (None, None)
+
+
+def test_caps_shares_fuse_between_charging_chargers():
+    balancer = LoadBalancer()
+    _caps(balancer, "a", 0.0, charger_power=10 * PPA, grid_power=20 * PPA)
+    increase, maintain = _caps(balancer, "b", 1.0, charger_power=10 * PPA, grid_power=20 * PPA)
+    # Hiša brez polnilnic: 0 A, oba dobita polovico 25 A
+    assert (increase, maintain) == (12, 12)
+
+
+def test_caps_idle_charger_asks_only_for_minimum():
+    balancer = LoadBalancer()
+    _caps(balancer, "idle", 0.0, charging=False)
+    increase, maintain = _caps(balancer, "a", 1.0, charger_power=16 * PPA, grid_power=16 * PPA)
+    assert maintain == 25 - MIN_AMPS
+    assert _caps(balancer, "idle", 2.0, charger_power=0.0, grid_power=16 * PPA, charging=False) == (MIN_AMPS, MIN_AMPS)
+
+
+def test_caps_released_charger_takes_no_share():
+    balancer = LoadBalancer()
+    _caps(balancer, "a", 0.0)
+    _caps(balancer, "b", 0.0)
+    balancer.release("sensor.grid", "b")
+    assert balancer.group_size("sensor.grid") == 1
+    assert _caps(balancer, "a", 1.0) == (None, None)
+
+
+def test_caps_peer_survives_idle_cycle_but_expires_after_timeout():
+    balancer = LoadBalancer()
+    _caps(balancer, "a", 0.0)
+    _caps(balancer, "b", 0.0)
+    # Cikel v mirovanju je 60 s - delež druge polnilnice še velja
+    assert _caps(balancer, "a", 61.0) != (None, None)
+    assert _caps(balancer, "a", DEMAND_TIMEOUT + 1.0) == (None, None)
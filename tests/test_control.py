@@ -0,0 +1,220 @@
+"""Regulacijski zakon: korak regulacije, ukazi polnilnici in mirovanje."""
+import pytest
+
+from evsci.const import (
+    CONF_ADAPTIVE_INTERVAL,
+    CONF_CONTROL_INTERVAL,
+    CONF_DEMAND_AVERAGING,
+    CONF_LIMIT_BLOCK_1,
+    CONF_LIMIT_BLOCK_2,
+    CONF_LIMIT_BLOCK_3,
+    MODE_DYNAMIC,
+    MODE_MAX_POWER,
+    MODE_OFF,
+)
+from evsci.control import (
+    BRANCH_DECREASE,
+    BRANCH_EMERGENCY,
+    BRANCH_HOLD,
+    BRANCH_RAMP_UP,
+    BRANCH_STALE,
+    BRANCH_STARTUP,
+    LIMIT_BLOCK,
+    MIN_AMPS,
+    RAMP_UP_STEP,
+    ControlConfig,
+    ControlLaw,
+    is_idle,
+    plan_commands,
+)
+from evsci.meter import METER_HOLD_AGE, METER_SAFE_AGE
+
+
+@pytest.mark.parametrize(
+    "target, active, hw_amps, charging, connected, expected",
+    [
+        # Nespremenjen tok - brez ukaza
+        (16, True, 16, True, True, (None, None)),
+        # Sprememba toka med polnjenjem
+        (10, True, 16, True, True, (10, None)),
+        # Zagon: vklop in tok
+        (6, True, 0, False, True, (6, True)),
+        # Cilj pod minimumom - ne vklapljamo
+        (0, True, 0, False, True, (None, None)),
+        # Konec seje: 0 A in izklop
+        (0, False, 16, True, True, (0, False)),
+        # Brez kabla: 0 A se ne pošilja in stikalo ostane
+        (0, False, 16, True, False, (None, None)),
+        # Brez kabla in z zahtevanim tokom: tok se nastavi (za naslednji priklop)
+        (10, False, 16, True, False, (10, None)),
+        # Izklopljena polnilnica brez aktivne seje - nič
+        (0, False, 16, False, True, (None, None)),
+    ],
+)
+def test_plan_commands(target, active, hw_amps, charging, connected, expected):
+    assert plan_commands(target, active, hw_amps, charging, connected) == expected
+
+
+def test_is_idle():
+    assert is_idle(MODE_DYNAMIC, True, False)
+    assert is_idle(MODE_OFF, False, True)
+    assert not is_idle(MODE_OFF, True, True)
+    assert not is_idle(MODE_DYNAMIC, False, True)
+    # Neznano stanje priklopa ni mirovanje
+    assert not is_idle(MODE_DYNAMIC, False, None)
+
+
+# --- ControlLaw.step ---
+
+PPA = 690
+
+
+def make_law(**options):
+    cfg = ControlConfig(
+        {
+            CONF_ADAPTIVE_INTERVAL: False,
+            CONF_DEMAND_AVERAGING: False,
+            CONF_LIMIT_BLOCK_1: 8000,
+            CONF_LIMIT_BLOCK_2: 6000,
+            CONF_LIMIT_BLOCK_3: 4000,
+            **options,
+        },
+        {},
+    )
+    return ControlLaw(cfg)
+
+
+def run_step(law, mode, amps, house, tariff=1, now=100.0, charging=True, **kwargs):
+    charger = amps * PPA
+    return law.step(
+        now, mode, tariff, house + charger, charger, amps, charging, kwargs.pop("stale", False),
+        None, 100, False, **kwargs,
+    )
+
+
+def test_step_emergency_cuts_to_minimum():
+    law = make_law()
+    # 16 A + 12 kW hiše čez 25 A varovalko
+    decision = run_step(law, MODE_MAX_POWER, 16, 12000)
+    assert decision.is_emergency
+    assert decision.branch == BRANCH_EMERGENCY
+    assert decision.target_amps == MIN_AMPS
+
+    # Na minimumu nujni izklop ustavi polnjenje
+    decision = run_step(law, MODE_MAX_POWER, MIN_AMPS, 16000)
+    assert decision.branch == BRANCH_EMERGENCY
+    assert decision.target_amps == 0
+
+
+def test_step_emergency_ignores_control_interval():
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    decision = run_step(law, MODE_MAX_POWER, 16, 12000)
+    assert decision.target_amps == MIN_AMPS
+
+
+def test_step_decrease_waits_for_control_interval():
+    law = make_law()
+    # Blok 2: 6000 W; 8 A + 800 W hiše je nad limitom, pod mejo nujnega izklopa
+    law.last_amp_change_time = 90.0
+    decision = run_step(law, MODE_DYNAMIC, 8, 800, tariff=2)
+    assert not decision.is_emergency
+    assert decision.target_amps == 8
+    assert decision.branch == BRANCH_HOLD
+
+    law.last_amp_change_time = 0.0
+    decision = run_step(law, MODE_DYNAMIC, 8, 800, tariff=2)
+    assert decision.branch == BRANCH_DECREASE
+    assert decision.target_amps == 7
+    assert decision.limited_by == LIMIT_BLOCK
+
+
+def test_step_stale_data_stops_charging():
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    decision = run_step(law, MODE_MAX_POWER, 16, 1000, stale=True)
+    assert decision.branch == BRANCH_STALE
+    assert decision.target_amps == 0
+
+
+def test_step_silent_meter_holds_then_stops():
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    # Zadržanje: brez povečanja, tok ostane
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000, meter_age=METER_HOLD_AGE + 1)
+    assert decision.target_amps == 10
+    # Predolg molk števca: takoj na 0 ne glede na interval
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000, meter_age=METER_SAFE_AGE + 1)
+    assert decision.branch == BRANCH_STALE
+    assert decision.target_amps == 0
+
+
+def test_step_silent_meter_follows_learned_cadence():
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    # Števec se je doslej osveževal vsako sekundo
+    for t in range(120):
+        law.meter.update(float(t))
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000, now=130.0, meter_age=law.meter.safe_age + 1)
+    assert decision.branch == BRANCH_STALE
+    assert decision.target_amps == 0
+
+
+def test_step_ramp_up_waits_for_meter_to_settle():
+    law = make_law(**{CONF_CONTROL_INTERVAL: 10})
+    # Odziv še ni naučen - ukaz velja za ustaljen po DEFAULT_SETTLE (15 s)
+    law.last_amp_change_time = 88.0
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000)
+    assert decision.target_amps == 10
+    law.last_amp_change_time = 85.0
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000)
+    assert decision.target_amps == 10 + RAMP_UP_STEP
+
+
+def test_step_ramp_up_is_limited():
+    law = make_law()
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000)
+    assert decision.branch == BRANCH_RAMP_UP
+    assert decision.target_amps == 10 + RAMP_UP_STEP
+
+    # Pred iztekom intervala tok ostane
+    law.last_amp_change_time = 90.0
+    decision = run_step(law, MODE_MAX_POWER, 10, 1000)
+    assert decision.target_amps == 10
+
+
+def test_step_startup_goes_to_minimum():
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    decision = run_step(law, MODE_MAX_POWER, 0, 1000, charging=False)
+    assert decision.branch == BRANCH_STARTUP
+    assert decision.target_amps == MIN_AMPS
+    assert decision.switch_on
+
+
+@pytest.mark.parametrize(
+    "mode, tariff, increase, maintain",
+    [
+        # (8000 - 500 - 1000) / 690
+        (MODE_DYNAMIC, 1, 9, 10),
+        # (4000 - 500 - 1000) / 690
+        (MODE_DYNAMIC, 3, 3, 4),
+        # Max Power upošteva le varovalko: (25 * 690 - 500 - 1000) / 690
+        (MODE_MAX_POWER, 3, 22, 23),
+    ],
+)
+def test_step_tariff_block_limits(mode, tariff, increase, maintain):
+    law = make_law()
+    law.last_amp_change_time = 99.0
+    decision = run_step(law, mode, 0, 1000, tariff=tariff, charging=False)
+    assert decision.amps_limit_increase == increase
+    assert decision.amps_limit_maintain == maintain
+
+
+def test_step_lower_block_cuts_current():
+    law = make_law()
+    # 10 A v bloku 3 (4000 W) je čez mejo nujnega izklopa
+    decision = run_step(law, MODE_DYNAMIC, 10, 1000, tariff=3)
+    assert decision.is_emergency
+    assert decision.target_amps == MIN_AMPS
+    assert decision.limited_by == LIMIT_BLOCK
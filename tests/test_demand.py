@@ -0,0 +1,49 @@
+"""DemandIntegrator: vrzeli med vzorci, meja intervala in cikel v mirovanju."""
+import pytest
+
+import stress
+from evsci.const import MODE_DYNAMIC
+from evsci.demand import INTERVAL_SECONDS, MAX_SAMPLE_GAP, DemandIntegrator
+from evsci.simulation import Simulator, Trace
+
+START = 1000 * INTERVAL_SECONDS
+
+
+def _feed(times, power=3000.0):
+    demand = DemandIntegrator()
+    for t in times:
+        demand.update(t, power)
+    return demand
+
+
+def test_idle_ticks_are_integrated():
+    # Cikel v mirovanju je 60 s, dejanski razmik pa malo daljši
+    times = [START + k * 60.05 for k in range(11)]
+    demand = _feed(times)
+    assert demand.energy_ws == pytest.approx(3000.0 * (times[-1] - START))
+    # Porabljena polovica limita - preostanek sme 6000 W + prihranek
+    assert demand.allowed_power(times[-1], 6000.0) == pytest.approx(6000.0 + 3000.0 * 600.5 / 299.5)
+
+
+def test_gap_over_limit_is_not_integrated():
+    demand = _feed([START, START + 10.0, START + 10.0 + MAX_SAMPLE_GAP + 1.0])
+    assert demand.energy_ws == pytest.approx(3000.0 * 10.0)
+
+
+def test_interval_boundary_splits_sample():
+    demand = _feed([START + INTERVAL_SECONDS - 20.0, START + INTERVAL_SECONDS + 40.0])
+    assert demand.interval_start == START + INTERVAL_SECONDS
+    assert demand.energy_ws == pytest.approx(3000.0 * 40.0)
+
+
+def test_simulator_integrates_demand_while_unplugged():
+    # Kabel priklopljen šele po 10 min; vzorci na 7 s, zato cikli v mirovanju padejo na 63 s
+    trace = Trace()
+    for k in range(120):
+        t = START + 7.0 * k
+        trace.append(t, 3000.0, tariff=1, connected=t >= START + 600.0)
+    simulator = Simulator(stress.DEFAULT_OPTIONS, trace, mode=MODE_DYNAMIC)
+    simulator.run()
+    demand = simulator.law.demand
+    assert demand.interval_start == START
+    assert demand.average(trace.time[-1]) > 2500.0
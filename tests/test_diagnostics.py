@@ -0,0 +1,41 @@
+"""Diagnostika: naslovi v LAN in id polnilnice so skriti."""
+import asyncio
+from types import SimpleNamespace
+
+from evsci.const import CONF_OCPP_CHARGE_POINT, CONF_OCPP_HOST, CONF_OCPP_PORT, CONF_P1_SOURCE, DOMAIN
+from evsci.diagnostics import async_get_config_entry_diagnostics
+
+REDACTED = "**REDACTED**"
+
+
+class _State(SimpleNamespace):
+    def as_dict(self):
+        return {}
+
+
+def test_addresses_are_redacted():
+    coordinator = SimpleNamespace(
+        actuator=SimpleNamespace(
+            last_amps=None, last_switch=None, service_calls=0, failed_calls=0, failures=0, offline_until=0.0
+        ),
+        diagnostic_state=lambda: {
+            "ocpp": {"id": "CP-1", "status": "Charging"},
+            "p1": {"source": "192.168.1.20:8088", "telegrams": 3},
+        },
+        energy=_State(),
+        metrics=_State(),
+    )
+    entry = SimpleNamespace(
+        entry_id="entry",
+        data={CONF_OCPP_PORT: 9000, CONF_OCPP_HOST: "192.168.1.10"},
+        options={CONF_OCPP_CHARGE_POINT: "CP-1", CONF_P1_SOURCE: "192.168.1.20:8088"},
+    )
+    hass = SimpleNamespace(data={DOMAIN: {"entry": coordinator}})
+
+    result = asyncio.run(async_get_config_entry_diagnostics(hass, entry))
+    assert result["entry"]["data"] == {CONF_OCPP_PORT: 9000, CONF_OCPP_HOST: REDACTED}
+    assert result["entry"]["options"] == {CONF_OCPP_CHARGE_POINT: REDACTED, CONF_P1_SOURCE: REDACTED}
+    assert result["state"]["ocpp"] == {"id": REDACTED, "status": "Charging"}
+    assert result["state"]["p1"] == {"source": REDACTED, "telegrams": 3}
+    # Nastavitve vnosa ostanejo nespremenjene
+    assert entry.data[CONF_OCPP_HOST] == "192.168.1.10"
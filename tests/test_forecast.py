@@ -0,0 +1,48 @@
+"""HouseLoadProfile: učenje po času, ne po številu ciklov."""
+import random
+
+import pytest
+
+from evsci.forecast import MIN_SECONDS, PROFILE_VERSION, SLOT_COUNT, SLOT_SECONDS, HouseLoadProfile
+
+# Ponedeljek 00:00 (lokalni čas kot epoch sekunde)
+MONDAY = 4 * 86400
+
+
+def _learn(interval, weeks, seed=1):
+    rng = random.Random(seed)
+    profile = HouseLoadProfile()
+    for week in range(weeks):
+        start = MONDAY + week * 7 * 86400
+        t = start
+        while t < start + SLOT_SECONDS:
+            profile.update(t, 2000.0 + rng.uniform(-500.0, 500.0), interval)
+            t += interval
+    return profile
+
+
+@pytest.mark.parametrize("interval", [5.0, 60.0])
+def test_slot_is_learned_after_the_same_time(interval):
+    assert _learn(interval, 1).predict(MONDAY) is None
+    profile = _learn(interval, 2)
+    assert profile.learned_slots == 1
+    # 90. percentil enakomerne porabe 1500-2500 W
+    assert profile.predict(MONDAY) == pytest.approx(2400.0, abs=250.0)
+
+
+def test_idle_cycle_estimate_matches_fast_cycle():
+    fast = _learn(5.0, 4).predict(MONDAY)
+    idle = _learn(60.0, 4).predict(MONDAY)
+    assert idle == pytest.approx(fast, abs=200.0)
+
+
+def test_restore_rejects_other_versions():
+    data = {"version": 1, "quantile": [1000] * SLOT_COUNT, "scale": [100] * SLOT_COUNT, "count": [300] * SLOT_COUNT}
+    profile = HouseLoadProfile()
+    assert not profile.restore(data)
+    assert profile.seconds[0] == 0
+    data = {"version": 3, "quantile": [1000] * SLOT_COUNT, "scale": [100] * SLOT_COUNT, "seconds": [MIN_SECONDS] * SLOT_COUNT}
+    assert not profile.restore(data)
+    data["version"] = PROFILE_VERSION
+    assert profile.restore(data)
+    assert HouseLoadProfile().restore(profile.as_dict())
@@ -0,0 +1,52 @@
+"""MeterWatch: ritem osveževanja števca in meje molka."""
+import pytest
+
+from evsci.meter import HOLD_PERIODS, METER_HOLD_AGE, METER_SAFE_AGE, SAFE_PERIODS, MeterWatch
+
+
+def _feed(meter, start, interval, count):
+    t = start
+    for _ in range(count):
+        meter.update(t)
+        t += interval
+    return t
+
+
+def test_defaults_until_learned():
+    meter = MeterWatch()
+    assert meter.hold_age == METER_HOLD_AGE
+    assert meter.safe_age == METER_SAFE_AGE
+
+
+def test_fast_meter_detects_silence_early():
+    meter = MeterWatch()
+    # P1 telegram vsako sekundo
+    _feed(meter, 0.0, 1.0, 120)
+    assert meter.period == pytest.approx(1.0, abs=0.05)
+    assert meter.hold_age == pytest.approx(HOLD_PERIODS, abs=0.2)
+    assert meter.safe_age == pytest.approx(SAFE_PERIODS, abs=0.3)
+
+
+def test_slow_meter_is_capped():
+    meter = MeterWatch()
+    _feed(meter, 0.0, 10.0, 50)
+    assert meter.hold_age == METER_HOLD_AGE
+    assert meter.safe_age == METER_SAFE_AGE
+
+
+def test_long_silence_is_learned_quickly_and_forgotten_slowly():
+    meter = MeterWatch()
+    t = _feed(meter, 0.0, 1.0, 120)
+    meter.update(t + 20.0)
+    assert meter.period > 10.0
+    _feed(meter, t + 21.0, 1.0, 120)
+    assert meter.period < 1.5
+
+
+def test_repeated_or_old_timestamps_are_ignored():
+    meter = MeterWatch()
+    _feed(meter, 0.0, 1.0, 120)
+    period = meter.period
+    meter.update(119.0)
+    meter.update(50.0)
+    assert meter.period == period
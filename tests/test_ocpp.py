@@ -0,0 +1,74 @@
+"""OCPP centralni sistem: tekoča transakcija po ponovnem zagonu in ponovni povezavi."""
+import asyncio
+import json
+
+from ocpp_charge_point import CHARGE_POINT_ID, SimulatedChargePoint, _free_port, _wait_for
+
+from evsci.ocpp import CALL, ChargePoint, OcppCentralSystem
+
+
+def test_transaction_recovered_after_restart():
+    async def test():
+        port = _free_port()
+        url = f"ws://127.0.0.1:{port}/{CHARGE_POINT_ID}"
+        # Redke MeterValues - id transakcije mora priti na TriggerMessage
+        charge_point = SimulatedChargePoint(url, meter_interval=60.0)
+
+        central = OcppCentralSystem(port, CHARGE_POINT_ID, "127.0.0.1")
+        await central.async_start()
+        task = asyncio.create_task(charge_point.run())
+        try:
+            await _wait_for(lambda: central.charge_point is not None and central.charge_point.status == "Preparing")
+            await central.async_set_charging(True)
+            await _wait_for(lambda: charge_point.transaction_id is not None)
+        finally:
+            # Ponovni zagon Home Assistanta - nov centralni sistem ne pozna transakcije
+            task.cancel()
+            await central.async_stop()
+
+        central = OcppCentralSystem(port, CHARGE_POINT_ID, "127.0.0.1")
+        await central.async_start()
+        task = asyncio.create_task(charge_point.run(boot=False))
+        try:
+            await _wait_for(lambda: central.charge_point is not None and central.charge_point.charging)
+            assert central.charge_point.transaction_id == charge_point.transaction_id
+            assert central.charge_point.status == "Charging"
+            # Transakcijo je mogoče ustaviti
+            await central.async_set_charging(False)
+            await _wait_for(lambda: not central.charge_point.charging and charge_point.transaction_id is None)
+        finally:
+            task.cancel()
+            await central.async_stop()
+
+    asyncio.run(test())
+
+
+class FakeWs:
+    def __init__(self):
+        self.sent = []
+
+    async def send_str(self, data):
+        self.sent.append(json.loads(data))
+
+
+def test_stopped_or_finished_transaction_is_not_revived():
+    async def test():
+        central = OcppCentralSystem(0, CHARGE_POINT_ID, "127.0.0.1")
+        charge_point = ChargePoint(CHARGE_POINT_ID, FakeWs(), central)
+        await charge_point.async_handle(json.dumps([CALL, "1", "MeterValues", {"connectorId": 1, "transactionId": 7}]))
+        assert charge_point.transaction_id == 7
+        await charge_point.async_handle(json.dumps([CALL, "2", "StopTransaction", {"transactionId": 7, "meterStop": 0}]))
+        # Pozne MeterValues končane transakcije
+        await charge_point.async_handle(json.dumps([CALL, "3", "MeterValues", {"connectorId": 1, "transactionId": 7}]))
+        assert not charge_point.charging
+
+        await charge_point.async_handle(json.dumps([CALL, "4", "MeterValues", {"connectorId": 1, "transactionId": 8}]))
+        assert charge_point.charging
+        # StopTransaction se je izgubil - konektor je spet prost
+        await charge_point.async_handle(
+            json.dumps([CALL, "5", "StatusNotification", {"connectorId": 1, "status": "Available", "errorCode": "NoError"}])
+        )
+        assert not charge_point.charging
+        charge_point.disconnected()
+
+    asyncio.run(test())
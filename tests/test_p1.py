@@ -0,0 +1,59 @@
+"""Števec P1: CRC telegrama, odpiranje serijskih vrat brez termios in task branja."""
+import asyncio
+import os
+import pty
+
+import pytest
+
+from evsci import p1
+
+TELEGRAM_BODY = (
+    b"/ISK5\\2M550T-1013\r\n\r\n"
+    b"1-0:1.7.0(02.300*kW)\r\n"
+    b"1-0:2.7.0(00.000*kW)\r\n"
+    b"1-0:32.7.0(230.0*V)\r\n"
+    b"1-0:21.7.0(02.300*kW)\r\n"
+    b"!"
+)
+
+
+def _telegram(body=TELEGRAM_BODY):
+    return body + f"{p1.crc16(body):04X}\r\n".encode("ascii")
+
+
+def test_parse_telegram_checks_crc():
+    reading = p1.parse_telegram(_telegram())
+    assert reading["power"] == 2300.0
+    assert reading["currents"][0] == pytest.approx(10.0)
+    corrupt = bytearray(_telegram())
+    corrupt[25] ^= 0x01
+    assert p1.parse_telegram(bytes(corrupt)) is None
+
+
+def test_serial_without_termios_raises_oserror(monkeypatch):
+    monkeypatch.setattr(p1, "termios", None)
+    master, slave = pty.openpty()
+    try:
+        with pytest.raises(OSError):
+            p1._configure_tty(slave)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_reader_task_comes_from_factory():
+    async def test():
+        tasks = []
+
+        def create_task(coro):
+            task = asyncio.get_running_loop().create_task(coro)
+            tasks.append(task)
+            return task
+
+        reader = p1.P1Reader("127.0.0.1:1")
+        reader.async_start(create_task)
+        assert len(tasks) == 1
+        await reader.async_stop()
+        assert tasks[0].cancelled()
+
+    asyncio.run(test())
@@ -0,0 +1,117 @@
+"""PhaseSwitchController: zaporedje preklopa, zakasnitve in časovne omejitve."""
+from evsci.phases import (
+    CONFIRM_TIMEOUT,
+    DOWN_DELAY,
+    PAUSE_TIMEOUT,
+    RESUME_DELAY,
+    STATE_IDLE,
+    STATE_PAUSING,
+    STATE_RESUMING,
+    STATE_SWITCHING,
+    UP_DELAY,
+    PhaseSwitchController,
+)
+
+THREE_MIN_W = 3 * 6 * 230
+HYSTERESIS = 300
+DWELL = 600
+
+
+def make_switch(phases=3):
+    return PhaseSwitchController(phases, HYSTERESIS, DWELL)
+
+
+def test_full_sequence():
+    switch = make_switch()
+    switch.request(0.0, 1)
+    assert switch.state == STATE_PAUSING and switch.busy
+
+    # Dokler polni, ukaza ni
+    assert switch.update(5.0, True, 4000.0) is None
+    assert switch.update(10.0, False, 0.0) == 1
+    assert switch.state == STATE_SWITCHING
+    assert switch.switches == 1
+
+    assert switch.confirm(15.0, 1)
+    assert switch.phases == 1
+    assert switch.state == STATE_RESUMING
+
+    assert switch.update(15.0 + RESUME_DELAY - 1, False, 0.0) is None
+    assert switch.state == STATE_RESUMING
+    switch.update(15.0 + RESUME_DELAY, False, 0.0)
+    assert switch.state == STATE_IDLE and not switch.busy
+
+
+def test_pause_timeout_aborts():
+    switch = make_switch()
+    switch.request(0.0, 1)
+    switch.update(PAUSE_TIMEOUT, True, 4000.0)
+    assert switch.state == STATE_PAUSING
+    switch.update(PAUSE_TIMEOUT + 1, True, 4000.0)
+    assert switch.state == STATE_IDLE
+    assert switch.target == 3 and switch.phases == 3
+
+
+def test_confirm_timeout_while_switching():
+    switch = make_switch()
+    switch.request(0.0, 1)
+    assert switch.update(1.0, False, 0.0) == 1
+    switch.update(1.0 + CONFIRM_TIMEOUT, False, 0.0)
+    assert switch.state == STATE_SWITCHING
+    switch.update(2.0 + CONFIRM_TIMEOUT, False, 0.0)
+    assert switch.state == STATE_IDLE
+    assert switch.phases == 3 and switch.target == 3
+    # Pozna potrditev po opustitvi šteje kot zunanji preklop
+    assert switch.confirm(100.0, 1)
+    assert switch.state == STATE_IDLE
+
+
+def test_wrong_confirmation_is_ignored_while_busy():
+    switch = make_switch()
+    switch.request(0.0, 1)
+    switch.update(1.0, False, 0.0)
+    # Stikalo javlja nespremenjeno število faz
+    assert not switch.confirm(2.0, 3)
+    assert switch.state == STATE_SWITCHING
+
+
+def test_down_delay():
+    switch = make_switch()
+    # Malo pod minimumom treh faz (v pasu histereze): počakamo DOWN_DELAY
+    excess = THREE_MIN_W - 100
+    assert switch.surplus_phases(0.0, excess, THREE_MIN_W) == 3
+    assert switch.surplus_phases(DOWN_DELAY - 1, excess, THREE_MIN_W) == 3
+    assert switch.surplus_phases(DOWN_DELAY, excess, THREE_MIN_W) == 1
+
+
+def test_large_drop_switches_down_immediately():
+    switch = make_switch()
+    assert switch.surplus_phases(0.0, THREE_MIN_W - HYSTERESIS - 1, THREE_MIN_W) == 1
+
+
+def test_up_delay_and_dwell():
+    switch = make_switch()
+    # Preklop na eno fazo v aplikaciji polnilnice
+    assert switch.confirm(0.0, 1)
+    excess = THREE_MIN_W + HYSTERESIS
+    switch.surplus_phases(0.0, excess, THREE_MIN_W)
+    # UP_DELAY je mimo, a od zadnjega preklopa še ni min_dwell
+    assert switch.surplus_phases(UP_DELAY, excess, THREE_MIN_W) == 1
+    assert switch.surplus_phases(DWELL, excess, THREE_MIN_W) == 3
+
+
+def test_interrupted_surplus_restarts_delay():
+    switch = make_switch(phases=1)
+    excess = THREE_MIN_W + HYSTERESIS
+    switch.surplus_phases(0.0, excess, THREE_MIN_W)
+    switch.surplus_phases(UP_DELAY - 10, THREE_MIN_W, THREE_MIN_W)
+    switch.surplus_phases(UP_DELAY - 5, excess, THREE_MIN_W)
+    assert switch.surplus_phases(UP_DELAY, excess, THREE_MIN_W) == 1
+    assert switch.surplus_phases(2 * UP_DELAY - 5, excess, THREE_MIN_W) == 3
+
+
+def test_request_ignored_while_busy():
+    switch = make_switch()
+    switch.request(0.0, 1)
+    switch.request(1.0, 3)
+    assert switch.target == 1
@@ -0,0 +1,51 @@
+"""PICurrentController: omejitev koraka, anti-windup in omejen razmik med koraki."""
+import pytest
+
+from evsci.pi import MAX_DT, PICurrentController
+
+
+def test_step_is_clamped_to_max_step():
+    pi = PICurrentController(0.6, 0.05, 8)
+    # 0.6 * 20 A = 12 A > 8 A na cikel
+    assert pi.step(0.0, 26, 6) == 14
+
+
+def test_output_never_exceeds_setpoint():
+    pi = PICurrentController(1.0, 0.05, 8)
+    assert pi.step(0.0, 11, 10) == 11
+
+
+def test_saturation_does_not_wind_up_integral():
+    pi = PICurrentController(0.6, 0.05, 4)
+    for i in range(10):
+        pi.step(i * 30.0, 32, 6)
+    assert pi.integral == 0.0
+    # Po nasičenju integral začne iz nič
+    assert pi.step(275.0, 20, 19) == 19
+    assert pi.integral == pytest.approx(0.05 * 5)
+
+
+def test_integral_closes_last_amps():
+    pi = PICurrentController(0.6, 0.05, 8)
+    # Proporcionalni del sam ostane pod celim ampero
+    assert pi.step(0.0, 11, 10) == 10
+    assert pi.step(10.0, 11, 10) == 11
+
+
+def test_large_dt_is_capped():
+    pi = PICurrentController(0.0, 0.01, 8)
+    pi.step(0.0, 11, 10)
+    # Po dolgi pavzi integral zraste le za MAX_DT
+    assert pi.step(1000.0, 11, 10) == 10
+    assert pi.integral == pytest.approx(0.01 * MAX_DT)
+
+
+def test_reset_clears_integral_and_time():
+    pi = PICurrentController(0.0, 0.01, 8)
+    pi.step(0.0, 11, 10)
+    pi.step(20.0, 11, 10)
+    pi.reset()
+    assert pi.integral == 0.0
+    # Prvi korak po resetu nima razmika
+    pi.step(100.0, 11, 10)
+    assert pi.integral == 0.0
@@ -0,0 +1,91 @@
+"""Načrt polnjenja: časovni bloki s prazniki, neizvedljiv načrt in preračun ob zaostanku."""
+import datetime
+
+import pytest
+
+from evsci.planner import SLOT_SECONDS, DeparturePlanner, is_workday, plan_charge, tariff_block_at
+
+PPA = 690
+HOUR = 3600
+
+
+@pytest.mark.parametrize(
+    "moment, block",
+    [
+        # Velikonočni ponedeljek 2025 je dela prost, torek ne
+        (datetime.datetime(2025, 4, 21, 8), 3),
+        (datetime.datetime(2025, 4, 22, 8), 2),
+        # Prehod v višjo sezono (november) in nazaj (marec)
+        (datetime.datetime(2025, 10, 30, 8), 2),
+        (datetime.datetime(2025, 11, 3, 8), 1),
+        (datetime.datetime(2025, 2, 28, 8), 1),
+        (datetime.datetime(2025, 3, 3, 8), 2),
+        # Noč v višji sezoni in noč ob vikendu v nižji
+        (datetime.datetime(2025, 11, 3, 23), 3),
+        (datetime.datetime(2025, 6, 7, 23), 5),
+        # Fiksni praznik
+        (datetime.datetime(2025, 12, 25, 8), 2),
+    ],
+)
+def test_tariff_block_at(moment, block):
+    assert tariff_block_at(moment) == block
+
+
+def test_easter_monday():
+    assert not is_workday(datetime.date(2024, 4, 1))
+    assert not is_workday(datetime.date(2026, 4, 6))
+    assert is_workday(datetime.date(2026, 4, 7))
+
+
+def _block_at(ts):
+    # Prva ura je v dražjem bloku 1, nato blok 3
+    return 1 if ts < HOUR else 3
+
+
+def test_plan_prefers_cheaper_block():
+    plan = plan_charge(0.0, 3 * HOUR, 5000.0, PPA, _block_at, {1: 16, 3: 16})
+    assert plan.feasible
+    assert plan.amps_at(0.0) == 0
+    assert plan.next_start(0.0) == HOUR
+    assert plan.planned_wh >= 5000.0
+
+
+def test_infeasible_plan_uses_every_slot_at_cap():
+    plan = plan_charge(0.0, HOUR, 50000.0, PPA, _block_at, {1: 16, 3: 16})
+    assert not plan.feasible
+    assert list(plan.amps) == [16] * (HOUR // SLOT_SECONDS)
+    assert plan.planned_wh == pytest.approx(16 * PPA)
+
+
+def test_block_below_minimum_is_skipped():
+    plan = plan_charge(0.0, 2 * HOUR, 3000.0, PPA, _block_at, {1: 16, 3: 4})
+    # Blok 3 ne dopušča minimalnega toka - polnimo v dražjem bloku
+    assert all(amps == 0 for amps in plan.amps[HOUR // SLOT_SECONDS:])
+    assert plan.amps_at(0.0) > 0
+
+
+def test_replan_when_charging_falls_behind():
+    planner = DeparturePlanner()
+    planner.replan(0.0, 0.0, "sig", 4 * HOUR, 20000.0, PPA, lambda ts: 1, {1: 16})
+    assert not planner.needs_replan(HOUR, 11000.0, "sig")
+    # Po eni uri brez energije zaostanek preseže prag
+    assert planner.needs_replan(HOUR, 0.0, "sig")
+    # Nov načrt šteje energijo od trenutka preračuna
+    plan = planner.replan(HOUR, 500.0, "sig", 4 * HOUR, 20000.0, PPA, lambda ts: 1, {1: 16})
+    assert plan.start == HOUR
+    assert not planner.needs_replan(HOUR + 60, 500.0, "sig")
+
+
+def test_replan_on_new_inputs_and_departure():
+    planner = DeparturePlanner()
+    assert planner.needs_replan(0.0, 0.0, "sig")
+    planner.replan(0.0, 0.0, "sig", 2 * HOUR, 1000.0, PPA, lambda ts: 1, {1: 16})
+    assert planner.needs_replan(60.0, 0.0, "other")
+    assert planner.needs_replan(2 * HOUR, 1000.0, "sig")
+
+
+def test_infeasible_plan_retried_each_slot():
+    planner = DeparturePlanner()
+    planner.replan(0.0, 0.0, "sig", HOUR, 50000.0, PPA, lambda ts: 1, {1: 16})
+    assert not planner.needs_replan(SLOT_SECONDS - 1, 2700.0, "sig")
+    assert planner.needs_replan(SLOT_SECONDS, 3000.0, "sig")
@@ -0,0 +1,74 @@
+"""PVSurplusController: okno mediane, histereza in minimalni časi vklopa/izklopa."""
+from evsci.const import PV_SMOOTHING_MEDIAN
+from evsci.pv import MIN_SAMPLE_SPACING, PVSurplusController, buffer_size
+
+PPA = 690
+MIN_AMPS = 6
+MIN_W = MIN_AMPS * PPA
+
+
+def make_pv(window=30, method=PV_SMOOTHING_MEDIAN):
+    return PVSurplusController(method, window, 300, 300, 180)
+
+
+def test_median_covers_full_window_with_fast_samples():
+    pv = make_pv(window=300)
+    # 200 s visokega presežka, nato 100 s nizkega - vzorci vsako sekundo
+    for t in range(200):
+        pv.update(float(t), 5000.0)
+    for t in range(200, 300):
+        smoothed = pv.update(float(t), 1000.0)
+    # Visoki vzorci so v večini le, če okno ni odrezano na zadnjih nekaj vzorcev
+    assert smoothed == 5000.0
+
+
+def test_buffer_follows_window():
+    pv = make_pv(window=30)
+    assert len(pv._times) == buffer_size(30)
+    for t in range(0, 60, 5):
+        pv.update(float(t), float(t))
+    pv.configure(PV_SMOOTHING_MEDIAN, 300, 300, 300, 180)
+    assert len(pv._times) == buffer_size(300)
+    # Najnovejši vzorci ostanejo po vrsti
+    assert pv.update(60.0, 60.0) == 42.5
+
+
+def test_short_window_uses_latest_sample():
+    pv = make_pv(window=0)
+    pv.update(0.0, 1000.0)
+    assert pv.update(MIN_SAMPLE_SPACING / 2, 2000.0) == 2000.0
+
+
+def test_pv_only_start_waits_for_min_off():
+    pv = make_pv()
+    pv.reset(False, now_time=0.0)
+    assert pv.pv_only_amps(100.0, 5000.0, PPA, MIN_AMPS) == 0
+    assert pv.pv_only_amps(180.0, 5000.0, PPA, MIN_AMPS) == 7
+    assert pv.active
+
+
+def test_pv_only_hysteresis_band_keeps_minimum():
+    pv = make_pv()
+    pv.reset(True, now_time=0.0)
+    # Pod minimumom, a znotraj histereze: ostanemo na minimumu
+    assert pv.pv_only_amps(1000.0, MIN_W - 200, PPA, MIN_AMPS) == MIN_AMPS
+    assert pv.active
+
+
+def test_pv_only_stop_waits_for_min_on():
+    pv = make_pv()
+    pv.reset(False, now_time=-1000.0)
+    assert pv.pv_only_amps(0.0, MIN_W, PPA, MIN_AMPS) == MIN_AMPS
+    # Premalo presežka, a seja teče šele 200 s
+    assert pv.pv_only_amps(200.0, 1000.0, PPA, MIN_AMPS) == MIN_AMPS
+    assert pv.pv_only_amps(300.0, 1000.0, PPA, MIN_AMPS) == 0
+    assert not pv.active
+    # Ponoven vklop šele po min_off
+    assert pv.pv_only_amps(400.0, 5000.0, PPA, MIN_AMPS) == 0
+    assert pv.pv_only_amps(480.0, 5000.0, PPA, MIN_AMPS) == 7
+
+
+def test_pv_only_start_threshold_per_phase():
+    pv = make_pv()
+    # S preklopom faz odloča presežek za eno fazo, tok pa se računa za tri
+    assert pv.pv_only_amps(0.0, 1500.0, PPA, MIN_AMPS, start_power_per_amp=PPA / 3) == MIN_AMPS
@@ -0,0 +1,104 @@
+"""ChargerResponseModel: učenje iz sintetičnih sledi ukaz -> moč polnilnice in števca."""
+import pytest
+
+from evsci.response import (
+    LEARN_RATE,
+    MAX_ADAPTIVE_INTERVAL,
+    MIN_ADAPTIVE_INTERVAL,
+    MIN_OBSERVATIONS,
+    ChargerResponseModel,
+)
+
+PPA = 690
+HOUSE = 800.0
+
+
+def run_trace(model, t0, from_amps, to_amps, delay, ramp, lag, duration=150.0):
+    """Ukaz ob t0; polnilnica po zamiku linearno naraste, števec jo vidi z zamikom lag."""
+    from_w = from_amps * PPA
+    delta = (to_amps - from_amps) * PPA
+
+    def charger(t):
+        return from_w + delta * min(1.0, max(0.0, (t - t0 - delay) / ramp))
+
+    model.observe(t0 - 1.0, from_w, HOUSE + from_w)
+    model.command(t0, to_amps, PPA, 6)
+    t = t0
+    while t < t0 + duration:
+        t += 0.25
+        model.observe(t, charger(t), HOUSE + charger(t - lag))
+
+
+def test_learns_delay_ramp_and_meter_lag():
+    model = ChargerResponseModel()
+    run_trace(model, 0.0, 8, 16, delay=4.0, ramp=10.0, lag=3.0)
+    assert model.observations == 1
+    assert model.delay == pytest.approx(4.0, abs=0.5)
+    assert model.ramp == pytest.approx(10.0, abs=0.5)
+    assert model.meter_lag == pytest.approx(3.0, abs=0.5)
+
+
+def test_new_observations_are_averaged():
+    model = ChargerResponseModel()
+    run_trace(model, 0.0, 8, 16, delay=4.0, ramp=10.0, lag=3.0)
+    first = (model.delay, model.ramp, model.meter_lag)
+    run_trace(model, 200.0, 16, 8, delay=8.0, ramp=20.0, lag=1.0)
+    assert model.observations == 2
+    for learned, old, new in zip((model.delay, model.ramp, model.meter_lag), first, (8.0, 20.0, 1.0)):
+        assert learned == pytest.approx(old + LEARN_RATE * (new - old), abs=0.5)
+
+
+def test_small_steps_and_startup_are_not_learned():
+    model = ChargerResponseModel()
+    run_trace(model, 0.0, 10, 11, delay=4.0, ramp=10.0, lag=3.0)
+    run_trace(model, 200.0, 0, 16, delay=4.0, ramp=10.0, lag=3.0)
+    assert model.observations == 0
+
+
+def _learned_model(delay, ramp, lag):
+    model = ChargerResponseModel()
+    for i in range(MIN_OBSERVATIONS):
+        run_trace(model, i * 300.0, 8 + 8 * (i % 2), 16 - 8 * (i % 2), delay, ramp, lag)
+    assert model.learned
+    return model
+
+
+def test_metered_charger_power_follows_model():
+    model = _learned_model(4.0, 10.0, 3.0)
+    t0 = 1000.0
+    model.observe(t0 - 1.0, 8 * PPA, HOUSE + 8 * PPA)
+    model.command(t0, 16, PPA, 6)
+    # Senzor polnilnice že kaže novo moč, števec je še ne vidi
+    assert model.metered_charger_power(t0 + 2.0, 16 * PPA) == pytest.approx(8 * PPA)
+    # Sredi naraščanja polovica spremembe
+    assert model.metered_charger_power(t0 + 12.0, 16 * PPA) == pytest.approx(12 * PPA, rel=0.1)
+    # Po ustalitvi velja izmerjena moč
+    assert model.metered_charger_power(t0 + 30.0, 15 * PPA) == 15 * PPA
+
+
+def test_metered_charger_power_before_learning():
+    model = ChargerResponseModel()
+    model.observe(0.0, 8 * PPA, HOUSE + 8 * PPA)
+    model.command(1.0, 16, PPA, 6)
+    assert model.metered_charger_power(2.0, 16 * PPA) == 16 * PPA
+
+
+@pytest.mark.parametrize(
+    "delay, ramp, lag, interval",
+    [
+        # Hiter odziv: spodnja meja
+        (0.5, 2.0, 0.5, MIN_ADAPTIVE_INTERVAL),
+        # Vmesni: ustalitev + rezerva
+        (4.0, 10.0, 3.0, 22.0),
+        # Počasen odziv: zgornja meja
+        (30.0, 80.0, 20.0, MAX_ADAPTIVE_INTERVAL),
+    ],
+)
+def test_control_interval_is_clamped(delay, ramp, lag, interval):
+    model = _learned_model(delay, ramp, lag)
+    assert model.control_interval(30) == pytest.approx(interval, abs=1.0)
+
+
+def test_control_interval_default_until_learned():
+    model = ChargerResponseModel()
+    assert model.control_interval(30) == 30
@@ -0,0 +1,106 @@
+"""SessionHistory: 51-bajtni zapisi, odrezan rep datoteke, vrstni red in agregati."""
+import pytest
+
+from evsci.sessions import (
+    HEADER,
+    RECORD,
+    SessionHistory,
+    SessionTracker,
+    append_history,
+    read_history,
+)
+
+HOUR = 3600.0
+
+
+def make_record(start, hours=2.0, solar=3_000_000, grid=7_000_000, peak=16, soc=(20, 80)):
+    # Energija v mWh: vsa omrežna energija v bloku 3
+    return (start, start + hours * HOUR, solar, grid, 0, 0, solar + grid, 0, 0, 12_500, peak, *soc)
+
+
+def test_record_is_51_bytes():
+    assert RECORD.size == 51
+
+
+def test_file_round_trip(tmp_path):
+    path = tmp_path / "sessions.bin"
+    records = [make_record(1000.0), make_record(10 * HOUR, soc=(-1, -1)), make_record(20 * HOUR, peak=32)]
+    for record in records:
+        append_history(path, record)
+    assert path.stat().st_size == HEADER.size + 3 * RECORD.size
+
+    history = read_history(path)
+    assert history.records() == records
+    assert history.session(1)["soc_start"] is None
+    assert history.session(2)["peak_amps"] == 32
+
+
+def test_truncated_tail_is_cut(tmp_path):
+    path = tmp_path / "sessions.bin"
+    append_history(path, make_record(1000.0))
+    append_history(path, make_record(10 * HOUR))
+    # Prekinjeno pisanje: del tretjega zapisa
+    with open(path, "ab") as file:
+        file.write(RECORD.pack(*make_record(20 * HOUR))[:20])
+
+    history = read_history(path)
+    assert len(history) == 2
+    assert path.stat().st_size == HEADER.size + 2 * RECORD.size
+    # Naslednji zapis se nadaljuje na meji zapisa
+    append_history(path, make_record(30 * HOUR))
+    assert len(read_history(path)) == 3
+
+
+def test_unknown_file_is_rejected():
+    with pytest.raises(ValueError):
+        SessionHistory().load(HEADER.pack(b"XXXX", 1))
+
+
+def test_out_of_order_append_rebuilds():
+    history = SessionHistory()
+    history.append(make_record(10 * HOUR, grid=1_000_000))
+    history.append(make_record(30 * HOUR, grid=2_000_000))
+    # Premik ure nazaj
+    history.append(make_record(20 * HOUR, grid=4_000_000))
+    assert list(history.starts) == [10 * HOUR, 20 * HOUR, 30 * HOUR]
+    assert [record[3] for record in history.records()] == [1_000_000, 4_000_000, 2_000_000]
+    assert history.aggregate(15 * HOUR, 25 * HOUR)["energy_grid"] == 4.0
+
+
+def test_aggregate():
+    history = SessionHistory()
+    history.append(make_record(0.0, peak=10))
+    history.append(make_record(24 * HOUR, peak=16))
+    history.append(make_record(48 * HOUR, solar=0, peak=32))
+
+    total = history.aggregate()
+    assert total["sessions"] == 3
+    assert total["energy_total"] == 27.0
+    assert total["energy_solar"] == 6.0
+    assert total["solar_share"] == pytest.approx(22.2)
+    assert total["energy_by_block"]["3"] == 27.0
+    assert total["cost"] == 3.75
+    assert total["hours"] == 6.0
+    assert total["peak_amps"] == 32
+
+    # Okno [start, end) - seja ob 48 h ni vključena
+    window = history.aggregate(HOUR, 48 * HOUR)
+    assert window["sessions"] == 1
+    assert window["peak_amps"] == 16
+
+    empty = history.aggregate(100 * HOUR)
+    assert empty["sessions"] == 0
+    assert empty["solar_share"] is None
+    assert empty["peak_amps"] == 0
+
+
+def test_tracker_builds_record():
+    tracker = SessionTracker()
+    tracker.begin(0.0)
+    tracker.add(2, 7360.0, 7360.0, HOUR, 0.2, 32, 40)
+    tracker.add(3, 0.0, 0.0, HOUR, 0.2, 16, 50)
+    record = tracker.finish(2 * HOUR, 0, 7_360_000)
+    assert record[4:9] == (0, 7_360_000, 0, 0, 0)
+    assert record[9] == round(7.36 * 0.2 * 10000)
+    assert record[10:] == (32, 40, 50)
+    assert not tracker.active
@@ -0,0 +1,17 @@
+"""Regresijski scenariji varnostnega preizkusa (tools/stress.py, seed 0): zamrznjen senzor omrežja med sunkom porabe."""
+import pytest
+
+import stress
+
+# Prej 19-35 s nad varovalko: pavza po molku nekaj običajnih razmikov števca
+# in povečevanje šele po potrjenem odzivu prejšnjega ukaza
+SCENARIOS = (2, 3, 20, 22, 32, 61, 64, 65, 99, 105, 122)
+
+
+def _longest_overload(index):
+    return stress.run_scenario(stress.random_scenario(index, 0, 3.0)).max_seconds_over_fuse
+
+
+@pytest.mark.parametrize("index", SCENARIOS)
+def test_freeze_overload_within_budget(index):
+    assert _longest_overload(index) <= 10.0
@@ -0,0 +1,82 @@
+"""Telemetrija: kosi .npz, ki jih prebere numpy.load, rotacija in omejen pomnilnik."""
+import math
+import os
+
+import pytest
+
+from evsci.const import MODE_DYNAMIC, MODE_PV_ONLY
+from evsci.control import BRANCH_HOLD, BRANCH_RAMP_UP, LIMIT_BLOCK, Decision
+from evsci.telemetry import COLUMNS, LABELS, TelemetryRecorder, list_chunks, read_chunk, rotate, write_chunk
+
+ROWS = [
+    # čas, način, blok, omrežje, polnilnica, tok, odločitev, ukaz toka, stikalo, zastarelo
+    (1000.0, MODE_DYNAMIC, 2, 5000.0, 4140.0, 6.0, Decision(8, True, 10, branch=BRANCH_RAMP_UP, limited_by=LIMIT_BLOCK), 8, None, False),
+    (1005.0, MODE_DYNAMIC, 2, 6000.0, 5520.0, 8.0, Decision(8, True, 10), None, None, False),
+    (1010.0, MODE_PV_ONLY, 3, 100.0, 0.0, 0.0, Decision(0, False, 0, branch=BRANCH_HOLD), 0, False, True),
+]
+
+
+def _record_chunk(start=0.0):
+    recorder = TelemetryRecorder(capacity=len(ROWS))
+    chunk = None
+    for row in ROWS:
+        chunk = recorder.record(row[0] + start, *row[1:])
+    assert chunk is not None and chunk.rows == len(ROWS)
+    return recorder, chunk
+
+
+def test_chunk_loads_with_numpy(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    _, chunk = _record_chunk()
+    path = write_chunk(str(tmp_path), chunk, 10_000_000)
+
+    with numpy.load(path) as data:
+        assert set(data.files) == {column for column, _, _ in COLUMNS} | {f"{name}_labels" for name in LABELS}
+        for column, _, descr in COLUMNS:
+            assert data[column].dtype == numpy.dtype(descr)
+            assert data[column].shape == (len(ROWS),)
+        assert list(data["time"]) == [1000.0, 1005.0, 1010.0]
+        assert list(data["grid"]) == [5000.0, 6000.0, 100.0]
+        assert data["amps_command"][0] == 8 and math.isnan(data["amps_command"][1])
+        assert list(data["switch_command"]) == [-1, -1, 0]
+        assert list(data["stale"]) == [0, 0, 1]
+        modes = data["mode_labels"][data["mode"]]
+        assert list(modes) == [MODE_DYNAMIC, MODE_DYNAMIC, MODE_PV_ONLY]
+        assert data["branch_labels"][data["branch"][0]] == BRANCH_RAMP_UP
+        assert data["limited_by_labels"][data["limited_by"][0]] == LIMIT_BLOCK
+        assert data["limited_by_labels"][data["limited_by"][1]] == ""
+
+    # Branje brez numpy da iste vrednosti
+    columns = read_chunk(path)
+    assert list(columns["time"]) == [1000.0, 1005.0, 1010.0]
+    assert columns["mode_labels"] == LABELS["mode"]
+
+
+def test_rotation_keeps_newest_chunks(tmp_path):
+    directory = str(tmp_path)
+    paths = []
+    for hour in range(4):
+        recorder, chunk = _record_chunk(hour * 3600.0)
+        paths.append(write_chunk(directory, chunk, 10_000_000))
+        recorder.release(chunk)
+    assert list_chunks(directory) == paths
+
+    size = os.path.getsize(paths[-1])
+    rotate(directory, 2 * size + 10)
+    assert list_chunks(directory) == paths[2:]
+    # Zadnji kos ostane tudi pod omejitvijo
+    rotate(directory, 0)
+    assert list_chunks(directory) == paths[3:]
+
+
+def test_rows_dropped_when_writer_lags():
+    recorder = TelemetryRecorder(capacity=1, buffers=2)
+    first = recorder.record(*ROWS[0])
+    second = recorder.record(*ROWS[1])
+    assert first is not None and second is not None
+    # Oba medpomnilnika čakata na zapis
+    assert recorder.record(*ROWS[2]) is None
+    assert recorder.dropped == 1
+    recorder.release(first)
+    assert recorder.record(*ROWS[2]) is not None
+    assert recorder.written == 1
@@ -0,0 +1,21 @@
+"""Uvoz čistih modulov integracije brez Home Assistanta.
+
+custom_components/__init__.py uvaža homeassistant, zato paket registriramo pod
+imenom "evsci" brez izvajanja __init__.py. Moduli control, allocator in
+simulation nimajo odvisnosti od Home Assistanta.
+"""
+import sys
+import types
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components"
+
+
+def load():
+    """Registrira paket "evsci" in ga vrne."""
+    package = sys.modules.get("evsci")
+    if package is None:
+        package = types.ModuleType("evsci")
+        package.__path__ = [str(PACKAGE_DIR)]
+        sys.modules["evsci"] = package
+    return package
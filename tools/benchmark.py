@@ -0,0 +1,181 @@
+"""Benchmark regulacijske zanke EVSCI.
+
+Za vsak sintetični profil (PV dan, toplotna črpalka zvečer, sunki preobremenitve)
+in vsak način polnjenja izmeri:
+  - čas cikla (percentili, us) in čas ControlLaw.step,
+  - alocirane bajte na cikel (tracemalloc, ločen prehod),
+  - klice storitev, posodobitve koordinatorja in zapise stanj na uro.
+
+Primer:
+    python tools/benchmark.py --hours 24 --json bench.json
+    python tools/benchmark.py --baseline bench.json   # izhodna koda 1 ob regresiji
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import _evsci
+
+_evsci.load()
+
+from evsci.const import MODES  # noqa: E402
+from evsci.simulation import PROFILES, Simulator, synthetic_trace  # noqa: E402
+
+# Metrike, pri katerih je večja vrednost slabša (za primerjavo z izhodiščem)
+REGRESSION_METRICS = (
+    "tick_us_p95",
+    "alloc_bytes_per_tick",
+    "service_calls_per_hour",
+    "state_writes_per_hour",
+)
+
+
+MIN_ABSOLUTE_CHANGE = 5.0
+
+
+class TimedSimulator(Simulator):
+    """Simulator, ki meri čas (ali alokacije) vsakega cikla."""
+
+    def __init__(self, *args, trace_allocations=False, **kwargs):
+        super().__init__(*args, model_entities=True, **kwargs)
+        self.trace_allocations = trace_allocations
+        self.tick_ns = []
+        self.step_ns = []
+        self.alloc_bytes = []
+
+        step = self.law.step
+        step_ns = self.step_ns
+
+        def timed_step(*step_args, **step_kwargs):
+            started = time.perf_counter_ns()
+            decision = step(*step_args, **step_kwargs)
+            step_ns.append(time.perf_counter_ns() - started)
+            return decision
+
+        if not trace_allocations:
+            self.law.step = timed_step
+
+    def _tick(self, *args):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            super()._tick(*args)
+            self.alloc_bytes.append(tracemalloc.get_traced_memory()[1] - before)
+        else:
+            started = time.perf_counter_ns()
+            super()._tick(*args)
+            self.tick_ns.append(time.perf_counter_ns() - started)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(profile, mode, hours, seed):
+    trace = synthetic_trace(profile, hours=hours, seed=seed)
+
+    timed = TimedSimulator({}, trace, mode=mode)
+    result = timed.run()
+
+    tracemalloc.start()
+    try:
+        allocating = TimedSimulator({}, trace, mode=mode, trace_allocations=True)
+        allocating.run()
+    finally:
+        tracemalloc.stop()
+
+    duration_h = result.duration / 3600.0
+    tick_us = [ns / 1000.0 for ns in timed.tick_ns]
+    step_us = [ns / 1000.0 for ns in timed.step_ns]
+    alloc = allocating.alloc_bytes
+    return {
+        "profile": profile,
+        "mode": mode,
+        "ticks": len(tick_us),
+        "tick_us_p50": round(percentile(tick_us, 50), 2),
+        "tick_us_p95": round(percentile(tick_us, 95), 2),
+        "tick_us_p99": round(percentile(tick_us, 99), 2),
+        "tick_us_max": round(max(tick_us, default=0.0), 2),
+        "step_us_p50": round(percentile(step_us, 50), 2),
+        "step_us_p95": round(percentile(step_us, 95), 2),
+        "alloc_bytes_per_tick": round(sum(alloc) / len(alloc), 1) if alloc else 0.0,
+        "service_calls_per_hour": round(sum(result.service_calls.values()) / duration_h, 1),
+        "coordinator_updates_per_hour": round(result.coordinator_updates / duration_h, 1),
+        "entity_writes_per_hour": round(result.entity_writes / duration_h, 1),
+        "state_writes_per_hour": round(result.state_writes / duration_h, 1),
+        "switch_cycles": result.switch_cycles,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Vrne seznam regresij glede na izhodišče."""
+    previous = {(r["profile"], r["mode"]): r for r in baseline}
+    regressions = []
+    for row in results:
+        base = previous.get((row["profile"], row["mode"]))
+        if base is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            old = base.get(metric, 0.0)
+            new = row[metric]
+            # Majhne absolutne razlike (šum merjenja) ne štejejo
+            if new > old * (1.0 + tolerance) and new - old > MIN_ABSOLUTE_CHANGE:
+                regressions.append(f"{row['profile']}/{row['mode']}: {metric} {old} -> {new}")
+    return regressions
+
+
+def print_table(results):
+    columns = (
+        ("profile", 17),
+        ("mode", 11),
+        ("tick_us_p50", 12),
+        ("tick_us_p95", 12),
+        ("tick_us_p99", 12),
+        ("alloc_bytes_per_tick", 21),
+        ("service_calls_per_hour", 23),
+        ("state_writes_per_hour", 22),
+    )
+    print("".join(name.ljust(width) for name, width in columns))
+    for row in results:
+        print("".join(str(row[name]).ljust(width) for name, width in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24.0, help="dolžina vsakega profila")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--json", help="shrani rezultate v JSON")
+    parser.add_argument("--baseline", help="primerjaj z rezultati prejšnjega zagona")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="dovoljeno poslabšanje (0.3 = 30 %%)")
+    args = parser.parse_args(argv)
+
+    results = [
+        run_case(profile, mode, args.hours, args.seed)
+        for profile in args.profiles
+        for mode in args.modes
+    ]
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"REGRESIJA: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Simulirana polnilnica OCPP 1.6J za preizkus lokalnega centralnega sistema EVSCI.
+
+Poveže se na ws://<host>:<port>/<id>, se prijavi (BootNotification), sprejema
+SetChargingProfile, RemoteStartTransaction in RemoteStopTransaction ter
+pošilja MeterValues z močjo, ki ustreza nastavljenemu toku.
+
+Primer (EVSCI z vrati OCPP 9000 v Home Assistantu):
+    python tools/ocpp_charge_point.py ws://homeassistant.local:9000/EVSCI-SIM
+
+Samostojen preizkus (centralni sistem EVSCI in polnilnica v istem procesu):
+    python tools/ocpp_charge_point.py --self-test
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import socket
+import sys
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+
+import _evsci
+
+_evsci.load()
+
+from evsci.ocpp import CALL, CALLERROR, CALLRESULT, SUBPROTOCOL, OcppCentralSystem  # noqa: E402
+
+CHARGE_POINT_ID = "EVSCI-SIM"
+MIN_AMPS = 6
+
+
+class SimulatedChargePoint:
+    """Polnilnica z enim konektorjem in priklopljenim vozilom."""
+
+    def __init__(self, url, phases=3, voltage=230.0, meter_interval=5.0, response_delay=0.0):
+        self.url = url
+        self.phases = phases
+        self.voltage = voltage
+        self.meter_interval = meter_interval
+        self.response_delay = response_delay
+        self.limit = 16.0
+        self.transaction_id = None
+        self.energy_wh = 0.0
+        self.status = None
+        self.commands = []
+        self._ws = None
+        self._pending = {}
+        self._message_ids = itertools.count(1)
+        self._last_meter = time.monotonic()
+
+    @property
+    def power(self):
+        if self.transaction_id is None or self.limit < MIN_AMPS:
+            return 0.0
+        return self.limit * self.voltage * self.phases
+
+    async def run(self, boot=True):
+        """Povezava s centralnim sistemom; boot=False je ponovna povezava brez zagona (tekoča transakcija ostane)."""
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.url, protocols=(SUBPROTOCOL,)) as ws:
+                self._ws = ws
+                reader = asyncio.create_task(self._read())
+                try:
+                    if boot:
+                        await self.call("BootNotification", {"chargePointVendor": "EVSCI", "chargePointModel": "Simulator"})
+                        await self._set_status("Preparing")
+                    else:
+                        await self.call("Heartbeat", {})
+                    while not reader.done():
+                        await asyncio.sleep(self.meter_interval)
+                        await self._send_meter_values()
+                finally:
+                    reader.cancel()
+
+    async def call(self, action, payload):
+        message_id = str(next(self._message_ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        await self._ws.send_str(json.dumps([CALL, message_id, action, payload]))
+        try:
+            return await asyncio.wait_for(future, 10.0)
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def _read(self):
+        async for message in self._ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            data = json.loads(message.data)
+            if data[0] == CALL:
+                _, message_id, action, payload = data
+                self.commands.append((time.monotonic(), action, payload))
+                if self.response_delay:
+                    await asyncio.sleep(self.response_delay)
+                response, follow_up = self._handle(action, payload)
+                await self._ws.send_str(json.dumps([CALLRESULT, message_id, response]))
+                if follow_up is not None:
+                    asyncio.create_task(follow_up)
+            elif data[0] in (CALLRESULT, CALLERROR):
+                future = self._pending.get(data[1])
+                if future is not None and not future.done():
+                    future.set_result(data[2] if data[0] == CALLRESULT else {"error": data[2]})
+
+    def _handle(self, action, payload):
+        """Odgovor na klic centralnega sistema in morebitno nadaljevanje (korutina)."""
+        if action == "ChangeConfiguration":
+            if payload.get("key") == "MeterValueSampleInterval":
+                self.meter_interval = min(self.meter_interval, float(payload["value"]))
+            return {"status": "Accepted"}, None
+        if action == "SetChargingProfile":
+            periods = payload["csChargingProfiles"]["chargingSchedule"]["chargingSchedulePeriod"]
+            self.limit = float(periods[0]["limit"])
+            return {"status": "Accepted"}, self._send_meter_values()
+        if action == "RemoteStartTransaction":
+            if self.transaction_id is not None:
+                return {"status": "Rejected"}, None
+            return {"status": "Accepted"}, self._start_transaction(payload.get("idTag", "remote"))
+        if action == "TriggerMessage":
+            requested = payload.get("requestedMessage")
+            if requested == "StatusNotification" and self.status is not None:
+                return {"status": "Accepted"}, self._set_status(self.status)
+            if requested == "MeterValues":
+                return {"status": "Accepted"}, self._send_meter_values()
+            return {"status": "Rejected"}, None
+        if action == "RemoteStopTransaction":
+            if payload.get("transactionId") != self.transaction_id:
+                return {"status": "Rejected"}, None
+            return {"status": "Accepted"}, self._stop_transaction()
+        return {"status": "NotSupported"}, None
+
+    async def _start_transaction(self, id_tag):
+        response = await self.call(
+            "StartTransaction",
+            {"connectorId": 1, "idTag": id_tag, "meterStart": round(self.energy_wh), "timestamp": _now_iso()},
+        )
+        self.transaction_id = response["transactionId"]
+        await self._set_status("Charging")
+        await self._send_meter_values()
+
+    async def _stop_transaction(self):
+        transaction_id, self.transaction_id = self.transaction_id, None
+        await self.call(
+            "StopTransaction",
+            {"transactionId": transaction_id, "meterStop": round(self.energy_wh), "timestamp": _now_iso()},
+        )
+        await self._set_status("Finishing")
+        await self._send_meter_values()
+
+    async def _set_status(self, status):
+        self.status = status
+        await self.call("StatusNotification", {"connectorId": 1, "status": status, "errorCode": "NoError"})
+
+    async def _send_meter_values(self):
+        now = time.monotonic()
+        self.energy_wh += self.power * (now - self._last_meter) / 3600.0
+        self._last_meter = now
+        sampled = [
+            {"measurand": "Power.Active.Import", "unit": "W", "value": f"{self.power:.0f}"},
+            {"measurand": "Current.Offered", "unit": "A", "value": f"{self.limit:.1f}"},
+            {"measurand": "Energy.Active.Import.Register", "unit": "Wh", "value": f"{self.energy_wh:.0f}"},
+        ]
+        current = self.power / self.voltage / self.phases
+        for phase in ("L1", "L2", "L3")[: self.phases]:
+            sampled.append({"measurand": "Current.Import", "phase": phase, "unit": "A", "value": f"{current:.1f}"})
+        payload = {"connectorId": 1, "meterValue": [{"timestamp": _now_iso(), "sampledValue": sampled}]}
+        if self.transaction_id is not None:
+            payload["transactionId"] = self.transaction_id
+        await self.call("MeterValues", payload)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+async def self_test(phases):
+    """Centralni sistem EVSCI in simulirana polnilnica: prijava, tok, start, meritve, stop."""
+    port = _free_port()
+    central = OcppCentralSystem(port, CHARGE_POINT_ID, host="127.0.0.1")
+    updates = []
+    central.on_update = updates.append
+    await central.async_start()
+    charge_point = SimulatedChargePoint(f"ws://127.0.0.1:{port}/{CHARGE_POINT_ID}", phases=phases, meter_interval=1.0)
+    task = asyncio.create_task(charge_point.run())
+    report = {}
+    try:
+        await _wait_for(lambda: central.charge_point is not None and central.charge_point.status == "Preparing")
+        report["connected_status"] = central.charge_point.status
+
+        started = time.perf_counter()
+        await central.async_set_current(10)
+        report["set_current_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+
+        started = time.perf_counter()
+        await central.async_set_charging(True)
+        await _wait_for(lambda: central.charge_point.charging and (central.charge_point.power or 0) > 0)
+        report["start_to_power_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        report["power_at_10a"] = central.charge_point.power
+        report["currents"] = central.charge_point.currents
+
+        started = time.perf_counter()
+        await central.async_set_current(13)
+        await _wait_for(lambda: central.charge_point.amps == 13)
+        report["step_to_meter_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+        report["power_at_13a"] = central.charge_point.power
+
+        # Tuj id in druga povezava z istim id se zavrneta, dokler je polnilnica živa
+        async with aiohttp.ClientSession() as session:
+            for charge_point_id in ("INTRUDER", CHARGE_POINT_ID):
+                try:
+                    async with session.ws_connect(f"ws://127.0.0.1:{port}/{charge_point_id}", protocols=(SUBPROTOCOL,)):
+                        report[f"rejected_{charge_point_id}"] = False
+                except aiohttp.WSServerHandshakeError as err:
+                    report[f"rejected_{charge_point_id}"] = err.status
+        report["still_connected"] = central.charge_point is not None and central.charge_point.id == CHARGE_POINT_ID
+
+        await central.async_set_charging(False)
+        await _wait_for(lambda: not central.charge_point.charging and central.charge_point.status == "Finishing")
+        report["status_after_stop"] = central.charge_point.status
+        report["power_after_stop"] = central.charge_point.power
+        report["updates"] = len(updates)
+        report["ok"] = (
+            report["power_at_10a"] == 10 * 230.0 * phases
+            and report["power_at_13a"] == 13 * 230.0 * phases
+            and report["power_after_stop"] == 0
+            and report["rejected_INTRUDER"] == 404
+            and report[f"rejected_{CHARGE_POINT_ID}"] == 409
+            and report["still_connected"]
+        )
+    finally:
+        task.cancel()
+        await central.async_stop()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url", nargs="?", help=f"ws://host:port/{CHARGE_POINT_ID}")
+    parser.add_argument("--self-test", action="store_true", help="preizkus s centralnim sistemom v istem procesu")
+    parser.add_argument("--phases", type=int, choices=[1, 3], default=3)
+    parser.add_argument("--meter-interval", type=float, default=5.0, help="s med MeterValues")
+    parser.add_argument("--response-delay", type=float, default=0.0, help="s zamika odgovora na ukaze")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        report = asyncio.run(self_test(args.phases))
+        print(json.dumps(report, indent=2))
+        return 0 if report["ok"] else 1
+    if not args.url:
+        parser.error("url or --self-test is required")
+
+    charge_point = SimulatedChargePoint(args.url, args.phases, meter_interval=args.meter_interval, response_delay=args.response_delay)
+    try:
+        asyncio.run(charge_point.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
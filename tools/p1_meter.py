@@ -0,0 +1,208 @@
+"""Simuliran števec DSMR P1 za preizkus bralnika P1 v EVSCI.
+
+Pošilja telegrame DSMR 5 (s CRC) vsako sekundo na psevdoterminal (pty) ali
+prek TCP - enako kot serijski kabel P1 oz. omrežni vmesnik P1.
+
+Primeri:
+    python tools/p1_meter.py --pty            # izpiše /dev/pts/N za nastavitev "P1 meter"
+    python tools/p1_meter.py --tcp 8088       # vmesnik na host:8088
+
+Samostojen preizkus (bralnik EVSCI in števec v istem procesu, prek pty in TCP):
+    python tools/p1_meter.py --self-test
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import _evsci
+
+_evsci.load()
+
+from evsci.p1 import P1Reader, crc16, parse_telegram  # noqa: E402
+
+VOLTAGE = 230.0
+
+
+def build_telegram(phase_watts, voltages=(VOLTAGE, VOLTAGE, VOLTAGE), when=None):
+    """Telegram DSMR 5 z močjo po fazah (W, negativno = izvoz), tokovi v celih A."""
+    when = when or datetime.now()
+    lines = [
+        "/ISK5\\2M550T-1013",
+        "",
+        "1-3:0.2.8(50)",
+        f"0-0:1.0.0({when:%y%m%d%H%M%S}S)",
+        "0-0:96.1.1(4530303434303037313331363530363136)",
+        "1-0:1.8.1(012345.678*kWh)",
+        "1-0:1.8.2(023456.789*kWh)",
+        "1-0:2.8.1(001234.567*kWh)",
+        "1-0:2.8.2(002345.678*kWh)",
+        "0-0:96.14.0(0002)",
+    ]
+    total = sum(phase_watts)
+    lines.append(f"1-0:1.7.0({max(total, 0) / 1000:06.3f}*kW)")
+    lines.append(f"1-0:2.7.0({max(-total, 0) / 1000:06.3f}*kW)")
+    lines.append("0-0:96.7.21(00004)")
+    lines.append("0-0:96.7.9(00002)")
+    for index, voltage in enumerate(voltages):
+        lines.append(f"1-0:{32 + 20 * index}.7.0({voltage:05.1f}*V)")
+    for index, (watts, voltage) in enumerate(zip(phase_watts, voltages)):
+        lines.append(f"1-0:{31 + 20 * index}.7.0({round(abs(watts) / voltage):03d}*A)")
+    for index, watts in enumerate(phase_watts):
+        lines.append(f"1-0:{21 + 20 * index}.7.0({max(watts, 0) / 1000:06.3f}*kW)")
+        lines.append(f"1-0:{22 + 20 * index}.7.0({max(-watts, 0) / 1000:06.3f}*kW)")
+    body = ("\r\n".join(lines) + "\r\n!").encode("ascii")
+    return body + f"{crc16(body):04X}\r\n".encode("ascii")
+
+
+def random_load():
+    """Naključni sprehod porabe po fazah (W) - neskončen generator."""
+    watts = [800.0, 400.0, 600.0]
+    while True:
+        for index in range(3):
+            watts[index] = min(7000.0, max(-3000.0, watts[index] + random.gauss(0, 150)))
+        yield tuple(watts)
+
+
+async def _serve_tcp(port, interval):
+    async def handle(reader, writer):
+        for phase_watts in random_load():
+            try:
+                writer.write(build_telegram(phase_watts))
+                await writer.drain()
+            except ConnectionError:
+                return
+            await asyncio.sleep(interval)
+
+    server = await asyncio.start_server(handle, None, port)
+    print(f"P1 meter on tcp port {port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+async def _serve_pty(interval):
+    import pty
+
+    master, slave = pty.openpty()
+    print(f"P1 meter on {os.ttyname(slave)}", flush=True)
+    for phase_watts in random_load():
+        os.write(master, build_telegram(phase_watts))
+        await asyncio.sleep(interval)
+
+
+async def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+
+
+async def _exercise(reader, write, count):
+    """Pošlje count telegramov (razrezanih na naključne kose) in meri zakasnitev do bralnika."""
+    latencies = []
+    received = []
+    reader.on_telegram = lambda: received.append(time.perf_counter())
+    await _wait_for(lambda: reader.connected)
+
+    for _, phase_watts in zip(range(count), random_load()):
+        payload = build_telegram(phase_watts)
+        expected = len(received) + 1
+        cut = sorted(random.sample(range(1, len(payload)), 3))
+        started = time.perf_counter()
+        for chunk in (payload[:cut[0]], payload[cut[0]:cut[1]], payload[cut[1]:cut[2]], payload[cut[2]:]):
+            write(chunk)
+        await _wait_for(lambda: len(received) >= expected)
+        latencies.append((received[-1] - started) * 1000.0)
+        expected_power = round(sum(phase_watts))
+        if abs(reader.reading["power"] - expected_power) > 2:
+            raise AssertionError(f"power {reader.reading['power']} != {expected_power}")
+
+    # Pokvarjen telegram se zavrže, naslednji velja
+    corrupt = bytearray(build_telegram((1000.0, 0.0, 0.0)))
+    corrupt[40] ^= 0x01
+    errors = reader.crc_errors
+    write(bytes(corrupt) + build_telegram((2000.0, 0.0, 0.0)))
+    await _wait_for(lambda: reader.reading["power"] == 2000.0)
+
+    latencies.sort()
+    return {
+        "telegrams": reader.telegrams,
+        "latency_ms_median": round(latencies[len(latencies) // 2], 3),
+        "latency_ms_max": round(latencies[-1], 3),
+        "crc_rejected": reader.crc_errors - errors,
+        "currents": reader.reading["currents"],
+    }
+
+
+async def self_test(count):
+    import pty
+
+    report = {}
+
+    telegram = build_telegram((2300.0, -1150.0, 460.0))
+    started = time.perf_counter()
+    for _ in range(1000):
+        reading = parse_telegram(telegram)
+    report["parse_us"] = round((time.perf_counter() - started) * 1000.0, 1)
+    report["telegram_bytes"] = len(telegram)
+    report["parsed"] = reading
+
+    master, slave = pty.openpty()
+    reader = P1Reader(os.ttyname(slave))
+    reader.async_start()
+    try:
+        report["pty"] = await _exercise(reader, lambda chunk: os.write(master, chunk), count)
+    finally:
+        await reader.async_stop()
+        os.close(master)
+        os.close(slave)
+
+    connections = []
+    server = await asyncio.start_server(lambda r, w: connections.append(w), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader = P1Reader(f"127.0.0.1:{port}")
+    reader.async_start()
+    try:
+        await _wait_for(lambda: connections)
+        report["tcp"] = await _exercise(reader, lambda chunk: connections[0].write(chunk), count)
+    finally:
+        await reader.async_stop()
+        server.close()
+
+    report["ok"] = (
+        report["pty"]["crc_rejected"] == 1
+        and report["tcp"]["crc_rejected"] == 1
+        and report["parsed"]["power"] == 1610.0
+        and report["parsed"]["currents"] == (10.0, -5.0, 2.0)
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--pty", action="store_true", help="telegrami na psevdoterminal")
+    group.add_argument("--tcp", type=int, metavar="PORT", help="telegrami prek TCP")
+    group.add_argument("--self-test", action="store_true", help="preizkus z bralnikom EVSCI v istem procesu")
+    parser.add_argument("--interval", type=float, default=1.0, help="s med telegrami")
+    parser.add_argument("--count", type=int, default=200, help="telegramov na povezavo pri --self-test")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        report = asyncio.run(self_test(args.count))
+        print(json.dumps(report, indent=2))
+        return 0 if report["ok"] else 1
+    try:
+        asyncio.run(_serve_pty(args.interval) if args.pty else _serve_tcp(args.tcp, args.interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Predvajanje posnetka meritev skozi regulacijski zakon EVSCI.
+
+Primer:
+    python tools/simulate.py trace.csv --mode Dynamic --buffer 300 --interval 20
+
+CSV stolpci: time, grid_power, charger_power, tariff, status, soc
+(glej simulation.Trace.from_csv).
+"""
+import argparse
+import json
+import sys
+import time
+
+import _evsci
+
+_evsci.load()
+
+from evsci.const import (  # noqa: E402
+    MODES,
+    MODE_DYNAMIC,
+    CONF_PHASES,
+    CONF_MAX_FUSE,
+    CONF_BUFFER,
+    CONF_CONTROL_INTERVAL,
+    CONF_CONTROLLER,
+    CONTROLLERS,
+    CONTROLLER_RAMP,
+    CONF_LIMIT_BLOCK_1,
+    CONF_LIMIT_BLOCK_2,
+    CONF_LIMIT_BLOCK_3,
+    CONF_LIMIT_BLOCK_4,
+    CONF_LIMIT_BLOCK_5,
+)
+from evsci.simulation import Simulator, Trace  # noqa: E402
+
+BLOCK_KEYS = (CONF_LIMIT_BLOCK_1, CONF_LIMIT_BLOCK_2, CONF_LIMIT_BLOCK_3, CONF_LIMIT_BLOCK_4, CONF_LIMIT_BLOCK_5)
+
+
+def build_options(args):
+    options = {
+        CONF_PHASES: args.phases,
+        CONF_MAX_FUSE: args.fuse,
+        CONF_BUFFER: args.buffer,
+        CONF_CONTROL_INTERVAL: args.interval,
+        CONF_CONTROLLER: args.controller,
+    }
+    for key, limit in zip(BLOCK_KEYS, args.blocks):
+        options[key] = limit
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="CSV posnetek")
+    parser.add_argument("--mode", choices=MODES, default=MODE_DYNAMIC)
+    parser.add_argument("--phases", type=int, choices=[1, 3], default=3)
+    parser.add_argument("--fuse", type=int, default=25)
+    parser.add_argument("--buffer", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=30)
+    parser.add_argument("--controller", choices=CONTROLLERS, default=CONTROLLER_RAMP)
+    parser.add_argument("--blocks", type=int, nargs=5, default=[6000] * 5, metavar="W")
+    parser.add_argument("--target-soc", type=int, default=100)
+    parser.add_argument("--tick", type=float, default=5.0, help="interval cikla koordinatorja (s)")
+    parser.add_argument("--delay", type=float, default=2.0, help="zamik odziva polnilnice (s)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="čas naraščanja moči polnilnice (s)")
+    parser.add_argument("--meter-delay", type=float, default=0.0, help="zamik števca omrežja (s)")
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--phase-switch", action="store_true", help="polnilnica s stikalom 1/3 faze")
+    args = parser.parse_args(argv)
+
+    trace = Trace.from_csv(args.trace)
+    simulator = Simulator(
+        build_options(args),
+        trace,
+        mode=args.mode,
+        target_soc=args.target_soc,
+        tick_interval=args.tick,
+        response_delay=args.delay,
+        ramp_time=args.ramp,
+        meter_delay=args.meter_delay,
+        fast_path=not args.no_fast_path,
+        phase_switch=args.phase_switch,
+    )
+
+    started = time.perf_counter()
+    result = simulator.run()
+    summary = result.summary()
+    summary["wall_time_s"] = round(time.perf_counter() - started, 3)
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
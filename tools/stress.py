@@ -0,0 +1,428 @@
+"""Monte-Carlo preverjanje varnosti regulacije EVSCI.
+
+Naključni večurni scenariji (sunki porabe, zamrznjen senzor omrežja, menjave
+blokov, odklopi/priklopi, različne nastavitve in odzivi polnilnice) tečejo
+skozi Simulator - isti ControlLaw in hitro pot kot EVSCICoordinator - na vseh
+jedrih. Kršitev je neprekinjena preobremenitev glavne varovalke, ki jo
+povzroča polnilnica, daljša od --allowed sekund. Vsaka najdena kršitev se
+skrči na najmanjši scenarij, ki jo še ponovi, in zapiše v JSON.
+
+Primeri:
+    python tools/stress.py --scenarios 100000 --hours 3
+    python tools/stress.py --replay stress-failures/scenario-123.json
+"""
+import argparse
+import bisect
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import _evsci
+
+_evsci.load()
+
+from evsci.const import (  # noqa: E402
+    MODES,
+    MODE_OFF,
+    CONF_PHASES,
+    CONF_MAX_FUSE,
+    CONF_BUFFER,
+    CONF_CONTROL_INTERVAL,
+    CONF_CONTROLLER,
+    CONTROLLERS,
+    CONTROLLER_RAMP,
+    CONF_DEMAND_AVERAGING,
+    CONF_LOAD_FORECAST,
+    CONF_LIMIT_BLOCK_1,
+    CONF_LIMIT_BLOCK_2,
+    CONF_LIMIT_BLOCK_3,
+    CONF_LIMIT_BLOCK_4,
+    CONF_LIMIT_BLOCK_5,
+)
+from evsci.control import VOLTAGE  # noqa: E402
+from evsci.simulation import Simulator, Trace, tariff_block_for_hour  # noqa: E402
+
+BLOCK_KEYS = (CONF_LIMIT_BLOCK_1, CONF_LIMIT_BLOCK_2, CONF_LIMIT_BLOCK_3, CONF_LIMIT_BLOCK_4, CONF_LIMIT_BLOCK_5)
+
+# Privzete nastavitve - krčenje poskusi vsako naključno nastavitev vrniti nanje
+DEFAULT_OPTIONS = {
+    CONF_PHASES: 3,
+    CONF_MAX_FUSE: 25,
+    CONF_BUFFER: 500,
+    CONF_CONTROL_INTERVAL: 30,
+    CONF_CONTROLLER: CONTROLLER_RAMP,
+    CONF_DEMAND_AVERAGING: True,
+    **dict.fromkeys(BLOCK_KEYS, 6000),
+}
+DEFAULT_CHARGER = {"response_delay": 2.0, "ramp_time": 0.0, "meter_delay": 0.0}
+
+STRESS_MODES = tuple(mode for mode in MODES if mode != MODE_OFF)
+
+# Dogodki scenarija: [vrsta, začetek (s od začetka), trajanje (s), vrednost]
+EVENT_LOAD = "load"  # dodatna poraba hiše (W)
+EVENT_UNPLUG = "unplug"  # kabel odklopljen
+EVENT_GAP = "gap"  # entiteta omrežja se ne osvežuje
+EVENT_TARIFF = "tariff"  # blok (1-5) namesto urnika
+
+SAMPLE_PERIOD = 1.0
+START = 1_717_192_800.0  # 1. 6. 2024, 00:00 UTC
+
+# Razredi histogramov (zgornje meje), zadnji razred je odprt
+SECONDS_BUCKETS = (0, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+CYCLE_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+# Največ kršitev, ki jih delavec vrne (ostale se le štejejo)
+MAX_FAILURES_PER_BATCH = 5
+
+
+def random_scenario(index, seed, hours):
+    """Scenarij index - deterministično iz (seed, index)."""
+    rng = random.Random(seed * 1_000_003 + index)
+    phases = rng.choice((1, 3))
+    fuse = rng.choice((16, 20, 25, 32, 35) if phases == 3 else (25, 32, 40))
+    fuse_watts = fuse * VOLTAGE * phases
+    options = {
+        CONF_PHASES: phases,
+        CONF_MAX_FUSE: fuse,
+        CONF_BUFFER: rng.choice((0, 200, 500, 1000)),
+        CONF_CONTROL_INTERVAL: rng.choice((10, 20, 30, 60)),
+        CONF_CONTROLLER: rng.choice(CONTROLLERS),
+        CONF_DEMAND_AVERAGING: rng.random() < 0.5,
+        CONF_LOAD_FORECAST: False,
+    }
+    for key in BLOCK_KEYS:
+        options[key] = rng.choice((3000, 4500, 6000, 8000, 11000, 17000))
+
+    duration = hours * 3600.0
+    events = []
+    for _ in range(_poisson(rng, 6.0 * hours)):
+        length = min(3600.0, max(5.0, rng.expovariate(1 / 180.0)))
+        events.append([EVENT_LOAD, rng.uniform(0, duration), round(length), round(rng.uniform(300.0, 1.1 * fuse_watts))])
+    for _ in range(_poisson(rng, 1.0 * hours)):
+        events.append([EVENT_UNPLUG, rng.uniform(0, duration), round(rng.uniform(30.0, 1800.0)), 0])
+    for _ in range(_poisson(rng, 2.0 * hours)):
+        events.append([EVENT_GAP, rng.uniform(0, duration), round(min(300.0, max(2.0, rng.expovariate(1 / 45.0)))), 0])
+    for _ in range(_poisson(rng, 2.0 * hours)):
+        events.append([EVENT_TARIFF, rng.uniform(0, duration), 900 * rng.randint(1, 8), rng.randint(1, 5)])
+    for event in events:
+        event[1] = round(event[1])
+    events.sort(key=lambda event: event[1])
+
+    return {
+        "index": index,
+        "seed": seed,
+        "mode": STRESS_MODES[index % len(STRESS_MODES)],
+        "start": START + 3600.0 * rng.randrange(24),
+        "hours": hours,
+        "base_load": round(rng.uniform(150.0, 900.0)),
+        "options": options,
+        "charger": {
+            "response_delay": round(rng.uniform(0.5, 5.0), 1),
+            "ramp_time": round(rng.uniform(0.0, 8.0), 1),
+            "meter_delay": rng.choice((0.0, 1.0, 2.0, 5.0)),
+        },
+        "events": events,
+    }
+
+
+def _poisson(rng, mean):
+    count, threshold, product = 0, math.exp(-mean), rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def build_trace(scenario):
+    """Trace in okna zamrznjenega senzorja iz dogodkov scenarija."""
+    rng = random.Random(scenario["seed"] * 7 + scenario["index"])
+    start = scenario["start"]
+    samples = int(scenario["hours"] * 3600.0 / SAMPLE_PERIOD)
+    base = scenario["base_load"]
+    house = array("d", (base + rng.uniform(-100.0, 100.0) for _ in range(samples)))
+    connected = array("b", [1]) * samples
+    tariff = array("b", (tariff_block_for_hour(int((start + k * SAMPLE_PERIOD) // 3600) % 24) for k in range(samples)))
+    gaps = []
+
+    for kind, offset, length, value in scenario["events"]:
+        first = max(0, int(offset / SAMPLE_PERIOD))
+        last = min(samples, int((offset + length) / SAMPLE_PERIOD))
+        if kind == EVENT_LOAD:
+            for k in range(first, last):
+                house[k] += value
+        elif kind == EVENT_UNPLUG:
+            connected[first:last] = array("b", [0]) * max(0, last - first)
+        elif kind == EVENT_TARIFF:
+            tariff[first:last] = array("b", [value]) * max(0, last - first)
+        elif kind == EVENT_GAP:
+            gaps.append((start + offset, start + offset + length))
+
+    trace = Trace()
+    trace.time = array("d", (start + k * SAMPLE_PERIOD for k in range(samples)))
+    trace.house_power = house
+    trace.tariff = tariff
+    trace.connected = connected
+    trace.soc = array("d", [math.nan]) * samples
+    return trace, gaps
+
+
+def run_scenario(scenario):
+    trace, gaps = build_trace(scenario)
+    simulator = Simulator(
+        {**DEFAULT_OPTIONS, **scenario["options"]},
+        trace,
+        mode=scenario["mode"],
+        meter_gaps=gaps,
+        **{**DEFAULT_CHARGER, **scenario["charger"]},
+    )
+    return simulator.run()
+
+
+def violates(scenario, allowed):
+    return run_scenario(scenario).max_seconds_over_fuse > allowed
+
+
+def run_batch(first, count, seed, hours, allowed):
+    """Delavec: count scenarijev od first. Vrne histograme po načinih in kršitve."""
+    stats = {}
+    failures = []
+    for index in range(first, first + count):
+        scenario = random_scenario(index, seed, hours)
+        result = run_scenario(scenario)
+        mode_stats = stats.get(scenario["mode"])
+        if mode_stats is None:
+            mode_stats = stats[scenario["mode"]] = _empty_stats()
+        longest = result.max_seconds_over_fuse
+        _add(mode_stats, "longest_overload", SECONDS_BUCKETS, longest)
+        _add(mode_stats, "overload_seconds", SECONDS_BUCKETS, result.seconds_over_fuse)
+        _add(mode_stats, "switch_cycles", CYCLE_BUCKETS, result.switch_cycles)
+        mode_stats["scenarios"] += 1
+        if longest > allowed:
+            mode_stats["violations"] += 1
+            if len(failures) < MAX_FAILURES_PER_BATCH:
+                failures.append((index, longest))
+    return stats, failures
+
+
+def _empty_stats():
+    stats = {"scenarios": 0, "violations": 0}
+    for name, buckets in (("longest_overload", SECONDS_BUCKETS), ("overload_seconds", SECONDS_BUCKETS), ("switch_cycles", CYCLE_BUCKETS)):
+        stats[name] = {"histogram": [0] * (len(buckets) + 1), "sum": 0.0, "max": 0.0}
+    return stats
+
+
+def _add(stats, name, buckets, value):
+    entry = stats[name]
+    entry["histogram"][bisect.bisect_left(buckets, value)] += 1
+    entry["sum"] += value
+    entry["max"] = max(entry["max"], value)
+
+
+def _merge(total, stats):
+    for mode, mode_stats in stats.items():
+        target = total.get(mode)
+        if target is None:
+            total[mode] = mode_stats
+            continue
+        target["scenarios"] += mode_stats["scenarios"]
+        target["violations"] += mode_stats["violations"]
+        for name in ("longest_overload", "overload_seconds", "switch_cycles"):
+            target[name]["histogram"] = [a + b for a, b in zip(target[name]["histogram"], mode_stats[name]["histogram"])]
+            target[name]["sum"] += mode_stats[name]["sum"]
+            target[name]["max"] = max(target[name]["max"], mode_stats[name]["max"])
+
+
+def _percentile(histogram, buckets, q):
+    """Zgornja meja razreda, v katerem je kvantil q (None = odprt zadnji razred)."""
+    target = q * sum(histogram)
+    running = 0
+    for bound, count in zip(buckets, histogram):
+        running += count
+        if running >= target:
+            return bound
+    return None
+
+
+# --- Krčenje kršitve ---
+
+
+def shrink(scenario, allowed):
+    """Najmanjši scenarij, ki še krši: krajši posnetek, manj in krajši dogodki, privzete nastavitve."""
+    scenario = json.loads(json.dumps(scenario))
+    result = run_scenario(scenario)
+
+    # Posnetek se konča takoj po kršitvi
+    end = result.max_over_fuse_start + allowed + 5.0 - scenario["start"]
+    candidate = {**scenario, "hours": math.ceil(end) / 3600.0}
+    if violates(candidate, allowed):
+        scenario = candidate
+
+    # Začetek čim bližje kršitvi (na mejo četrt ure - povprečje bloka ostane poravnano)
+    offset = (result.max_over_fuse_start - scenario["start"] - 1800.0) // 900 * 900
+    while offset >= 900:
+        candidate = _crop(scenario, offset)
+        if violates(candidate, allowed):
+            scenario = candidate
+            break
+        offset -= 900
+
+    # Dogodki: odstranjevanje po kosih (delta debugging), nato krajšanje posameznih
+    events = scenario["events"]
+    chunk = max(1, len(events) // 2)
+    while events and chunk >= 1:
+        removed = False
+        for first in range(0, len(events), chunk):
+            candidate = {**scenario, "events": events[:first] + events[first + chunk:]}
+            if violates(candidate, allowed):
+                scenario, events, removed = candidate, candidate["events"], True
+                break
+        if not removed:
+            chunk //= 2
+    for index in range(len(events)):
+        while events[index][2] > 1:
+            shorter = [*events[index][:2], events[index][2] // 2, events[index][3]]
+            candidate = {**scenario, "events": events[:index] + [shorter] + events[index + 1:]}
+            if not violates(candidate, allowed):
+                break
+            scenario, events = candidate, candidate["events"]
+
+    # Nastavitve in odziv polnilnice nazaj na privzete
+    for section, defaults in (("options", DEFAULT_OPTIONS), ("charger", DEFAULT_CHARGER)):
+        for key, value in list(scenario[section].items()):
+            if key in defaults and value != defaults[key]:
+                candidate = {**scenario, section: {**scenario[section], key: defaults[key]}}
+                if violates(candidate, allowed):
+                    scenario = candidate
+    return scenario
+
+
+def _crop(scenario, offset):
+    events = [
+        [kind, start - offset, length, value]
+        for kind, start, length, value in scenario["events"]
+        if start + length > offset
+    ]
+    for event in events:
+        if event[1] < 0:
+            event[2] += event[1]
+            event[1] = 0
+    return {
+        **scenario,
+        "start": scenario["start"] + offset,
+        "hours": scenario["hours"] - offset / 3600.0,
+        "events": events,
+    }
+
+
+def shrink_failure(index, seed, hours, allowed):
+    """Delavec: skrči kršitev scenarija index. Vrne (izvirni, skrčeni, povzetek skrčenega)."""
+    original = random_scenario(index, seed, hours)
+    minimal = shrink(original, allowed)
+    return original, minimal, run_scenario(minimal).summary()
+
+
+# --- Glavni program ---
+
+
+def print_report(total, allowed, elapsed, scenarios):
+    print(f"{scenarios} scenarios in {elapsed:.1f} s ({scenarios / max(elapsed, 1e-9):.0f}/s), violation = charger-caused overload > {allowed:g} s")
+    header = f"{'mode':<12}{'runs':>9}{'viol.':>7}  {'longest p50/p95/p99/max (s)':<30}{'over fuse mean/max (s)':<24}{'switch cycles mean/p95/max':<28}"
+    print(header)
+    print("-" * len(header))
+    for mode in STRESS_MODES:
+        stats = total.get(mode)
+        if stats is None:
+            continue
+        runs = stats["scenarios"]
+        longest = stats["longest_overload"]
+        overload = stats["overload_seconds"]
+        cycles = stats["switch_cycles"]
+
+        def bound(histogram, buckets, q):
+            value = _percentile(histogram, buckets, q)
+            return f"<={value:g}" if value is not None else f">{buckets[-1]:g}"
+
+        longest_text = "/".join(bound(longest["histogram"], SECONDS_BUCKETS, q) for q in (0.5, 0.95, 0.99)) + f"/{longest['max']:.0f}"
+        overload_text = f"{overload['sum'] / runs:.1f}/{overload['max']:.0f}"
+        cycles_text = f"{cycles['sum'] / runs:.1f}/{bound(cycles['histogram'], CYCLE_BUCKETS, 0.95)}/{cycles['max']:.0f}"
+        print(f"{mode:<12}{runs:>9}{stats['violations']:>7}  {longest_text:<30}{overload_text:<24}{cycles_text:<28}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, default=1000)
+    parser.add_argument("--hours", type=float, default=3.0, help="dolžina scenarija")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--allowed", type=float, default=10.0, help="dovoljena neprekinjena preobremenitev (s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=20, help="scenarijev na nalogo delavca")
+    parser.add_argument("--shrink", type=int, default=5, help="največ kršitev za krčenje")
+    parser.add_argument("--out", default="stress-failures", help="mapa za skrčene scenarije")
+    parser.add_argument("--json", help="histogrami po načinih v JSON")
+    parser.add_argument("--replay", help="ponovi scenarij iz JSON")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as handle:
+            scenario = json.load(handle)
+        scenario = scenario.get("minimal", scenario)
+        result = run_scenario(scenario)
+        print(json.dumps({**result.summary(), "max_over_fuse_start": result.max_over_fuse_start}, indent=2))
+        return 1 if result.max_seconds_over_fuse > args.allowed else 0
+
+    total = {}
+    failures = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pending = set()
+        next_first = 0
+        done_scenarios = 0
+        last_report = started
+        while next_first < args.scenarios or pending:
+            while next_first < args.scenarios and len(pending) < 4 * args.workers:
+                count = min(args.batch, args.scenarios - next_first)
+                pending.add(pool.submit(run_batch, next_first, count, args.seed, args.hours, args.allowed))
+                next_first += count
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stats, batch_failures = future.result()
+                _merge(total, stats)
+                failures.extend(batch_failures)
+                done_scenarios += sum(mode_stats["scenarios"] for mode_stats in stats.values())
+            if time.perf_counter() - last_report > 10.0:
+                last_report = time.perf_counter()
+                print(f"... {done_scenarios}/{args.scenarios}, {sum(s['violations'] for s in total.values())} violations", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+
+        print_report(total, args.allowed, elapsed, args.scenarios)
+
+        failures.sort(key=lambda failure: -failure[1])
+        shrunk = [
+            pool.submit(shrink_failure, index, args.seed, args.hours, args.allowed)
+            for index, _ in failures[: args.shrink]
+        ]
+        if shrunk:
+            os.makedirs(args.out, exist_ok=True)
+        for future in shrunk:
+            original, minimal, summary = future.result()
+            path = os.path.join(args.out, f"scenario-{args.seed}-{original['index']}.json")
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump({"original": original, "minimal": minimal, "summary": summary}, handle, indent=2)
+            print(
+                f"violation {original['mode']} #{original['index']}: {len(original['events'])} -> {len(minimal['events'])} events, "
+                f"{original['hours'] * 60:.0f} -> {minimal['hours'] * 60:.1f} min, longest overload {summary['max_seconds_over_fuse']} s -> {path}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump({"allowed": args.allowed, "hours": args.hours, "seed": args.seed, "modes": total}, handle, indent=2)
+    return 1 if any(stats["violations"] for stats in total.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())